@@ -0,0 +1,60 @@
+"""
+Comandas abertas exibidas na barra lateral/cabeçalho (`bar_tags.comandas_abertas`).
+
+A lista aparece em todas as páginas dos tenants de bar, então fica no cache por
+tenant. Ela é descartada quando uma comanda é aberta, fechada ou excluída
+(signals em `bar/signals.py`) e sempre que o total ou os itens de uma comanda
+mudam (`BarComanda.somar_ao_total`).
+
+O cache só é usado quando é compartilhado entre os processos (REDIS_URL, ver
+settings): com o cache em memória de cada processo, a invalidação só alcançaria
+o processo que fez a alteração e os outros mostrariam mesas erradas. Nesse caso
+a lista vem direto do banco (uma consulta pelo índice de tenant + status).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import BarComanda
+
+BAR_BUSINESS_TYPES = ('bar', 'bar_delivery')
+
+CACHE_KEY = 'bar:comandas_abertas:{tenant_id}'
+CACHE_TIMEOUT = 60 * 60  # Invalidado explicitamente; o timeout é só uma rede de segurança.
+USE_CACHE = getattr(settings, 'CACHE_SHARED', False)
+
+
+def get_comandas_abertas(tenant_id):
+    """Mesas com comanda aberta e ao menos um item, com o total, ordenadas pelo número da mesa."""
+    if not USE_CACHE:
+        return _load(tenant_id)
+    key = CACHE_KEY.format(tenant_id=tenant_id)
+    comandas = cache.get(key)
+    if comandas is None:
+        comandas = _load(tenant_id)
+        cache.set(key, comandas, CACHE_TIMEOUT)
+    return comandas
+
+
+def _load(tenant_id):
+    return list(BarComanda.objects.filter(
+        tenant_id=tenant_id,
+        status='aberta',
+        itens__isnull=False
+    ).distinct().order_by('numero_mesa').values('numero_mesa', 'total'))
+
+
+def invalidate_comandas_abertas(tenant_id):
+    if not USE_CACHE:
+        return
+    # Só depois do commit, para uma requisição concorrente não recolocar a lista antiga no cache
+    transaction.on_commit(lambda: cache.delete(CACHE_KEY.format(tenant_id=tenant_id)))
+
+
+def invalidate_comandas_abertas_for_comanda(comanda_id):
+    """Descarta a lista a partir do ID da comanda (usado quando os itens/total mudam)."""
+    if not USE_CACHE:
+        return
+    tenant_id = BarComanda.objects.filter(pk=comanda_id).values_list('tenant_id', flat=True).first()
+    if tenant_id:
+        invalidate_comandas_abertas(tenant_id)
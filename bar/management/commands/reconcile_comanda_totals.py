@@ -0,0 +1,45 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+
+from shop.models import Tenant
+from bar.models import BarComanda
+
+
+class Command(BaseCommand):
+    help = 'Confere o total de cada comanda com a soma dos seus itens e, com --fix, corrige as divergências.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', type=str, help='Slug de um tenant específico (padrão: todos)')
+        parser.add_argument('--fix', action='store_true', help='Grava o total recalculado nas comandas divergentes')
+
+    def handle(self, *args, **options):
+        comandas = BarComanda.objects.select_related('tenant').annotate(soma_itens=Sum('itens__subtotal'))
+        if options['tenant']:
+            if not Tenant.objects.filter(slug=options['tenant']).exists():
+                raise CommandError(f'Tenant "{options["tenant"]}" não encontrado.')
+            comandas = comandas.filter(tenant__slug=options['tenant'])
+
+        divergentes = 0
+        for comanda in comandas.iterator(chunk_size=500):
+            esperado = comanda.soma_itens or Decimal('0.00')
+            if comanda.gorjeta_10:
+                esperado *= Decimal('1.10')
+            esperado = esperado.quantize(Decimal('0.01'))
+            if comanda.total == esperado:
+                continue
+
+            divergentes += 1
+            self.stdout.write(f'{comanda.tenant.name} - Mesa {comanda.numero_mesa} (comanda #{comanda.id}, {comanda.status}): total {comanda.total}, itens {esperado}')
+            if options['fix']:
+                comanda.total = esperado
+                # save() (e não update) para os relatórios consolidados acompanharem a correção
+                comanda.save(update_fields=['total'])
+
+        if not divergentes:
+            self.stdout.write(self.style.SUCCESS('Todas as comandas conferem com os itens.'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'{divergentes} comanda(s) corrigida(s).'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{divergentes} comanda(s) divergente(s). Use --fix para corrigir.'))
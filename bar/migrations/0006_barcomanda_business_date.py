@@ -0,0 +1,42 @@
+# Generated by Django 5.0.6 on 2026-10-18 04:34
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_business_date(apps, schema_editor):
+    """Preenche a data local de fechamento das comandas já fechadas."""
+    BarComanda = apps.get_model('bar', 'BarComanda')
+    batch = []
+    for obj in BarComanda.objects.filter(data_fechamento__isnull=False).only('id', 'data_fechamento').iterator(chunk_size=2000):
+        obj.business_date = timezone.localdate(obj.data_fechamento)
+        batch.append(obj)
+        if len(batch) >= 2000:
+            BarComanda.objects.bulk_update(batch, ['business_date'])
+            batch = []
+    BarComanda.objects.bulk_update(batch, ['business_date'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bar', '0005_barsystemnotice'),
+        ('shop', '0018_dailysalesrollup_customersalesrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='barcomanda',
+            name='business_date',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='Data de Fechamento (dia)'),
+        ),
+        migrations.RunPython(fill_business_date, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='barcomanda',
+            index=models.Index(fields=['tenant', 'status', 'numero_mesa'], name='bar_comanda_tenant_mesa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='barcomanda',
+            index=models.Index(fields=['tenant', 'status', 'business_date'], name='bar_comanda_tenant_day_idx'),
+        ),
+    ]
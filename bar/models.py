@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from decimal import Decimal
 from shop.models import Tenant
 
@@ -51,21 +52,48 @@ class BarComanda(models.Model):
     data_fechamento = models.DateTimeField(null=True, blank=True, verbose_name="Data de Fechamento")
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0.00, verbose_name="Total")
     gorjeta_10 = models.BooleanField(default=False, verbose_name="Taxa 10% Serviço")
+    # Dia do fechamento no fuso local (TIME_ZONE), gravado no save para os relatórios usarem índice
+    business_date = models.DateField(null=True, blank=True, editable=False, verbose_name="Data de Fechamento (dia)")
 
     class Meta:
         verbose_name = "Comanda"
         verbose_name_plural = "Comandas"
         ordering = ['-data_abertura']
+        indexes = [
+            models.Index(fields=['tenant', 'status', 'numero_mesa'], name='bar_comanda_tenant_mesa_idx'),
+            models.Index(fields=['tenant', 'status', 'business_date'], name='bar_comanda_tenant_day_idx'),
+        ]
 
     def __str__(self):
         return f"Mesa {self.numero_mesa} - {self.get_status_display()}"
 
+    def save(self, *args, **kwargs):
+        self.business_date = timezone.localdate(self.data_fechamento) if self.data_fechamento else None
+        super().save(*args, **kwargs)
+
     def calcular_total(self):
-        total = sum(item.subtotal for item in self.itens.all())
+        """Recalcula o total a partir dos itens (um único SUM no banco). Usado no fechamento e na conciliação."""
+        total = self.itens.aggregate(total=models.Sum('subtotal'))['total'] or Decimal('0.00')
         if self.gorjeta_10:
             total *= Decimal('1.10')
         return total
 
+    @classmethod
+    def somar_ao_total(cls, comanda_id, valor):
+        """
+        Soma `valor` (diferença de subtotal de um item) ao total da comanda com um
+        único UPDATE usando F(), sem reler os itens e sem sobrescrever lançamentos
+        simultâneos de outro garçom na mesma mesa.
+        """
+        if valor:
+            cls.objects.filter(pk=comanda_id).update(total=models.Case(
+                models.When(gorjeta_10=True, then=models.F('total') + (valor * Decimal('1.10')).quantize(Decimal('0.01'))),
+                default=models.F('total') + valor,
+            ))
+        # O total e a presença de itens aparecem na lista de comandas abertas em cache
+        from .comandas_cache import invalidate_comandas_abertas_for_comanda
+        invalidate_comandas_abertas_for_comanda(comanda_id)
+
 class BarComandaItem(models.Model):
     comanda = models.ForeignKey(BarComanda, on_delete=models.CASCADE, related_name='itens')
     item = models.ForeignKey(BarMenuItem, on_delete=models.CASCADE, verbose_name="Item")
@@ -81,12 +109,44 @@ class BarComandaItem(models.Model):
     def __str__(self):
         return f"{self.quantidade}x {self.item.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Subtotal que já está somado no total da comanda
+        instance._subtotal_salvo = instance.__dict__.get('subtotal')
+        return instance
+
     def save(self, *args, **kwargs):
         self.subtotal = self.quantidade * self.preco_unitario
-        super().save(*args, **kwargs)
-        # Atualiza o total da comanda
-        self.comanda.total = self.comanda.calcular_total()
-        self.comanda.save()
+        if self._state.adding:
+            anterior = Decimal('0.00')
+        else:
+            anterior = getattr(self, '_subtotal_salvo', None)
+            if anterior is None:
+                anterior = BarComandaItem.objects.filter(pk=self.pk).values_list('subtotal', flat=True).first() or Decimal('0.00')
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # Atualiza o total da comanda somando apenas a diferença
+            BarComanda.somar_ao_total(self.comanda_id, self.subtotal - anterior)
+        self._subtotal_salvo = self.subtotal
+
+    def delete(self, *args, **kwargs):
+        subtotal = self.subtotal
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            BarComanda.somar_ao_total(self.comanda_id, -subtotal)
+        return result
+
+    def adicionar(self, quantidade, observacao=''):
+        """Soma `quantidade` a um item já lançado na comanda, direto no banco (F()), com custo constante."""
+        valor = quantidade * self.preco_unitario
+        with transaction.atomic():
+            BarComandaItem.objects.filter(pk=self.pk).update(
+                quantidade=models.F('quantidade') + quantidade,
+                subtotal=models.F('subtotal') + valor,
+                observacao=observacao,
+            )
+            BarComanda.somar_ao_total(self.comanda_id, valor)
 
 class BarSystemNotice(models.Model):
     content = models.CharField(max_length=255, verbose_name="Texto do Aviso")
@@ -0,0 +1,37 @@
+from django.db.models.signals import post_init, post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from shop.rollups import Contribution, contribution_on_load, remember_contribution, saved_contribution, sync_contribution
+from .comandas_cache import invalidate_comandas_abertas
+from .models import BarComanda
+
+
+def comanda_sales_contribution(comanda):
+    """Contribuição da comanda para os relatórios: só comandas fechadas contam, na data de fechamento."""
+    if comanda.status != 'fechada' or comanda.business_date is None:
+        return None
+    return Contribution(date=comanda.business_date, total=comanda.total)
+
+
+@receiver(post_init, sender=BarComanda)
+def comanda_loaded(sender, instance, **kwargs):
+    contribution_on_load(instance, comanda_sales_contribution)
+
+
+@receiver(pre_save, sender=BarComanda)
+def comanda_before_save(sender, instance, **kwargs):
+    remember_contribution(sender, instance, comanda_sales_contribution)
+
+
+@receiver(post_save, sender=BarComanda)
+def comanda_rollups(sender, instance, **kwargs):
+    current = comanda_sales_contribution(instance)
+    sync_contribution(instance.tenant_id, 'bar', getattr(instance, '_rollup_previous', None), current)
+    saved_contribution(instance, current)
+    invalidate_comandas_abertas(instance.tenant_id)
+
+
+@receiver(post_delete, sender=BarComanda)
+def comanda_deleted(sender, instance, **kwargs):
+    sync_contribution(instance.tenant_id, 'bar', comanda_sales_contribution(instance), None)
+    invalidate_comandas_abertas(instance.tenant_id)
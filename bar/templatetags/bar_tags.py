@@ -1,19 +1,16 @@
 from django import template
-from bar.models import BarComanda
+from bar.comandas_cache import BAR_BUSINESS_TYPES, get_comandas_abertas
 
 register = template.Library()
 
 @register.inclusion_tag('bar/comandas_sidebar.html', takes_context=True)
 def comandas_abertas(context):
-    """Inclui template com comandas abertas do tenant"""
-    user = context.get('user')
-    if user and user.is_authenticated and hasattr(user, 'tenant'):
-        comandas = BarComanda.objects.filter(
-            tenant=user.tenant, 
-            status='aberta',
-            itens__isnull=False
-        ).distinct().order_by('numero_mesa')
+    """Inclui template com comandas abertas do tenant (lidas do cache; só para tenants de bar)"""
+    # Loja do lojista já carregada pelo MerchantTenantMiddleware (shop/auth.py)
+    tenant = getattr(context.get('request'), 'tenant', None)
+    if tenant and tenant.business_type in BAR_BUSINESS_TYPES:
+        comandas = get_comandas_abertas(tenant.id)
     else:
         comandas = []
     
-    return {'comandas': comandas}
\ No newline at end of file
+    return {'comandas': comandas}
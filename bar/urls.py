@@ -8,6 +8,7 @@ urlpatterns = [
     path('toggle-status/', views.toggle_bar_status, name='toggle_status'),
     path('cardapio-admin/', views.menu_admin_view, name='menu_admin'),
     path('mesas/', views.mesas_view, name='mesas'),
+    path('api/mesas/', views.mesas_api_view, name='mesas_api'),
     path('comanda/<int:numero_mesa>/', views.comanda_view, name='comanda'),
     path('salvar-comanda/<int:numero_mesa>/', views.salvar_comanda, name='salvar_comanda'),
     path('imprimir-comanda/<int:numero_mesa>/', views.imprimir_comanda, name='imprimir_comanda'),
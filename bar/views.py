@@ -1,46 +1,38 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
 from django.db import models
+from django.db.models import Count
 from decimal import Decimal
 import json
 import datetime
 from datetime import datetime, timedelta
-from shop.models import Tenant
+from shop.models import DailySalesRollup
+from shop.auth import tenant_required
+from shop.tenants import get_tenant_or_404
+from .comandas_cache import BAR_BUSINESS_TYPES
 from .models import BarCategory, BarMenuItem, BarComanda, BarComandaItem, BarSystemNotice
 from .forms import BarCategoryForm, BarMenuItemForm
 
-@login_required(login_url='login')
+@tenant_required(business_types=BAR_BUSINESS_TYPES)
 def bar_dashboard(request):
-    try:
-        tenant = request.user.tenant
-    except Tenant.DoesNotExist:
-        return render(request, 'error.html', {'message': 'Você não tem uma loja associada.'})
-    
     system_notices = BarSystemNotice.objects.filter(is_active=True)
     return render(request, 'bar/bar_inicio.html', {'system_notices': system_notices})
 
-@login_required(login_url='login')
+@tenant_required(business_types=BAR_BUSINESS_TYPES, message='Você não tem um bar associado.')
 def toggle_bar_status(request):
-    try:
-        tenant = request.user.tenant
-        tenant.is_open = not tenant.is_open
-        tenant.save()
-        status = "aberto" if tenant.is_open else "fechado"
-        messages.success(request, f"Seu bar agora está {status} para pedidos!")
-    except Tenant.DoesNotExist:
-        messages.error(request, 'Você não tem um bar associado.')
+    tenant = request.tenant
+    tenant.is_open = not tenant.is_open
+    tenant.save()
+    status = "aberto" if tenant.is_open else "fechado"
+    messages.success(request, f"Seu bar agora está {status} para pedidos!")
     return redirect('bar:dashboard')
 
-@login_required(login_url='login')
+@tenant_required(business_types=BAR_BUSINESS_TYPES, message='Você não tem um bar associado.')
 def menu_admin_view(request):
-    try:
-        tenant = request.user.tenant
-    except Tenant.DoesNotExist:
-        return render(request, 'error.html', {'message': 'Você não tem um bar associado.'})
+    tenant = request.tenant
 
     if request.method == 'POST':
         form_type = request.POST.get('form_type')
@@ -77,7 +69,7 @@ def menu_admin_view(request):
     return render(request, 'bar/menu_admin.html', context)
 
 def customer_menu_view(request, tenant_slug):
-    tenant = get_object_or_404(Tenant, slug=tenant_slug)
+    tenant = get_tenant_or_404(request, tenant_slug)
     menu_items = BarMenuItem.objects.filter(tenant=tenant, is_available=True).select_related('category')
     context = {
         'tenant': tenant,
@@ -85,12 +77,9 @@ def customer_menu_view(request, tenant_slug):
     }
     return render(request, 'delivery/customer_menu.html', context)
 
-@login_required(login_url='login')
+@tenant_required(business_types=BAR_BUSINESS_TYPES, message='Você não tem um bar associado.')
 def bar_reports_view(request):
-    try:
-        tenant = request.user.tenant
-    except Tenant.DoesNotExist:
-        return render(request, 'error.html', {'message': 'Você não tem um bar associado.'})
+    tenant = request.tenant
     
     # Filtro de Datas
     start_date_str = request.GET.get('start_date')
@@ -98,12 +87,12 @@ def bar_reports_view(request):
 
     # Define padrão: últimos 30 dias se não informado
     if not start_date_str:
-        start_date = timezone.now().date() - timedelta(days=30)
+        start_date = timezone.localdate() - timedelta(days=30)
     else:
         start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
 
     if not end_date_str:
-        end_date = timezone.now().date()
+        end_date = timezone.localdate()
     else:
         end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
 
@@ -111,14 +100,15 @@ def bar_reports_view(request):
     comandas_fechadas = BarComanda.objects.filter(
         tenant=tenant,
         status='fechada',
-        data_fechamento__date__range=[start_date, end_date]
+        business_date__range=[start_date, end_date]
     ).order_by('-data_fechamento')
     
-    # Agregação por dia para o gráfico
-    from django.db.models.functions import TruncDate
-    from django.db.models import Sum, Count
-
-    daily_sales = comandas_fechadas.annotate(date=TruncDate('data_fechamento')).values('date').annotate(total=Sum('total')).order_by('date')
+    # Agregação por dia para o gráfico (lida das vendas já consolidadas)
+    daily_sales = DailySalesRollup.objects.filter(
+        tenant=tenant,
+        channel='bar',
+        date__range=[start_date, end_date]
+    ).values('date', 'order_count', 'total')
 
     # Prepara dados para o Chart.js
     dates = []
@@ -131,8 +121,8 @@ def bar_reports_view(request):
         dates.append(day.strftime('%d/%m'))
         values.append(float(sales_dict.get(day, 0)))
     
-    total_sales = comandas_fechadas.aggregate(Sum('total'))['total__sum'] or 0
-    total_orders = comandas_fechadas.count()
+    total_sales = sum(entry['total'] for entry in daily_sales)
+    total_orders = sum(entry['order_count'] for entry in daily_sales)
 
     context = {
         'comandas_fechadas': comandas_fechadas,
@@ -147,53 +137,71 @@ def bar_reports_view(request):
     
     return render(request, 'bar/reports.html', context)
 
-@login_required(login_url='login')
+@tenant_required(business_types=BAR_BUSINESS_TYPES, message='Você não tem um bar associado.')
 def mesas_view(request):
-    try:
-        tenant = request.user.tenant
-    except Tenant.DoesNotExist:
-        return render(request, 'error.html', {'message': 'Você não tem um bar associado.'})
+    tenant = request.tenant
     
     # Verificar se o bar está aberto
     if not tenant.is_open:
         messages.warning(request, 'O bar está fechado. Abra o bar no painel para acessar as mesas.')
         return redirect('bar:dashboard')
     
-    # Buscar comandas abertas para determinar status das mesas
-    comandas_abertas = BarComanda.objects.filter(tenant=tenant, status='aberta')
-    mesas_ocupadas = {comanda.numero_mesa: comanda for comanda in comandas_abertas}
-    
+    context = {
+        'mesas': _mapa_mesas(tenant),
+        'tenant': tenant
+    }
+    return render(request, 'bar/mesas.html', context)
+
+def _mapa_mesas(tenant):
+    """
+    Situação de cada mesa (status, total, quantidade de itens e abertura da comanda).
+    As comandas abertas e a contagem de itens vêm de uma única consulta agregada.
+    """
+    comandas_abertas = BarComanda.objects.filter(tenant=tenant, status='aberta').annotate(
+        itens_count=Count('itens')
+    ).values('numero_mesa', 'total', 'itens_count', 'data_abertura')
+    mesas_ocupadas = {comanda['numero_mesa']: comanda for comanda in comandas_abertas}
+
     # Criar lista de mesas
     mesas = []
     for i in range(1, tenant.numero_mesas + 1):
-        if i in mesas_ocupadas:
-            comanda = mesas_ocupadas[i]
+        comanda = mesas_ocupadas.get(i)
+        if comanda:
             mesas.append({
                 'numero': i,
                 'status': 'ocupada',
-                'total': comanda.total,
-                'itens_count': comanda.itens.count()
+                'total': comanda['total'],
+                'itens_count': comanda['itens_count'],
+                'data_abertura': comanda['data_abertura'],
             })
         else:
             mesas.append({
                 'numero': i,
                 'status': 'livre',
-                'total': 0.00,
-                'itens_count': 0
+                'total': Decimal('0.00'),
+                'itens_count': 0,
+                'data_abertura': None,
             })
-    
-    context = {
-        'mesas': mesas,
-        'tenant': tenant
-    }
-    return render(request, 'bar/mesas.html', context)
+    return mesas
 
-@login_required(login_url='login')
+@tenant_required(business_types=BAR_BUSINESS_TYPES, message='Você não tem um bar associado.', json=True)
+def mesas_api_view(request):
+    """Mapa das mesas em JSON, consultado periodicamente pela tela de mesas."""
+    tenant = request.tenant
+
+    mesas = [
+        {
+            **mesa,
+            'total': str(mesa['total']),
+            'data_abertura': timezone.localtime(mesa['data_abertura']).isoformat() if mesa['data_abertura'] else None,
+        }
+        for mesa in _mapa_mesas(tenant)
+    ]
+    return JsonResponse({'is_open': tenant.is_open, 'mesas': mesas})
+
+@tenant_required(business_types=BAR_BUSINESS_TYPES, message='Você não tem um bar associado.')
 def comanda_view(request, numero_mesa):
-    try:
-        tenant = request.user.tenant
-    except Tenant.DoesNotExist:
-        return render(request, 'error.html', {'message': 'Você não tem um bar associado.'})
+    tenant = request.tenant
     
     # Verificar se o bar está aberto
     if not tenant.is_open:
@@ -234,10 +242,8 @@ def comanda_view(request, numero_mesa):
                 )
                 
                 if not item_created:
-                    # Se já existe, adicionar à quantidade
-                    comanda_item.quantidade += quantidade
-                    comanda_item.observacao = observacao
-                    comanda_item.save()
+                    # Se já existe, adicionar à quantidade (e ao total da comanda) direto no banco
+                    comanda_item.adicionar(quantidade, observacao)
                 
                 messages.success(request, f'{quantidade}x {item.name} adicionado(s) à comanda!')
                 
@@ -251,10 +257,6 @@ def comanda_view(request, numero_mesa):
                 item_nome = item.item.name
                 item.delete()
                 
-                # Recalcular o total da comanda após remover o item
-                comanda.total = comanda.calcular_total()
-                comanda.save()
-                
                 messages.success(request, f'{item_nome} removido da comanda!')
             except BarComandaItem.DoesNotExist:
                 messages.error(request, 'Item não encontrado na comanda!')
@@ -270,10 +272,6 @@ def comanda_view(request, numero_mesa):
                     item_nome = item.item.name
                     item.delete()
                     
-                    # Recalcular o total da comanda após remover o item
-                    comanda.total = comanda.calcular_total()
-                    comanda.save()
-                    
                     messages.success(request, f'{item_nome} removido da comanda!')
                 except BarComandaItem.DoesNotExist:
                     pass
@@ -296,12 +294,9 @@ def comanda_view(request, numero_mesa):
     }
     return render(request, 'bar/comanda.html', context)
 
-@login_required(login_url='login')
+@tenant_required(business_types=BAR_BUSINESS_TYPES, message='Você não tem um bar associado.')
 def salvar_comanda(request, numero_mesa):
-    try:
-        tenant = request.user.tenant
-    except Tenant.DoesNotExist:
-        return render(request, 'error.html', {'message': 'Você não tem um bar associado.'})
+    tenant = request.tenant
     
     try:
         comanda = BarComanda.objects.get(
@@ -350,12 +345,9 @@ def salvar_comanda(request, numero_mesa):
         messages.error(request, f'Não há comanda aberta para a Mesa {numero_mesa}!')
         return redirect('bar:mesas')
 
-@login_required(login_url='login')
+@tenant_required(business_types=BAR_BUSINESS_TYPES, message='Você não tem um bar associado.')
 def imprimir_comanda(request, numero_mesa):
-    try:
-        tenant = request.user.tenant
-    except Tenant.DoesNotExist:
-        return render(request, 'error.html', {'message': 'Você não tem um bar associado.'})
+    tenant = request.tenant
     
     try:
         comanda = BarComanda.objects.get(
@@ -404,12 +396,9 @@ def imprimir_comanda(request, numero_mesa):
         messages.error(request, f'Não há comanda aberta para a Mesa {numero_mesa}!')
         return redirect('bar:mesas')
 
-@login_required(login_url='login')
+@tenant_required(business_types=BAR_BUSINESS_TYPES, message='Você não tem um bar associado.')
 def reimprimir_comanda(request, comanda_id):
-    try:
-        tenant = request.user.tenant
-    except Tenant.DoesNotExist:
-        return render(request, 'error.html', {'message': 'Você não tem um bar associado.'})
+    tenant = request.tenant
 
     comanda = get_object_or_404(BarComanda, id=comanda_id, tenant=tenant)
 
@@ -441,12 +430,9 @@ def reimprimir_comanda(request, comanda_id):
 
     return render(request, 'bar/imprimir_comanda.html', context)
 
-@login_required(login_url='login')
+@tenant_required(business_types=BAR_BUSINESS_TYPES, message='Você não tem um bar associado.', json=True)
 def excluir_comanda(request, comanda_id):
-    try:
-        tenant = request.user.tenant
-    except Tenant.DoesNotExist:
-        return JsonResponse({'error': 'Você não tem um bar associado.'}, status=403)
+    tenant = request.tenant
     
     if request.method != 'POST':
         return JsonResponse({'error': 'Método não permitido.'}, status=405)
@@ -480,12 +466,9 @@ def excluir_comanda(request, comanda_id):
     except Exception as e:
         return JsonResponse({'error': f'Erro ao excluir comanda: {str(e)}'}, status=500)
 
-@login_required(login_url='login')
+@tenant_required(business_types=BAR_BUSINESS_TYPES, message='Você não tem um bar associado.')
 def fechar_comanda(request, numero_mesa):
-    try:
-        tenant = request.user.tenant
-    except Tenant.DoesNotExist:
-        return render(request, 'error.html', {'message': 'Você não tem um bar associado.'})
+    tenant = request.tenant
     
     try:
         comanda = BarComanda.objects.get(
@@ -512,12 +495,9 @@ def fechar_comanda(request, numero_mesa):
         messages.error(request, f'Não há comanda aberta para a Mesa {numero_mesa}!')
         return redirect('bar:mesas')
 
-@login_required(login_url='login')
+@tenant_required(business_types=BAR_BUSINESS_TYPES, message='Você não tem um bar associado.')
 def configuracoes_view(request):
-    try:
-        tenant = request.user.tenant
-    except Tenant.DoesNotExist:
-        return render(request, 'error.html', {'message': 'Você não tem um bar associado.'})
+    tenant = request.tenant
     
     if request.method == 'POST':
         tenant.numero_mesas = request.POST.get('numero_mesas', 10)
@@ -0,0 +1,132 @@
+"""
+Resolução do carrinho do delivery.
+
+O carrinho é um dicionário `{chave: quantidade}` guardado na sessão, onde a chave
+descreve a linha:
+
+    item_<id>                   item simples
+    item_<id>_<opt1>_<opt2>     item com opcionais
+    combo_<id>_<esc1>_<esc2>    combo com as escolhas de cada slot
+
+`resolve_cart` interpreta todas as chaves de uma vez e busca itens, opcionais e
+combos com no máximo três consultas `id__in`, independentemente do tamanho do
+carrinho. É usado pelo checkout, pelo "repetir pedido" e pelo PDV.
+"""
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from .models import MenuItem, DeliveryOptional, Combo
+
+
+@dataclass
+class CartLine:
+    """Uma linha resolvida do carrinho, com preço e subtotal já calculados."""
+    key: str
+    name: str
+    quantity: int
+    unit_price: Decimal
+    subtotal: Decimal
+    is_combo: bool = False
+    optionals: list = field(default_factory=list)  # DeliveryOptional
+    choices: list = field(default_factory=list)  # MenuItem (com a categoria carregada)
+
+    @property
+    def order_item_name(self):
+        """Descrição gravada no DeliveryOrderItem (snapshot do nome com opcionais/escolhas)."""
+        if self.is_combo:
+            choices_formatted = "\n".join([f"* {c.category.name}: {c.name}" for c in self.choices])
+            return f"{self.name} (\n{choices_formatted})"
+        if self.optionals:
+            opts_str = ", ".join([f"*{opt.name}" for opt in self.optionals])
+            return f"{self.name} ({opts_str})"
+        return self.name
+
+
+def parse_cart_key(key):
+    """
+    Interpreta uma chave do carrinho.
+    Retorna (tipo, id, ids_extras) ou None se a chave for inválida.
+    """
+    parts = str(key).split('_')
+    if len(parts) < 2 or parts[0] not in ('item', 'combo'):
+        return None
+    try:
+        ids = [int(part) for part in parts[1:]]
+    except ValueError:
+        return None
+    return parts[0], ids[0], ids[1:]
+
+
+def build_cart_key(item_type, item_id, extra_ids=()):
+    """Monta a chave do carrinho a partir do tipo, ID e opcionais/escolhas."""
+    return '_'.join([item_type, str(item_id)] + [str(extra_id) for extra_id in extra_ids])
+
+
+def resolve_cart(tenant, cart_entries):
+    """
+    Resolve as linhas do carrinho de um tenant.
+
+    `cart_entries` é um iterável de pares (chave, quantidade) — normalmente
+    `cart.items()`. Chaves inválidas ou que apontam para itens de outra loja
+    (ou excluídos) são ignoradas. Retorna (linhas, total_dos_itens).
+    """
+    parsed = []
+    item_ids, optional_ids, combo_ids = set(), set(), set()
+    for key, quantity in cart_entries:
+        parsed_key = parse_cart_key(key)
+        if parsed_key is None:
+            continue
+        try:
+            quantity = int(quantity)
+        except (TypeError, ValueError):
+            continue
+        if quantity <= 0:
+            continue
+        item_type, obj_id, extra_ids = parsed_key
+        if item_type == 'item':
+            item_ids.add(obj_id)
+            optional_ids.update(extra_ids)
+        else:
+            combo_ids.add(obj_id)
+            item_ids.update(extra_ids)
+        parsed.append((key, quantity, item_type, obj_id, extra_ids))
+
+    items = {}
+    if item_ids:
+        items = MenuItem.objects.filter(tenant=tenant, id__in=item_ids).select_related('category').in_bulk()
+    optionals = {}
+    if optional_ids:
+        optionals = DeliveryOptional.objects.filter(tenant=tenant, id__in=optional_ids).in_bulk()
+    combos = {}
+    if combo_ids:
+        combos = Combo.objects.filter(tenant=tenant, id__in=combo_ids).in_bulk()
+
+    lines = []
+    items_total = Decimal('0')
+    for key, quantity, item_type, obj_id, extra_ids in parsed:
+        if item_type == 'item':
+            item = items.get(obj_id)
+            if item is None:
+                continue
+            # Opcionais repetidos na chave contam uma vez só
+            selected_optionals = [optionals[opt_id] for opt_id in dict.fromkeys(extra_ids) if opt_id in optionals]
+            unit_price = item.price + sum((opt.price for opt in selected_optionals), Decimal('0'))
+            line = CartLine(
+                key=key, name=item.name, quantity=quantity,
+                unit_price=unit_price, subtotal=unit_price * quantity,
+                optionals=selected_optionals,
+            )
+        else:
+            combo = combos.get(obj_id)
+            if combo is None:
+                continue
+            choices = [items[choice_id] for choice_id in extra_ids if choice_id in items]
+            line = CartLine(
+                key=key, name=combo.name, quantity=quantity,
+                unit_price=combo.price, subtotal=combo.price * quantity,
+                is_combo=True, choices=choices,
+            )
+        items_total += line.subtotal
+        lines.append(line)
+
+    return lines, items_total
@@ -0,0 +1,188 @@
+"""
+Onde o carrinho do delivery fica guardado entre as requisições.
+
+O carrinho é o mesmo dicionário `{chave: quantidade}` descrito em `delivery/cart.py`;
+aqui fica apenas o armazenamento. As views usam sempre a mesma interface:
+
+    cart = get_cart_store(request)
+    cart.add('item_1')              # retorna a nova quantidade total de itens
+    cart.remove('item_1')
+    cart.items()                    # {chave: quantidade}
+    cart.count()                    # total de itens, mantido incrementalmente
+    cart.replace({...}) / cart.clear()
+    cart.save(response)             # grava (cookie) antes de retornar a resposta
+
+A implementação é escolhida em `DELIVERY_CART_STORE`:
+
+- `SignedCookieCartStore` (padrão): o carrinho vai assinado e compactado num
+  cookie. Não toca no banco nem em cache; limitado ao tamanho de um cookie.
+- `CacheCartStore`: o carrinho fica no cache, e o cookie leva só um ID
+  aleatório. Exige um cache compartilhado entre os processos (ex.: Redis).
+- `SessionCartStore`: o comportamento antigo, na sessão do Django.
+"""
+import secrets
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+CART_MAX_AGE = 60 * 60 * 24 * 7 # O carrinho expira uma semana depois da última alteração
+
+
+class CartFull(Exception):
+    """O carrinho não cabe mais no armazenamento (limite do cookie)."""
+
+
+class BaseCartStore:
+    def __init__(self, request):
+        self.request = request
+        self._items = None
+        self._count = 0
+        self.modified = False
+
+    # Cada implementação lê/grava o par (itens, contagem)
+    def _load(self):
+        raise NotImplementedError
+
+    def _store(self, response):
+        raise NotImplementedError
+
+    def _ensure_loaded(self):
+        if self._items is None:
+            items, count = self._load()
+            self._items = dict(items or {})
+            # Carrinhos antigos não têm a contagem gravada
+            self._count = count if count is not None else sum(self._items.values())
+
+    def items(self):
+        self._ensure_loaded()
+        return dict(self._items)
+
+    def count(self):
+        self._ensure_loaded()
+        return self._count
+
+    def __bool__(self):
+        return bool(self.items())
+
+    def add(self, key, quantity=1):
+        self._ensure_loaded()
+        self._items[key] = self._items.get(key, 0) + quantity
+        self._count += quantity
+        self.modified = True
+        return self._count
+
+    def remove(self, key):
+        self._ensure_loaded()
+        if key in self._items:
+            self._count -= self._items.pop(key)
+            self.modified = True
+
+    def replace(self, items):
+        self._items = dict(items)
+        self._count = sum(self._items.values())
+        self.modified = True
+
+    def clear(self):
+        self.replace({})
+
+    def save(self, response):
+        """Persiste as alterações; chame com a resposta que será devolvida ao cliente."""
+        if self.modified:
+            self._store(response)
+            self.modified = False
+        return response
+
+
+class SessionCartStore(BaseCartStore):
+    """Carrinho na sessão do Django (uma leitura e uma escrita na sessão a cada alteração)."""
+
+    def _load(self):
+        session = self.request.session
+        return session.get('delivery_cart', {}), session.get('delivery_cart_count')
+
+    def _store(self, response):
+        session = self.request.session
+        if self._items:
+            session['delivery_cart'] = self._items
+            session['delivery_cart_count'] = self._count
+        else:
+            session.pop('delivery_cart', None)
+            session.pop('delivery_cart_count', None)
+
+
+class SignedCookieCartStore(BaseCartStore):
+    """Carrinho assinado (não pode ser adulterado) e compactado em um cookie."""
+
+    cookie_name = 'delivery_cart'
+    salt = 'delivery.cart_store'
+    max_cookie_size = 4000 # Os navegadores aceitam por volta de 4096 bytes por cookie
+
+    def _load(self):
+        value = self.request.COOKIES.get(self.cookie_name)
+        if not value:
+            return {}, 0
+        try:
+            data = signing.loads(value, salt=self.salt, max_age=CART_MAX_AGE)
+        except signing.BadSignature:
+            return {}, 0
+        return data.get('i', {}), data.get('n')
+
+    def add(self, key, quantity=1):
+        self._ensure_loaded()
+        # Só uma linha nova aumenta o cookie de forma relevante
+        if key not in self._items and len(self._encode({**self._items, key: quantity}, self._count + quantity)) > self.max_cookie_size:
+            raise CartFull('O carrinho atingiu o limite de itens diferentes.')
+        return super().add(key, quantity)
+
+    def _encode(self, items, count):
+        return signing.dumps({'i': items, 'n': count}, salt=self.salt, compress=True)
+
+    def _store(self, response):
+        if not self._items:
+            response.delete_cookie(self.cookie_name, samesite='Lax')
+            return
+        response.set_cookie(
+            self.cookie_name, self._encode(self._items, self._count), max_age=CART_MAX_AGE,
+            httponly=True, samesite='Lax', secure=self.request.is_secure(),
+        )
+
+
+class CacheCartStore(BaseCartStore):
+    """Carrinho no cache; o cookie guarda apenas o ID aleatório do carrinho."""
+
+    cookie_name = 'delivery_cart_id'
+
+    def __init__(self, request):
+        super().__init__(request)
+        self.cart_id = request.COOKIES.get(self.cookie_name)
+
+    def _cache_key(self):
+        return f'delivery:cart:{self.cart_id}'
+
+    def _load(self):
+        data = cache.get(self._cache_key()) if self.cart_id else None
+        if not data:
+            return {}, 0
+        return data['items'], data['count']
+
+    def _store(self, response):
+        if not self._items:
+            if self.cart_id:
+                cache.delete(self._cache_key())
+            return
+        if not self.cart_id:
+            self.cart_id = secrets.token_urlsafe(18)
+        cache.set(self._cache_key(), {'items': self._items, 'count': self._count}, CART_MAX_AGE)
+        # Renova a validade do cookie junto com a do cache
+        response.set_cookie(
+            self.cookie_name, self.cart_id, max_age=CART_MAX_AGE,
+            httponly=True, samesite='Lax', secure=self.request.is_secure(),
+        )
+
+
+def get_cart_store(request):
+    """Carrinho do delivery da requisição, no armazenamento configurado em DELIVERY_CART_STORE."""
+    store_path = getattr(settings, 'DELIVERY_CART_STORE', 'delivery.cart_store.SignedCookieCartStore')
+    return import_string(store_path)(request)
@@ -0,0 +1,113 @@
+"""
+Canal de eventos dos pedidos do delivery (pub/sub por tenant).
+
+Quando um DeliveryOrder é criado ou alterado, um resumo compacto em JSON é
+publicado no canal do tenant (ver `delivery/signals.py`). O painel de pedidos
+recebe esses eventos por SSE ou long-poll (`delivery.views.orders_stream_view`)
+em vez de consultar o servidor a cada poucos segundos.
+
+O broker padrão é em memória e só alcança assinantes do mesmo processo. Para
+vários processos/servidores, aponte `DELIVERY_EVENTS_BROKER` para uma classe
+com a mesma interface (`publish` e `subscribe`) apoiada em Redis ou similar,
+com `cross_process = True`.
+
+O SSE só é usado quando `push_available` permite: app ASGI (no WSGI a resposta
+em streaming prende um worker para sempre) e broker entre processos. Fora
+disso o painel só consulta a API incremental a cada 5 segundos, e volta a
+consultá-la sempre que a conexão SSE cai.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.utils.module_loading import import_string
+
+
+def orders_channel(tenant_id):
+    return f'delivery_orders:{tenant_id}'
+
+
+def order_event(order, created=False):
+    """Resumo do pedido enviado aos painéis (apenas o necessário para atualizar a tela)."""
+    return json.dumps({
+        'event': 'created' if created else 'updated',
+        'id': order.id,
+        'status': order.status,
+        'customer': order.customer_name,
+        'total': str(order.final_total),
+        'created_at': order.created_at.isoformat() if order.created_at else None,
+    }, separators=(',', ':'))
+
+
+class Subscription:
+    """Assinatura de um canal; as mensagens chegam numa fila asyncio do loop do assinante."""
+
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+
+    def deliver(self, message):
+        # Chamado a partir de qualquer thread (as views síncronas rodam fora do loop)
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, message)
+
+    async def get(self, timeout=None):
+        """Aguarda a próxima mensagem; retorna None se o timeout expirar."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """Broker em memória, seguro entre threads. Serve para um único processo."""
+
+    cross_process = False # Eventos publicados em outros workers não chegam aqui
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.deliver(message)
+            except RuntimeError:
+                # O loop do assinante já foi fechado
+                self.unsubscribe(subscription)
+
+    def subscribe(self, channel):
+        """Cria uma assinatura; deve ser chamado dentro de um loop asyncio."""
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.channel]
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    broker_path = getattr(settings, 'DELIVERY_EVENTS_BROKER', 'delivery.events.InProcessBroker')
+    return import_string(broker_path)()
+
+
+def push_available(request):
+    """True se a conexão SSE pode ficar aberta: app ASGI e broker que alcança todos os processos."""
+    return isinstance(request, ASGIRequest) and getattr(get_broker(), 'cross_process', False)
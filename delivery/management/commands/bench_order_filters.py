@@ -0,0 +1,84 @@
+import time
+from datetime import datetime, time as dt_time, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from shop.models import Tenant
+from shop.phones import normalize_phone
+from delivery.models import DeliveryOrder
+
+
+class Command(BaseCommand):
+    help = 'Gera pedidos sintéticos e compara os filtros por data antigos (created_at__date) com business_date.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1_000_000, help='Quantidade de pedidos sintéticos')
+        parser.add_argument('--days', type=int, default=365, help='Quantidade de dias em que os pedidos são distribuídos')
+        parser.add_argument('--repeat', type=int, default=5, help='Quantas vezes executar cada consulta')
+
+    def handle(self, *args, **options):
+        # Usa um tenant temporário para não misturar os pedidos de teste com dados reais
+        user = User.objects.create(username=f'bench-filters-{int(time.time() * 1000)}')
+        tenant = Tenant.objects.create(name=user.username, user=user, business_type='delivery')
+        try:
+            self._generate(tenant, options['orders'], options['days'])
+
+            today = timezone.localdate()
+            filters = [
+                ('hoje', {'created_at__date': today}, {'business_date': today}),
+                ('ontem', {'created_at__date': today - timedelta(days=1)}, {'business_date': today - timedelta(days=1)}),
+                ('7 dias', {'created_at__date__gte': today - timedelta(days=7)}, {'business_date__gte': today - timedelta(days=7)}),
+                ('30 dias', {'created_at__date__range': [today - timedelta(days=30), today]}, {'business_date__range': [today - timedelta(days=30), today]}),
+            ]
+
+            self.stdout.write(f"{'filtro':>8} {'created_at__date (ms)':>22} {'business_date (ms)':>20}")
+            for label, old, new in filters:
+                old_ms = self._measure(tenant, old, options['repeat'])
+                new_ms = self._measure(tenant, new, options['repeat'])
+                self.stdout.write(f'{label:>8} {old_ms:>22.2f} {new_ms:>20.2f}')
+
+            for label, old, new in filters[:1]:
+                self.stdout.write(f'\nPlano antigo ({label}):\n{self._orders(tenant, old).explain()}')
+                self.stdout.write(f'\nPlano novo ({label}):\n{self._orders(tenant, new).explain()}')
+        finally:
+            # Remove em SQL direto: apagar milhões de pedidos pelo ORM dispararia os signals um a um
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {DeliveryOrder._meta.db_table} WHERE tenant_id = %s', [tenant.id])
+                user.delete()
+
+    def _orders(self, tenant, filters):
+        return DeliveryOrder.objects.filter(tenant=tenant, **filters).order_by('-id')
+
+    def _measure(self, tenant, filters, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            list(self._orders(tenant, filters).values_list('id', flat=True))
+        return (time.perf_counter() - start) * 1000 / repeat
+
+    def _generate(self, tenant, total, days):
+        self.stdout.write(f'Gerando {total} pedidos em {days} dias...')
+        per_day = max(total // days, 1)
+        today = timezone.localdate()
+        created = 0
+        for offset in range(days):
+            if created >= total:
+                break
+            day = today - timedelta(days=offset)
+            count = total - created if offset == days - 1 else min(per_day, total - created)
+            with transaction.atomic():
+                DeliveryOrder.objects.bulk_create([
+                    DeliveryOrder(
+                        tenant=tenant, customer_name='Bench', customer_whatsapp=str(i % 5000),
+                        phone_normalized=normalize_phone(str(i % 5000)),
+                        delivery_address='-', payment_method='pix',
+                        items_total=10, final_total=10, business_date=day,
+                    )
+                    for i in range(count)
+                ], batch_size=2000)
+                # bulk_create grava created_at = agora (auto_now_add); move os pedidos para o dia sintético
+                noon = timezone.make_aware(datetime.combine(day, dt_time(12)))
+                DeliveryOrder.objects.filter(tenant=tenant, business_date=day).update(created_at=noon)
+            created += count
@@ -0,0 +1,143 @@
+"""
+Cardápio compilado por tenant.
+
+O cardápio público (`customer_menu_view`) é montado a partir de várias consultas
+(Tenant, Combos + slots, Itens e Opcionais) e três `json.dumps`. Como ele muda
+raramente e é lido o tempo todo, guardamos no cache um "snapshot" já pronto,
+com a ordenação dos combos aplicada e os JSONs do modal já serializados.
+
+O snapshot é invalidado pelos signals em `delivery/signals.py` sempre que um
+item, combo, slot, opcional, categoria ou o próprio tenant é salvo ou excluído.
+A invalidação só vale para todos os processos com um cache compartilhado
+(REDIS_URL); sem ele, os outros processos veem o snapshot antigo por até
+MENU_CACHE_TIMEOUT segundos. Por isso o snapshot serve só para exibir o
+cardápio: decisões como recusar itens no carrinho com a loja fechada consultam
+o banco.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+from myproject.db_routers import use_primary
+from shop.image_variants import srcset, thumbnail
+from shop.models import Tenant
+from .models import Combo, MenuItem, DeliveryOptional
+
+CACHE_KEY = 'delivery:menu:{slug}'
+CACHE_TIMEOUT = getattr(settings, 'MENU_CACHE_TIMEOUT', 60)  # Curto sem cache compartilhado (ver settings)
+
+
+def _combo_sort_key(combo):
+    """
+    Ordena combos por caracteres especiais/números primeiro, depois alfabeticamente.
+    """
+    name = combo.name.strip()
+    if not name:
+        return ('z', '')  # Coloca vazio no final
+
+    first_char = name[0]
+    is_special_or_number = not first_char.isalpha()
+
+    # Tupla para ordenação: (é alfabético, nome normalizado)
+    # É alfabético? 1 (sim) ou 0 (não) - números e especiais vêm primeiro
+    return (is_special_or_number is False, name.lower())
+
+
+def compile_menu(tenant):
+    """
+    Monta o snapshot do cardápio de um tenant (sem consultar o cache).
+    Retorna um dicionário simples, serializável e pronto para o template.
+    """
+    combos = Combo.objects.filter(tenant=tenant, is_available=True).prefetch_related('slots__allowed_category')
+    combos = sorted(combos, key=_combo_sort_key)
+    menu_items = MenuItem.objects.filter(tenant=tenant, is_available=True).select_related('category')
+    optionals = DeliveryOptional.objects.filter(tenant=tenant)
+
+    combos_data = []
+    combos_js = []
+    for combo in combos:
+        image_url = thumbnail(combo.image, 640)
+        combos_data.append({
+            'id': combo.id,
+            'name': combo.name,
+            'description': combo.description or '',
+            'price': combo.price,
+            'image_url': image_url,
+            'image_srcset': srcset(combo.image, 'webp'),
+            'image_srcset_jpeg': srcset(combo.image, 'jpeg'),
+        })
+        c = {'id': combo.id, 'name': combo.name, 'price': str(combo.price), 'description': combo.description or '', 'image': image_url, 'slots': []}
+        for slot in combo.slots.all():
+            c['slots'].append({'allowed_category': {'id': slot.allowed_category.id, 'name': slot.allowed_category.name}})
+        combos_js.append(c)
+
+    items_data = []
+    items_js = []
+    for item in menu_items:
+        items_data.append({
+            'id': item.id,
+            'name': item.name,
+            'description': item.description,
+            'price': item.price,
+            'image_url': thumbnail(item.image, 640),
+            'image_srcset': srcset(item.image, 'webp'),
+            'image_srcset_jpeg': srcset(item.image, 'jpeg'),
+            'category': {'id': item.category.id, 'name': item.category.name},
+        })
+        items_js.append({'id': item.id, 'name': item.name, 'price': item.price, 'category_id': item.category_id})
+
+    optionals_js = list(optionals.values('id', 'name', 'price', 'category_id'))
+
+    snapshot = {
+        'tenant': {
+            'id': tenant.id,
+            'name': tenant.name,
+            'slug': tenant.slug,
+            'is_open': tenant.is_open,
+            'whatsapp_number': tenant.whatsapp_number,
+            'logo_url': tenant.logo_url,
+        },
+        'combos': combos_data,
+        'menu_items': items_data,
+        'combos_json': json.dumps(combos_js),
+        'menu_items_json': json.dumps(items_js, default=str),
+        'optionals_json': json.dumps(optionals_js, default=str),
+    }
+    # A versão é o hash do conteúdo: serve de ETag e muda apenas quando o cardápio muda.
+    payload = json.dumps(snapshot, default=str, sort_keys=True).encode('utf-8')
+    snapshot['version'] = hashlib.sha1(payload).hexdigest()[:16]
+    return snapshot
+
+
+def get_compiled_menu(tenant_slug):
+    """
+    Retorna o snapshot do cardápio pelo slug do tenant.
+    Em um acerto de cache nenhuma consulta ao banco é feita.
+    Retorna None se o tenant não existir.
+    """
+    key = CACHE_KEY.format(slug=tenant_slug)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        # O snapshot fica horas no cache: nunca é montado com dados atrasados da réplica
+        with use_primary():
+            try:
+                tenant = Tenant.objects.get(slug=tenant_slug)
+            except Tenant.DoesNotExist:
+                return None
+            snapshot = compile_menu(tenant)
+        cache.set(key, snapshot, CACHE_TIMEOUT)
+    return snapshot
+
+
+def invalidate_menu(tenant_slug):
+    """Descarta o snapshot do cardápio de um tenant."""
+    if tenant_slug:
+        cache.delete(CACHE_KEY.format(slug=tenant_slug))
+
+
+def invalidate_menu_for_tenant_id(tenant_id):
+    """Descarta o snapshot a partir do ID do tenant (usado pelos signals dos itens)."""
+    slug = Tenant.objects.filter(id=tenant_id).values_list('slug', flat=True).first()
+    invalidate_menu(slug)
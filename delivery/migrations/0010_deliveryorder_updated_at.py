@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-18 04:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0009_systemnotice'),
+        ('shop', '0017_alter_tenant_business_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliveryorder',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='deliveryorder',
+            index=models.Index(fields=['tenant', 'updated_at'], name='delivery_order_tenant_upd_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.6 on 2026-10-18 04:34
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_business_date(apps, schema_editor):
+    """Preenche a data local dos pedidos já existentes."""
+    DeliveryOrder = apps.get_model('delivery', 'DeliveryOrder')
+    batch = []
+    for obj in DeliveryOrder.objects.filter(created_at__isnull=False).only('id', 'created_at').iterator(chunk_size=2000):
+        obj.business_date = timezone.localdate(obj.created_at)
+        batch.append(obj)
+        if len(batch) >= 2000:
+            DeliveryOrder.objects.bulk_update(batch, ['business_date'])
+            batch = []
+    DeliveryOrder.objects.bulk_update(batch, ['business_date'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0010_deliveryorder_updated_at'),
+        ('shop', '0018_dailysalesrollup_customersalesrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliveryorder',
+            name='business_date',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='Data do Pedido'),
+        ),
+        migrations.RunPython(fill_business_date, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='deliveryorder',
+            index=models.Index(fields=['tenant', 'business_date'], name='delivery_order_tenant_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deliveryorder',
+            index=models.Index(fields=['tenant', '-id'], name='delivery_order_tenant_id_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-18 05:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0012_image_variants'),
+        ('shop', '0026_phone_normalized'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliveryorder',
+            name='phone_normalized',
+            field=models.CharField(blank=True, default='', editable=False, max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='deliveryorder',
+            index=models.Index(fields=['tenant', 'phone_normalized', '-created_at'], name='delivery_order_tenant_ph_idx'),
+        ),
+    ]
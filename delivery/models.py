@@ -1,6 +1,7 @@
 from django.db import models
 from django.utils import timezone
 from shop.models import Tenant # Reutiliza o modelo Tenant do app principal
+from shop.phones import normalize_phone
 
 class DeliveryCategory(models.Model):
     tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='delivery_categories')
@@ -21,6 +22,7 @@ class MenuItem(models.Model):
     description = models.TextField(blank=True, verbose_name="Descrição")
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Preço")
     image = models.ImageField(upload_to='menu_items/', blank=True, null=True, verbose_name="Imagem")
+    image_variants = models.JSONField(default=dict, blank=True, editable=False) # Tamanhos gerados da imagem (ver shop/image_variants.py)
     is_available = models.BooleanField(default=True, verbose_name="Disponível")
 
     class Meta:
@@ -62,6 +64,8 @@ class DeliveryOrder(models.Model):
     tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='delivery_orders')
     customer_name = models.CharField(max_length=100, verbose_name="Nome do Cliente")
     customer_whatsapp = models.CharField(max_length=20, verbose_name="WhatsApp")
+    # WhatsApp em E.164 (ver shop/phones.py), gravado no save para o histórico do cliente buscar por índice
+    phone_normalized = models.CharField(max_length=20, blank=True, default='', editable=False)
     delivery_address = models.CharField(max_length=255, verbose_name="Endereço de Entrega")
     delivery_zone = models.ForeignKey(DeliveryZone, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Bairro")
     payment_method = models.CharField(max_length=20, choices=PAYMENT_CHOICES, verbose_name="Forma de Pagamento")
@@ -74,10 +78,27 @@ class DeliveryOrder(models.Model):
 
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name="Status")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True) # Cursor da API incremental do painel de pedidos
+    # Dia do pedido no fuso local (TIME_ZONE), gravado no save para os filtros por data usarem índice
+    business_date = models.DateField(null=True, blank=True, editable=False, verbose_name="Data do Pedido")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['tenant', 'updated_at'], name='delivery_order_tenant_upd_idx'),
+            models.Index(fields=['tenant', 'business_date'], name='delivery_order_tenant_day_idx'),
+            models.Index(fields=['tenant', '-id'], name='delivery_order_tenant_id_idx'),
+            models.Index(fields=['tenant', 'phone_normalized', '-created_at'], name='delivery_order_tenant_ph_idx'),
+        ]
 
     def __str__(self):
         return f"Pedido #{self.id} - {self.customer_name}"
 
+    def save(self, *args, **kwargs):
+        if self.business_date is None:
+            self.business_date = timezone.localdate(self.created_at or timezone.now())
+        self.phone_normalized = normalize_phone(self.customer_whatsapp)
+        super().save(*args, **kwargs)
+
 class DeliveryOrderItem(models.Model):
     order = models.ForeignKey(DeliveryOrder, on_delete=models.CASCADE, related_name='items')
     item_name = models.CharField(max_length=200) # Snapshot of the name
@@ -94,6 +115,7 @@ class Combo(models.Model):
     description = models.TextField(blank=True, verbose_name="Descrição")
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Preço do Combo")
     image = models.ImageField(upload_to='combo_images/', blank=True, null=True, verbose_name="Imagem do Combo")
+    image_variants = models.JSONField(default=dict, blank=True, editable=False) # Tamanhos gerados da imagem (ver shop/image_variants.py)
     is_available = models.BooleanField(default=True, verbose_name="Disponível")
 
     class Meta:
@@ -131,6 +153,7 @@ class DeliveryOptional(models.Model):
 class MenuOnlineImage(models.Model):
     tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='menu_online_images')
     image = models.ImageField(upload_to='menu_online/', verbose_name="Imagem do Cardápio")
+    image_variants = models.JSONField(default=dict, blank=True, editable=False) # Tamanhos gerados da imagem (ver shop/image_variants.py)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -0,0 +1,64 @@
+"""
+Mensagens de WhatsApp dos cards do painel de pedidos.
+
+Os links "Confirmar Pedido" e "Avisar Entrega" levam a mensagem inteira na URL.
+Montá-la no template exigia percorrer os itens de novo e aplicar `urlencode`
+campo a campo; aqui cada mensagem é montada uma vez por pedido, a partir dos
+itens já carregados (`prefetch_related('items')`), e o card só exibe a URL.
+"""
+from urllib.parse import quote
+
+from django.template.defaultfilters import floatformat
+
+from shop.phones import normalize_phone
+
+SEPARATOR = '-' * 30
+
+
+def whatsapp_number(raw):
+    """Número no formato do wa.me (E.164 sem o '+')."""
+    return normalize_phone(raw).lstrip('+')
+
+
+def confirmation_message(order):
+    neighborhood = order.delivery_zone.neighborhood if order.delivery_zone else ''
+    lines = [
+        f'Pedido #{order.id} Recebido!',
+        SEPARATOR,
+        f'Cliente: {order.customer_name}',
+        f'Telefone: {order.customer_whatsapp}',
+        f'Endereço: {order.delivery_address} - {neighborhood}',
+        SEPARATOR,
+        'Itens:',
+    ]
+    lines += [f'{item.quantity}x {item.item_name}' for item in order.items.all()]
+    if order.observations:
+        lines.append(f'Obs: {order.observations}')
+    payment = f'Pagamento: {order.get_payment_method_display()}'
+    if order.change_for:
+        payment += f' (Troco para {floatformat(order.change_for, 2)})'
+    lines += [
+        SEPARATOR,
+        f'Taxa Entrega: R$ {floatformat(order.delivery_fee, 2)}',
+        f'Total: R$ {floatformat(order.final_total, 2)}',
+        payment,
+        '',
+        'Assim que o motoboy sair lhe avisaremos por aqui.',
+    ]
+    return '\n'.join(lines)
+
+
+def dispatch_message(order):
+    return f'Olá {order.customer_name}, seu pedido #{order.id} saiu para entrega! 🛵\nPor favor, fique no aguardo.'
+
+
+def whatsapp_url(order, message):
+    return f'https://wa.me/{whatsapp_number(order.customer_whatsapp)}?text={quote(message)}'
+
+
+def attach_whatsapp_urls(orders):
+    """Grava em cada pedido as URLs `whatsapp_confirm_url` e `whatsapp_dispatch_url` usadas pelo card."""
+    for order in orders:
+        order.whatsapp_confirm_url = whatsapp_url(order, confirmation_message(order))
+        order.whatsapp_dispatch_url = whatsapp_url(order, dispatch_message(order))
+    return orders
@@ -0,0 +1,100 @@
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from shop import image_variants
+from shop.models import Tenant
+from shop.rollups import Contribution, contribution_on_load, remember_contribution, saved_contribution, sync_contribution
+from .events import get_broker, orders_channel, order_event
+from .menu_cache import invalidate_menu, invalidate_menu_for_tenant_id
+from .models import MenuItem, Combo, ComboSlot, DeliveryOptional, DeliveryCategory, DeliveryOrder, MenuOnlineImage
+
+
+def _schedule_menu_invalidation(tenant_id):
+    # Só invalida depois do commit, para que uma requisição concorrente não recompile
+    # o cardápio com os dados antigos e os coloque de volta no cache.
+    transaction.on_commit(lambda: invalidate_menu_for_tenant_id(tenant_id))
+
+
+@receiver([post_save, post_delete], sender=MenuItem)
+@receiver([post_save, post_delete], sender=Combo)
+@receiver([post_save, post_delete], sender=DeliveryOptional)
+@receiver([post_save, post_delete], sender=DeliveryCategory)
+def menu_changed(sender, instance, **kwargs):
+    _schedule_menu_invalidation(instance.tenant_id)
+
+
+@receiver([post_save, post_delete], sender=ComboSlot)
+def combo_slot_changed(sender, instance, **kwargs):
+    tenant_id = Combo.objects.filter(id=instance.combo_id).values_list('tenant_id', flat=True).first()
+    if tenant_id:
+        _schedule_menu_invalidation(tenant_id)
+
+
+def _menu_image_ready(instance):
+    # As variantes são gravadas com update() (sem signals); o snapshot guarda as URLs delas
+    invalidate_menu_for_tenant_id(instance.tenant_id)
+
+
+image_variants.register(MenuItem, 'image', 'image_variants', on_ready=_menu_image_ready)
+image_variants.register(Combo, 'image', 'image_variants', on_ready=_menu_image_ready)
+# O cardápio em imagem é lido em tela cheia: tamanhos maiores
+image_variants.register(MenuOnlineImage, 'image', 'image_variants', widths=(640, 1024, 1600))
+
+
+@receiver(pre_save, sender=Tenant)
+def tenant_slug_changed(sender, instance, **kwargs):
+    # Se o slug mudou, o snapshot antigo ficaria órfão no cache.
+    if instance.pk:
+        old_slug = Tenant.objects.filter(pk=instance.pk).values_list('slug', flat=True).first()
+        if old_slug and old_slug != instance.slug:
+            transaction.on_commit(lambda: invalidate_menu(old_slug))
+
+
+@receiver([post_save, post_delete], sender=Tenant)
+def tenant_changed(sender, instance, **kwargs):
+    # Nome, logo e "loja aberta" fazem parte do snapshot.
+    slug = instance.slug
+    transaction.on_commit(lambda: invalidate_menu(slug))
+
+
+@receiver(post_save, sender=DeliveryOrder)
+def delivery_order_saved(sender, instance, created, **kwargs):
+    # Publica depois do commit: nesse ponto os itens do pedido (bulk_create) já existem.
+    channel = orders_channel(instance.tenant_id)
+    message = order_event(instance, created=created)
+    transaction.on_commit(lambda: get_broker().publish(channel, message))
+
+
+def order_sales_contribution(order):
+    """Contribuição do pedido para os relatórios de vendas (pedidos cancelados não contam)."""
+    if order.status == 'cancelled' or order.business_date is None:
+        return None
+    return Contribution(
+        date=order.business_date,
+        total=order.final_total,
+        customer_whatsapp=order.customer_whatsapp,
+        customer_name=order.customer_name,
+    )
+
+
+@receiver(post_init, sender=DeliveryOrder)
+def delivery_order_loaded(sender, instance, **kwargs):
+    contribution_on_load(instance, order_sales_contribution)
+
+
+@receiver(pre_save, sender=DeliveryOrder)
+def delivery_order_before_save(sender, instance, **kwargs):
+    remember_contribution(sender, instance, order_sales_contribution)
+
+
+@receiver(post_save, sender=DeliveryOrder)
+def delivery_order_rollups(sender, instance, **kwargs):
+    current = order_sales_contribution(instance)
+    sync_contribution(instance.tenant_id, 'delivery', getattr(instance, '_rollup_previous', None), current)
+    saved_contribution(instance, current)
+
+
+@receiver(post_delete, sender=DeliveryOrder)
+def delivery_order_deleted(sender, instance, **kwargs):
+    sync_contribution(instance.tenant_id, 'delivery', order_sales_contribution(instance), None)
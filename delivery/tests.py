@@ -1,3 +1,32 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
+
+from shop.models import Tenant
+from shop.phones import INCOMPLETE_PHONE_MESSAGE
+from .models import DeliveryOrder
+
+
+class CustomerOrdersLookupTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(username='pizzaria')
+        self.tenant = Tenant.objects.create(name='Pizzaria', user=user, slug='pizzaria', business_type='delivery')
+        DeliveryOrder.objects.create(
+            tenant=self.tenant, customer_name='Ana', customer_whatsapp='(11) 99999-8888',
+            delivery_address='Rua A', payment_method='pix', items_total=Decimal('30.00'), final_total=Decimal('30.00'),
+        )
+        self.url = reverse('delivery:get_customer_orders', args=[self.tenant.slug])
+
+    def test_full_number_in_any_format(self):
+        for phone in ('11999998888', '+55 11 99999-8888', '011 99999 8888'):
+            response = self.client.get(self.url, {'phone': phone})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()['orders']), 1, phone)
 
-# Create your tests here.
+    def test_partial_number_asks_for_the_full_number(self):
+        for phone in ('99998888', '8888'):
+            response = self.client.get(self.url, {'phone': phone})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'status': 'error', 'message': INCOMPLETE_PHONE_MESSAGE})
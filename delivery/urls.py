@@ -20,6 +20,8 @@ urlpatterns = [
     path('meus-pedidos/<slug:tenant_slug>/', views.get_customer_orders, name='get_customer_orders'),
     path('repetir-pedido/<slug:tenant_slug>/<int:order_id>/', views.repeat_order, name='repeat_order'),
     path('api/ultimos-pedidos/', views.get_latest_order_id, name='get_latest_order_id'),
+    path('api/pedidos/stream/', views.orders_stream_view, name='orders_stream'),
+    path('api/pedidos/delta/', views.orders_delta_view, name='orders_delta'),
     path('relatorios/', views.delivery_reports_view, name='reports'),
     path('vendas/', views.delivery_pos_view, name='pos'),
     path('cardapio-online/', views.menu_online_view, name='menu_online'),
@@ -1,46 +1,54 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, Http404, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import etag
 import json
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.template.loader import render_to_string
 from datetime import timedelta, datetime
-from django.db.models import Sum, Count, Max
-from django.db.models.functions import TruncDate
+from django.core.paginator import Paginator
+from django.db.models import Sum, Count, Max, Q
 from urllib.parse import quote
-from shop.models import Tenant # Importamos o Tenant do app shop (Core)
+from myproject.db_routers import use_replica
+from shop.models import Tenant, DailySalesRollup, CustomerSalesRollup # Importamos o Tenant do app shop (Core)
+from shop.orders import save_order
+from shop.phones import INCOMPLETE_PHONE_MESSAGE, is_complete_phone, normalize_phone
+from shop.auth import tenant_required
+from shop.tenants import get_tenant_or_404
 from .models import DeliveryCategory, MenuItem, DeliveryZone, Combo, DeliveryOrder, DeliveryOrderItem, DeliveryOptional, MenuOnlineImage, SystemNotice
+from .menu_cache import get_compiled_menu
+from .order_messages import attach_whatsapp_urls
+from .events import get_broker, orders_channel, push_available
+from .cart import resolve_cart, build_cart_key
+from .cart_store import CartFull, get_cart_store
 from .forms import DeliveryCategoryForm, MenuItemForm, DeliveryZoneForm, ComboForm, ComboSlotFormSet, DeliveryOrderForm, DeliveryOptionalForm
 
-@login_required(login_url='login')
-def delivery_dashboard(request):
-    try:
-        tenant = request.user.tenant
-    except Tenant.DoesNotExist:
-        return render(request, 'error.html', {'message': 'Você não tem uma loja associada.'})
+ORDERS_LONG_POLL_TIMEOUT = 25  # segundos
+ORDERS_STREAM_HEARTBEAT = 15  # segundos
+ORDERS_DELTA_LIMIT = 100
+ORDERS_PAGE_SIZE = 30 # Cards por página no painel de pedidos
+DELIVERY_BUSINESS_TYPES = ('delivery', 'bar_delivery') # Lojas com acesso ao painel do delivery
 
+@tenant_required(business_types=DELIVERY_BUSINESS_TYPES)
+def delivery_dashboard(request):
     system_notices = SystemNotice.objects.filter(is_active=True)
     return render(request, 'delivery_inicio.html', {'system_notices': system_notices})
 
-@login_required(login_url='login')
+@tenant_required(business_types=DELIVERY_BUSINESS_TYPES)
 def toggle_store_status(request):
-    try:
-        tenant = request.user.tenant
-        tenant.is_open = not tenant.is_open
-        tenant.save()
-        status = "aberta" if tenant.is_open else "fechada"
-        messages.success(request, f"Sua loja agora está {status} para pedidos!")
-    except Tenant.DoesNotExist:
-        messages.error(request, 'Você não tem uma loja associada.')
+    tenant = request.tenant
+    tenant.is_open = not tenant.is_open
+    tenant.save()
+    status = "aberta" if tenant.is_open else "fechada"
+    messages.success(request, f"Sua loja agora está {status} para pedidos!")
     return redirect('delivery:dashboard')
 
-@login_required(login_url='login')
+@tenant_required(business_types=DELIVERY_BUSINESS_TYPES)
 def menu_admin_view(request):
-    try:
-        tenant = request.user.tenant
-    except Tenant.DoesNotExist:
-        return render(request, 'error.html', {'message': 'Você não tem uma loja associada.'})
+    tenant = request.tenant
 
     if request.method == 'POST':
         form_type = request.POST.get('form_type')
@@ -126,12 +134,9 @@ def menu_admin_view(request):
     }
     return render(request, 'delivery/menu_admin.html', context)
 
-@login_required(login_url='login')
+@tenant_required(business_types=DELIVERY_BUSINESS_TYPES)
 def combo_admin_view(request):
-    try:
-        tenant = request.user.tenant
-    except Tenant.DoesNotExist:
-        return render(request, 'error.html', {'message': 'Você não tem uma loja associada.'})
+    tenant = request.tenant
 
     # Inicializa formulários vazios por padrão (evita erro UnboundLocalError)
     form = ComboForm()
@@ -162,65 +167,46 @@ def combo_admin_view(request):
     context = { 'form': form, 'formset': formset, 'combos': combos }
     return render(request, 'delivery/combo_admin.html', context)
 
+def _customer_menu_etag(request, tenant_slug):
+    """ETag do cardápio público: versão do snapshot + quantidade de itens no carrinho."""
+    snapshot = get_compiled_menu(tenant_slug)
+    if snapshot is None:
+        return None
+    return f"{snapshot['version']}-{get_cart_store(request).count()}"
+
+@use_replica
+@etag(_customer_menu_etag)
 def customer_menu_view(request, tenant_slug):
     """
     Exibe o cardápio público para o cliente, com combos e itens por categoria.
+    Os dados vêm do cardápio compilado (`menu_cache`), sem consultas em um acerto de cache.
     """
-    tenant = get_object_or_404(Tenant, slug=tenant_slug)
-
-    # Busca combos e itens disponíveis
-    combos = Combo.objects.filter(tenant=tenant, is_available=True).prefetch_related('slots__allowed_category')
-    menu_items = MenuItem.objects.filter(tenant=tenant, is_available=True).select_related('category')
-
-    # Ordena combos por caracteres especiais/números primeiro, depois alfabéticamente
-    def sort_key(combo):
-        name = combo.name.strip()
-        if not name:
-            return ('z', '')  # Coloca vazio no final
-        
-        first_char = name[0]
-        is_special_or_number = not first_char.isalpha()
-        
-        # Tupla para ordenação: (é alfabético, nome normalizado)
-        # É alfabético? 1 (sim) ou 0 (não) - números e especiais vêm primeiro
-        return (is_special_or_number is False, name.lower())
-    
-    combos = sorted(combos, key=sort_key)
-
-    # Prepara dados em formato JSON para o JavaScript do modal de combos
-    combos_list_for_js = []
-    for combo in combos:
-        c = {'id': combo.id, 'name': combo.name, 'price': str(combo.price), 'description': combo.description or '', 'image': combo.image.url if combo.image else None, 'slots': []}
-        for slot in combo.slots.all():
-            c['slots'].append({'allowed_category': {'id': slot.allowed_category.id, 'name': slot.allowed_category.name}})
-        combos_list_for_js.append(c)
-
-    menu_items_list_for_js = list(menu_items.values('id', 'name', 'price', 'category_id'))
-    
-    # Prepara lista de opcionais para o JS
-    optionals = DeliveryOptional.objects.filter(tenant=tenant)
-    optionals_list_for_js = list(optionals.values('id', 'name', 'price', 'category_id'))
+    snapshot = get_compiled_menu(tenant_slug)
+    if snapshot is None:
+        raise Http404("Loja não encontrada.")
 
     # Calcula o total de itens no carrinho para exibir no ícone flutuante
-    cart = request.session.get('delivery_cart', {})
-    cart_total_items = sum(cart.values())
+    cart_total_items = get_cart_store(request).count()
 
     context = {
-        'tenant': tenant,
-        'combos': combos,
-        'menu_items': menu_items,
-        'combos_json': json.dumps(combos_list_for_js),
-        'menu_items_json': json.dumps(menu_items_list_for_js, default=str),
-        'optionals_json': json.dumps(optionals_list_for_js, default=str),
+        'tenant': snapshot['tenant'],
+        'combos': snapshot['combos'],
+        'menu_items': snapshot['menu_items'],
+        'combos_json': snapshot['combos_json'],
+        'menu_items_json': snapshot['menu_items_json'],
+        'optionals_json': snapshot['optionals_json'],
         'cart_total_items': cart_total_items,
     }
     return render(request, 'delivery/customer_menu.html', context)
 
 @csrf_exempt
 def add_to_delivery_cart(request, tenant_slug):
-    # Verifica se a loja está aberta antes de adicionar
-    tenant = get_object_or_404(Tenant, slug=tenant_slug)
-    if not tenant.is_open:
+    # Verifica se a loja está aberta antes de adicionar. Direto no banco: o cardápio
+    # compilado é só para exibição e, sem cache compartilhado, pode estar defasado
+    is_open = Tenant.objects.filter(slug=tenant_slug).values_list('is_open', flat=True).first()
+    if is_open is None:
+        raise Http404("Loja não encontrada.")
+    if not is_open:
         return JsonResponse({'status': 'error', 'message': 'A loja está fechada no momento.'}, status=400)
 
     if request.method == 'POST':
@@ -240,92 +226,30 @@ def add_to_delivery_cart(request, tenant_slug):
         if not item_key:
             return JsonResponse({'status': 'error', 'message': 'Chave do item não fornecida.'}, status=400)
         
-        cart = request.session.get('delivery_cart', {})
-        
-        cart[item_key] = cart.get(item_key, 0) + 1
-        request.session['delivery_cart'] = cart
-        
-        total_items = sum(cart.values())
-        
-        return JsonResponse({'status': 'ok', 'cart_total_items': total_items})
+        cart = get_cart_store(request)
+        try:
+            total_items = cart.add(item_key)
+        except CartFull as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+        return cart.save(JsonResponse({'status': 'ok', 'cart_total_items': total_items}))
     return JsonResponse({'status': 'error'}, status=400)
 
 def remove_from_delivery_cart(request, tenant_slug, cart_key):
-    cart = request.session.get('delivery_cart', {})
-    
-    if cart_key in cart:
-        del cart[cart_key]
-    
-    request.session['delivery_cart'] = cart
-    
-    return redirect('delivery:checkout', tenant_slug=tenant_slug)
+    cart = get_cart_store(request)
+    cart.remove(cart_key)
+    return cart.save(redirect('delivery:checkout', tenant_slug=tenant_slug))
 
 def delivery_checkout_view(request, tenant_slug):
-    tenant = get_object_or_404(Tenant, slug=tenant_slug)
-    cart_session = request.session.get('delivery_cart', {})
-    
-    if not cart_session:
+    tenant = get_tenant_or_404(request, tenant_slug)
+    cart = get_cart_store(request)
+
+    if not cart:
         messages.warning(request, "Seu carrinho está vazio.")
         return redirect('delivery:customer_menu', tenant_slug=tenant.slug)
 
-    cart_items = []
-    items_total = 0
-    for key, quantity in cart_session.items():
-        parts = key.split('_')
-        item_type = parts[0]
-        
-        if item_type == 'item':
-            try:
-                item_id = parts[1]
-                # Verifica se há IDs de opcionais na chave (item_ID_Opt1_Opt2)
-                optional_ids = parts[2:] if len(parts) > 2 else []
-
-                item = MenuItem.objects.get(id=item_id, tenant=tenant)
-                
-                # Calcula custo dos opcionais
-                selected_optionals = []
-                optionals_cost = 0
-                if optional_ids:
-                    selected_optionals = list(DeliveryOptional.objects.filter(id__in=optional_ids, tenant=tenant))
-                    optionals_cost = sum(opt.price for opt in selected_optionals)
-
-                subtotal = (item.price + optionals_cost) * quantity
-                items_total += subtotal
-                cart_items.append({
-                    'key': key, 
-                    'name': item.name,
-                    'quantity': quantity, 
-                    'subtotal': subtotal,
-                    'is_combo': False,
-                    'optionals': selected_optionals # Passa os objetos para o template
-                })
-            except (MenuItem.DoesNotExist, IndexError):
-                continue
-        elif item_type == 'combo':
-            try:
-                combo_id = parts[1]
-                choice_ids = parts[2:]
-                combo = Combo.objects.get(id=combo_id, tenant=tenant)
-                choices = []
-                for choice_id in choice_ids:
-                    try:
-                        item = MenuItem.objects.get(id=choice_id, tenant=tenant)
-                        choices.append(item)
-                    except MenuItem.DoesNotExist:
-                        pass
-                
-                subtotal = combo.price * quantity
-                items_total += subtotal
-                cart_items.append({
-                    'key': key, 
-                    'name': combo.name,
-                    'choices': choices,
-                    'quantity': quantity, 
-                    'subtotal': subtotal, 
-                    'is_combo': True
-                })
-            except (Combo.DoesNotExist, IndexError):
-                continue
+    # Resolve todas as chaves do carrinho com no máximo três consultas
+    cart_items, items_total = resolve_cart(tenant, cart.items().items())
 
     if request.method == 'POST':
         form = DeliveryOrderForm(request.POST, tenant=tenant)
@@ -335,38 +259,20 @@ def delivery_checkout_view(request, tenant_slug):
             order.items_total = items_total
             order.delivery_fee = form.cleaned_data.get('delivery_zone').delivery_fee if form.cleaned_data.get('delivery_zone') else 0
             order.final_total = order.items_total + order.delivery_fee
-            order.save()
-
-            # Salva os itens do pedido no banco de dados
-            for cart_item in cart_items:
-                if cart_item['is_combo']:
-                    # Para combos, salva o nome do combo e as escolhas
-                    choices_formatted = "\n".join([f"* {c.category.name}: {c.name}" for c in cart_item['choices']])
-                    item_name_with_choices = f"{cart_item['name']} (\n{choices_formatted})"
-                    DeliveryOrderItem.objects.create(
-                        order=order, 
-                        item_name=item_name_with_choices, 
-                        quantity=cart_item['quantity'], 
-                        price=cart_item['subtotal'] / cart_item['quantity'], # Preço de um combo
-                        original_cart_key=cart_item['key']
-                    )
-                else:
-                    # Para itens normais
-                    item_name_desc = cart_item['name']
-                    if cart_item.get('optionals'):
-                        opts_str = ", ".join([f"*{opt.name}" for opt in cart_item['optionals']])
-                        item_name_desc += f" ({opts_str})"
-
-                    DeliveryOrderItem.objects.create(
-                        order=order, 
-                        item_name=item_name_desc, 
-                        quantity=cart_item['quantity'], 
-                        price=cart_item['subtotal'] / cart_item['quantity'], # Preço de um item
-                        original_cart_key=cart_item['key']
-                    )
-            
-            del request.session['delivery_cart']
-            return redirect('delivery:order_confirmation', order_id=order.id)
+
+            # Salva o pedido e seus itens no banco de dados, de uma vez só
+            save_order(order, [
+                DeliveryOrderItem(
+                    item_name=cart_item.order_item_name,
+                    quantity=cart_item.quantity,
+                    price=cart_item.unit_price,
+                    original_cart_key=cart_item.key
+                )
+                for cart_item in cart_items
+            ])
+
+            cart.clear()
+            return cart.save(redirect('delivery:order_confirmation', order_id=order.id))
     else:
         form = DeliveryOrderForm(tenant=tenant)
 
@@ -421,52 +327,139 @@ def delivery_order_confirmation_view(request, order_id):
     context = {'order': order, 'whatsapp_message': whatsapp_message}
     return render(request, 'delivery/order_confirmation.html', context)
 
-@login_required(login_url='login')
+@tenant_required(business_types=DELIVERY_BUSINESS_TYPES)
 def orders_list_view(request):
-    try:
-        tenant = request.user.tenant
-    except Tenant.DoesNotExist:
-        return render(request, 'error.html', {'message': 'Você não tem uma loja associada.'})
+    tenant = request.tenant
 
     # Filtro de Data
     filter_date = request.GET.get('filter_date', 'today') # Padrão: Hoje
     
     orders = DeliveryOrder.objects.filter(tenant=tenant)
 
-    today = datetime.now().date()
+    today = timezone.localdate()
 
+    # business_date é o dia local já gravado no pedido: o filtro vira uma busca no índice (tenant, business_date)
     if filter_date == 'today':
-        orders = orders.filter(created_at__date=today)
+        orders = orders.filter(business_date=today)
 
     elif filter_date == 'yesterday':
-        orders = orders.filter(created_at__date=today - timedelta(days=1))
+        orders = orders.filter(business_date=today - timedelta(days=1))
 
     elif filter_date == 'week':
-        orders = orders.filter(created_at__date__gte=today - timedelta(days=7))
-    
-    orders = orders.order_by('-id')
+        orders = orders.filter(business_date__gte=today - timedelta(days=7))
     
+    # Contagem por status (abas) em uma única consulta agrupada
+    status_counts = dict(orders.order_by().values_list('status').annotate(total=Count('id')))
+    status_tabs = [('all', 'Todos', sum(status_counts.values()))] + [
+        (value, label, status_counts.get(value, 0)) for value, label in DeliveryOrder.STATUS_CHOICES
+    ]
+
+    filter_status = request.GET.get('status', 'all')
+    if filter_status in status_counts:
+        orders = orders.filter(status=filter_status)
+    elif filter_status != 'all':
+        filter_status = 'all'
+
+    # Uma consulta para a página (com bairro e loja) e uma para os itens de todos os cards
+    orders = orders.select_related('delivery_zone', 'tenant').prefetch_related('items').order_by('-id')
+    page = Paginator(orders, ORDERS_PAGE_SIZE).get_page(request.GET.get('page'))
+    attach_whatsapp_urls(page.object_list)
+
     # Pega o ID do último pedido GLOBAL (sem filtro) para controle de notificações no frontend
-    latest_global_order = DeliveryOrder.objects.filter(tenant=tenant).order_by('-id').first()
-    latest_order_id = latest_global_order.id if latest_global_order else 0
+    latest_order_id = DeliveryOrder.objects.filter(tenant=tenant).order_by('-id').values_list('id', flat=True).first() or 0
 
-    context = {'orders': orders, 'latest_order_id': latest_order_id, 'filter_date': filter_date}
+    context = {
+        'orders': page.object_list,
+        'page_obj': page,
+        'status_tabs': status_tabs,
+        'filter_status': filter_status,
+        'latest_order_id': latest_order_id,
+        'filter_date': filter_date,
+        'orders_cursor': _orders_cursor(tenant),
+        'orders_push': push_available(request),
+    }
     return render(request, 'delivery/orders_list.html', context)
 
+def _orders_cursor(tenant, default=None):
+    """
+    Cursor da API incremental: `updated_at` e id do último pedido alterado do
+    tenant, no formato "<updated_at ISO>,<id>" (a ordem é a da consulta do delta).
+    """
+    last = DeliveryOrder.objects.filter(tenant=tenant).order_by('-updated_at', '-id').values_list('updated_at', 'id').first()
+    if last is None:
+        return f'{default.isoformat()},0' if default else ''
+    return _format_cursor(*last)
+
+def _format_cursor(updated_at, order_id):
+    return f'{updated_at.isoformat()},{order_id}'
+
+def _parse_cursor(value):
+    """(updated_at, id) do cursor, ou None se inválido. Um cursor só com a data vale como id 0."""
+    timestamp, _, order_id = value.partition(',')
+    updated_at = parse_datetime(timestamp)
+    if updated_at is None:
+        return None
+    try:
+        return updated_at, int(order_id or 0)
+    except ValueError:
+        return None
+
+@tenant_required(business_types=DELIVERY_BUSINESS_TYPES, json=True)
+def orders_delta_view(request):
+    """
+    Retorna apenas os pedidos criados ou alterados desde o cursor informado,
+    cada um com o card já renderizado, para o painel se atualizar no lugar.
+    """
+    tenant = request.tenant
+
+    cursor = _parse_cursor(request.GET.get('cursor', ''))
+    if cursor is None:
+        # Sem cursor válido não há como calcular a diferença; devolve só o ponto de partida
+        return JsonResponse({'cursor': _orders_cursor(tenant, default=timezone.now()), 'orders': [], 'more': False})
+    updated_at, last_id = cursor
+
+    # Paginação por (updated_at, id): pedidos gravados no mesmo instante do cursor
+    # não se perdem e, quando há mais de ORDERS_DELTA_LIMIT, o próximo lote
+    # continua exatamente depois do último devolvido.
+    orders = list(
+        DeliveryOrder.objects.filter(tenant=tenant)
+        .filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=last_id))
+        .select_related('delivery_zone', 'tenant')
+        .prefetch_related('items')
+        .order_by('updated_at', 'id')[:ORDERS_DELTA_LIMIT]
+    )
+
+    if orders:
+        new_cursor = _format_cursor(orders[-1].updated_at, orders[-1].id)
+    else:
+        new_cursor = _format_cursor(updated_at, last_id)
+    attach_whatsapp_urls(orders)
+    orders_data = [
+        {
+            'id': order.id,
+            'status': order.status,
+            'html': render_to_string('delivery/order_card.html', {'order': order}, request=request),
+        }
+        for order in orders
+    ]
+    return JsonResponse({'cursor': new_cursor, 'orders': orders_data, 'more': len(orders) == ORDERS_DELTA_LIMIT})
+
 def get_customer_orders(request, tenant_slug):
     """Busca os últimos pedidos de um cliente pelo telefone."""
-    tenant = get_object_or_404(Tenant, slug=tenant_slug)
-    phone = request.GET.get('phone')
+    tenant = get_tenant_or_404(request, tenant_slug)
+    phone = normalize_phone(request.GET.get('phone'))
     
     if not phone:
         return JsonResponse({'status': 'error', 'message': 'Telefone não informado.'}, status=400)
+    if not is_complete_phone(phone):
+        # A busca é por igualdade no telefone normalizado: parte do número não encontraria nada
+        return JsonResponse({'status': 'error', 'message': INCOMPLETE_PHONE_MESSAGE}, status=400)
 
-    # Limpa o telefone para busca (remove caracteres não numéricos se necessário, 
-    # mas aqui assumiremos que a busca é exata ou 'contains')
+    # Compara o telefone normalizado (índice tenant + telefone + data), com os itens em uma consulta só
     orders = DeliveryOrder.objects.filter(
         tenant=tenant, 
-        customer_whatsapp__icontains=phone
-    ).order_by('-created_at')[:5] # Pega os últimos 5
+        phone_normalized=phone
+    ).prefetch_related('items').order_by('-created_at')[:5] # Pega os últimos 5
 
     orders_data = []
     for order in orders:
@@ -485,42 +478,89 @@ def repeat_order(request, tenant_slug, order_id):
     """Recria o carrinho com base em um pedido anterior e redireciona para o checkout."""
     order = get_object_or_404(DeliveryOrder, id=order_id, tenant__slug=tenant_slug)
     
+    cart_entries = [
+        (item.original_cart_key, item.quantity)
+        for item in order.items.all() if item.original_cart_key
+    ]
+    # Só mantém as linhas que ainda existem no cardápio da loja
+    lines, _ = resolve_cart(order.tenant_id, cart_entries)
     new_cart = {}
-    for item in order.items.all():
-        if item.original_cart_key:
-            new_cart[item.original_cart_key] = item.quantity
+    for line in lines:
+        new_cart[line.key] = new_cart.get(line.key, 0) + line.quantity
     
     if not new_cart:
         messages.error(request, "Não foi possível repetir este pedido (pedido antigo ou itens indisponíveis).")
         return redirect('delivery:customer_menu', tenant_slug=tenant_slug)
 
-    request.session['delivery_cart'] = new_cart
-    request.session.modified = True # Força o salvamento da sessão
-    return redirect('delivery:checkout', tenant_slug=tenant_slug)
+    cart = get_cart_store(request)
+    cart.replace(new_cart)
+    return cart.save(redirect('delivery:checkout', tenant_slug=tenant_slug))
 
 @login_required(login_url='login')
 def get_latest_order_id(request):
     """Retorna o ID do pedido mais recente para verificação via AJAX."""
-    try:
-        tenant = request.user.tenant
-        latest_order = DeliveryOrder.objects.filter(tenant=tenant).order_by('-id').first()
-        latest_id = latest_order.id if latest_order else 0
-        return JsonResponse({'latest_id': latest_id})
-    except:
-        return JsonResponse({'latest_id': 0})
+    latest_id = None
+    if request.tenant:
+        latest_id = DeliveryOrder.objects.filter(tenant=request.tenant).order_by('-id').values_list('id', flat=True).first()
+    return JsonResponse({'latest_id': latest_id or 0})
 
-@login_required(login_url='login')
-def delete_combo_view(request, combo_id):
-    if request.method == 'POST':
+async def orders_stream_view(request):
+    """
+    Canal push do painel de pedidos (SSE ou long-poll, com `?mode=poll`).
+    Envia apenas os pedidos novos ou alterados do tenant, em JSON compacto.
+    O SSE só é aceito no app ASGI com broker entre processos (ver `push_available`);
+    fora disso responde 204, que faz o EventSource desistir sem reconectar.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Não autenticado.'}, status=401)
+    tenant_id = await Tenant.objects.filter(user=user).values_list('id', flat=True).afirst()
+    if tenant_id is None:
+        return JsonResponse({'error': 'Você não tem uma loja associada.'}, status=403)
+
+    broker = get_broker()
+    channel = orders_channel(tenant_id)
+
+    if request.GET.get('mode') == 'poll':
+        subscription = broker.subscribe(channel)
         try:
-            tenant = request.user.tenant
-        except Tenant.DoesNotExist:
-            messages.error(request, 'Você não tem uma loja associada.')
-            return redirect('delivery:combo_admin')
+            message = await subscription.get(timeout=ORDERS_LONG_POLL_TIMEOUT)
+            events = []
+            while message is not None:
+                events.append(json.loads(message))
+                message = await subscription.get(timeout=0)
+        finally:
+            subscription.close()
+        return JsonResponse({'events': events})
+
+    if not push_available(request):
+        return HttpResponse(status=204)
+
+    async def event_stream():
+        subscription = broker.subscribe(channel)
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                message = await subscription.get(timeout=ORDERS_STREAM_HEARTBEAT)
+                if message is None:
+                    # Comentário SSE para manter a conexão viva através de proxies
+                    yield ': ping\n\n'
+                else:
+                    yield f'event: order\ndata: {message}\n\n'
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Desliga o buffer do nginx
+    return response
 
+@tenant_required(business_types=DELIVERY_BUSINESS_TYPES)
+def delete_combo_view(request, combo_id):
+    if request.method == 'POST':
         combo = get_object_or_404(Combo, id=combo_id)
 
-        if combo.tenant != tenant:
+        if combo.tenant_id != request.tenant.id:
             messages.error(request, 'Você não tem permissão para excluir este combo.')
             return redirect('delivery:combo_admin')
 
@@ -530,16 +570,10 @@ def delete_combo_view(request, combo_id):
     
     return redirect('delivery:combo_admin')
 
-@login_required(login_url='login')
+@tenant_required(business_types=DELIVERY_BUSINESS_TYPES)
 def toggle_combo_availability(request, combo_id):
     if request.method == 'POST':
-        try:
-            tenant = request.user.tenant
-        except Tenant.DoesNotExist:
-            messages.error(request, 'Você não tem uma loja associada.')
-            return redirect('delivery:combo_admin')
-
-        combo = get_object_or_404(Combo, id=combo_id, tenant=tenant)
+        combo = get_object_or_404(Combo, id=combo_id, tenant=request.tenant)
 
         combo.is_available = not combo.is_available
         combo.save()
@@ -548,18 +582,12 @@ def toggle_combo_availability(request, combo_id):
     
     return redirect('delivery:combo_admin')
 
-@login_required(login_url='login')
+@tenant_required(business_types=DELIVERY_BUSINESS_TYPES)
 def delete_order_view(request, order_id):
     if request.method == 'POST':
-        try:
-            tenant = request.user.tenant
-        except Tenant.DoesNotExist:
-            messages.error(request, 'Você não tem uma loja associada.')
-            return redirect('delivery:orders_list')
-
         order = get_object_or_404(DeliveryOrder, id=order_id)
 
-        if order.tenant != tenant:
+        if order.tenant_id != request.tenant.id:
             messages.error(request, 'Você não tem permissão para excluir este pedido.')
             return redirect('delivery:orders_list')
 
@@ -568,12 +596,9 @@ def delete_order_view(request, order_id):
     
     return redirect('delivery:orders_list')
 
-@login_required(login_url='login')
+@tenant_required(business_types=DELIVERY_BUSINESS_TYPES)
 def delivery_reports_view(request):
-    try:
-        tenant = request.user.tenant
-    except Tenant.DoesNotExist:
-        return render(request, 'error.html', {'message': 'Você não tem uma loja associada.'})
+    tenant = request.tenant
 
     # Filtro de Datas
     start_date_str = request.GET.get('start_date')
@@ -591,14 +616,12 @@ def delivery_reports_view(request):
     else:
         end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
 
-    # Busca pedidos (excluindo cancelados) no intervalo
-    orders = DeliveryOrder.objects.filter(
-        tenant=tenant, 
-        created_at__date__range=[start_date, end_date]
-    ).exclude(status='cancelled')
-
-    # Agregação por dia para o gráfico
-    daily_sales = orders.annotate(date=TruncDate('created_at')).values('date').annotate(total=Sum('final_total')).order_by('date')
+    # Lê as vendas já consolidadas por dia (pedidos cancelados não entram no consolidado)
+    daily_sales = DailySalesRollup.objects.filter(
+        tenant=tenant,
+        channel='delivery',
+        date__range=[start_date, end_date]
+    ).values('date', 'order_count', 'total')
 
     # Prepara dados para o Chart.js (preenchendo dias vazios com 0)
     dates = []
@@ -612,29 +635,29 @@ def delivery_reports_view(request):
         values.append(float(sales_dict.get(day, 0)))
 
     # Top 10 Clientes por Telefone (Agrupamento)
-    top_customers = orders.values('customer_whatsapp').annotate(
-        order_count=Count('id'),
-        total_spent=Sum('final_total'),
+    top_customers = CustomerSalesRollup.objects.filter(
+        tenant=tenant,
+        date__range=[start_date, end_date]
+    ).values('customer_whatsapp').annotate(
+        order_count=Sum('order_count'),
+        total_spent=Sum('total_spent'),
         customer_name=Max('customer_name') # Pega o nome mais recente/alfabético associado ao número
-    ).order_by('-order_count')[:10]
+    ).filter(order_count__gt=0).order_by('-order_count')[:10]
 
     context = {
         'start_date': start_date.strftime('%Y-%m-%d'),
         'end_date': end_date.strftime('%Y-%m-%d'),
         'dates_json': json.dumps(dates),
         'values_json': json.dumps(values),
-        'total_sales': orders.aggregate(Sum('final_total'))['final_total__sum'] or 0,
-        'total_orders': orders.count(),
+        'total_sales': sum(entry['total'] for entry in daily_sales),
+        'total_orders': sum(entry['order_count'] for entry in daily_sales),
         'top_customers': top_customers,
     }
     return render(request, 'delivery/reports.html', context)
 
-@login_required(login_url='login')
+@tenant_required(business_types=DELIVERY_BUSINESS_TYPES)
 def delivery_pos_view(request):
-    try:
-        tenant = request.user.tenant
-    except Tenant.DoesNotExist:
-        return render(request, 'error.html', {'message': 'Você não tem uma loja associada.'})
+    tenant = request.tenant
 
     if request.method == 'POST':
         form = DeliveryOrderForm(request.POST, tenant=tenant)
@@ -646,63 +669,31 @@ def delivery_pos_view(request):
                 if not cart_items:
                     messages.error(request, "O carrinho está vazio.")
                 else:
-                    order = form.save(commit=False)
-                    order.tenant = tenant
-                    
-                    items_total = 0
-                    final_items = []
-
+                    # Converte as linhas do PDV para chaves do carrinho e resolve tudo de uma vez
+                    cart_entries = []
                     for item in cart_items:
-                        if item['type'] == 'item':
-                            db_item = MenuItem.objects.get(id=item['id'])
-                            opt_ids = item.get('optionals', [])
-                            opts = DeliveryOptional.objects.filter(id__in=opt_ids)
-                            opts_total = sum(o.price for o in opts)
-                            
-                            unit_price = float(db_item.price) + float(opts_total)
-                            subtotal = unit_price * int(item['quantity'])
-                            items_total += subtotal
-                            
-                            name_desc = db_item.name
-                            if opts:
-                                name_desc += " (" + ", ".join([f"*{o.name}" for o in opts]) + ")"
-                            
-                            final_items.append({
-                                'name': name_desc,
-                                'quantity': item['quantity'],
-                                'price': unit_price
-                            })
-                            
-                        elif item['type'] == 'combo':
-                            db_combo = Combo.objects.get(id=item['id'])
-                            unit_price = float(db_combo.price)
-                            subtotal = unit_price * int(item['quantity'])
-                            items_total += subtotal
-                            
-                            choice_ids = item.get('choices', [])
-                            choices = MenuItem.objects.filter(id__in=choice_ids).select_related('category')
-                            choice_names = "\n".join([f"* {c.category.name}: {c.name}" for c in choices])
-                            name_desc = f"{db_combo.name} (\n{choice_names})"
-                            
-                            final_items.append({
-                                'name': name_desc,
-                                'quantity': item['quantity'],
-                                'price': unit_price
-                            })
+                        extra_ids = item.get('optionals', []) if item['type'] == 'item' else item.get('choices', [])
+                        cart_entries.append((build_cart_key(item['type'], item['id'], extra_ids), item['quantity']))
+                    final_items, items_total = resolve_cart(tenant, cart_entries)
+
+                    if len(final_items) != len(cart_entries):
+                        raise ValueError("Item não encontrado no cardápio.")
 
+                    order = form.save(commit=False)
+                    order.tenant = tenant
                     order.items_total = items_total
                     zone = form.cleaned_data.get('delivery_zone')
                     order.delivery_fee = zone.delivery_fee if zone else 0
-                    order.final_total = float(items_total) + float(order.delivery_fee)
-                    order.save()
-
-                    for f_item in final_items:
-                        DeliveryOrderItem.objects.create(
-                            order=order,
-                            item_name=f_item['name'],
-                            quantity=f_item['quantity'],
-                            price=f_item['price']
+                    order.final_total = items_total + order.delivery_fee
+
+                    save_order(order, [
+                        DeliveryOrderItem(
+                            item_name=f_item.order_item_name,
+                            quantity=f_item.quantity,
+                            price=f_item.unit_price
                         )
+                        for f_item in final_items
+                    ])
                     
                     messages.success(request, f"Venda #{order.id} registrada com sucesso!")
                     return redirect('delivery:orders_list')
@@ -741,12 +732,9 @@ def delivery_pos_view(request):
     }
     return render(request, 'delivery/pos.html', context)
 
-@login_required(login_url='login')
+@tenant_required(business_types=DELIVERY_BUSINESS_TYPES)
 def menu_online_view(request):
-    try:
-        tenant = request.user.tenant
-    except Tenant.DoesNotExist:
-        return render(request, 'error.html', {'message': 'Você não tem uma loja associada.'})
+    tenant = request.tenant
 
     if request.method == 'POST':
         if 'upload_images' in request.POST:
@@ -771,8 +759,9 @@ def menu_online_view(request):
     }
     return render(request, 'delivery/menu_online.html', context)
 
+@use_replica
 def menu_online_public_view(request, tenant_slug):
-    tenant = get_object_or_404(Tenant, slug=tenant_slug)
+    tenant = get_tenant_or_404(request, tenant_slug)
     images = MenuOnlineImage.objects.filter(tenant=tenant)
     
     context = {
@@ -3,6 +3,10 @@ ASGI config for myproject project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The delivery orders push channel (``delivery:orders_stream``, SSE/long-poll) is an
+async view; serve the project through this application so that open dashboard
+connections do not each hold a worker thread.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 """
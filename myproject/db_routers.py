@@ -0,0 +1,80 @@
+"""
+Roteamento entre o banco principal e a réplica de leitura.
+
+Por padrão tudo vai para o banco principal ('default'). As views públicas que
+só leem (vitrine, cardápio, cardápio em imagem, sitemap) são marcadas com
+`use_replica` e, enquanto rodam, as leituras vão para o alias 'replica' — se ele
+estiver configurado (ver DATABASES em settings.py). Escritas vão sempre para o
+principal.
+
+Partes que não podem ler dados atrasados da réplica usam `use_primary`, por
+exemplo a montagem do cardápio compilado, que fica no cache por horas.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+REPLICA_ALIAS = 'replica'
+
+# Sessões são lidas logo depois de gravadas (login, carrinho): sempre no principal
+PRIMARY_ONLY_APPS = {'sessions'}
+
+_reading_from_replica = ContextVar('reading_from_replica', default=False)
+
+
+def replica_available():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+@contextmanager
+def _reads_from(replica):
+    token = _reading_from_replica.set(replica)
+    try:
+        yield
+    finally:
+        _reading_from_replica.reset(token)
+
+
+def use_replica(view_func=None):
+    """
+    Decorador (ou context manager, sem argumentos) que envia as leituras para a réplica:
+
+        @use_replica
+        def sales_view(request, tenant_slug): ...
+
+        with use_replica():
+            ...
+    """
+    if view_func is None:
+        return _reads_from(True)
+
+    @wraps(view_func)
+    def wrapper(*args, **kwargs):
+        with _reads_from(True):
+            return view_func(*args, **kwargs)
+    return wrapper
+
+
+def use_primary():
+    """Context manager que força as leituras no banco principal, mesmo dentro de `use_replica`."""
+    return _reads_from(False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _reading_from_replica.get() and replica_available() and model._meta.app_label not in PRIMARY_ONLY_APPS:
+            return REPLICA_ALIAS
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplica e principal têm os mesmos dados
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # A réplica recebe o esquema pela replicação do banco, não por migrations
+        return db == 'default'
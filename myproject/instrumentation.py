@@ -0,0 +1,200 @@
+"""
+Instrumentação das requisições: consultas ao banco, tempo de banco e de template.
+
+Ligada com INSTRUMENTATION_ENABLED (variável de ambiente INSTRUMENTATION=1). Para
+cada requisição o `InstrumentationMiddleware` registra, pelo nome da URL
+resolvida ('delivery:checkout', 'bar:comanda', 'vitrine'...):
+
+- número de consultas e tempo total no banco (via `connection.execute_wrapper`,
+  em todos os aliases, inclusive a réplica);
+- tempo de renderização dos templates;
+- consultas repetidas: o mesmo SQL (com parâmetros diferentes ou não) executado
+  várias vezes na mesma requisição, o sinal típico de N+1.
+
+Os números vão no cabeçalho `Server-Timing` de cada resposta (visível no painel
+de rede do navegador) e se acumulam por processo, expostos em formato
+Prometheus na URL /metrics/. QUERY_BUDGETS define o máximo de consultas por
+view; quando passa, o excesso e as consultas repetidas vão para o log.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import Http404, HttpResponse
+from django.template.backends.django import Template as DjangoTemplate
+from django.utils.crypto import constant_time_compare
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_THRESHOLD = 3 # A partir de quantas execuções do mesmo SQL ele conta como repetido
+UNRESOLVED_VIEW = '<unresolved>'
+
+_NUMBERS = re.compile(r'\b\d+\b')
+_IN_LISTS = re.compile(r'\bIN \((?:%s, )*%s\)')
+
+_current = ContextVar('instrumentation_request', default=None)
+
+
+def fingerprint(sql):
+    """SQL sem os valores literais: consultas iguais com parâmetros diferentes têm a mesma impressão."""
+    return _IN_LISTS.sub('IN (...)', _NUMBERS.sub('?', sql))
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.fingerprints = Counter()
+        self._template_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper: envolve cada consulta da requisição
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self):
+        """[(sql, vezes)] das consultas repetidas, da mais repetida para a menos."""
+        return [(sql, count) for sql, count in self.fingerprints.most_common() if count >= DUPLICATE_THRESHOLD]
+
+
+_original_template_render = DjangoTemplate.render
+
+
+def _timed_template_render(self, context=None, request=None):
+    stats = _current.get()
+    if stats is None:
+        return _original_template_render(self, context, request)
+    # Só o template de fora conta (um render_to_string dentro de outro não soma duas vezes)
+    stats._template_depth += 1
+    start = time.perf_counter()
+    try:
+        return _original_template_render(self, context, request)
+    finally:
+        stats._template_depth -= 1
+        if not stats._template_depth:
+            stats.template_time += time.perf_counter() - start
+
+
+class Metrics:
+    """Totais por view, acumulados no processo (cada worker expõe os seus)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = defaultdict(lambda: defaultdict(float))
+
+    def record(self, view, duration, stats, over_budget):
+        with self._lock:
+            totals = self._views[view]
+            totals['requests'] += 1
+            totals['duration'] += duration
+            totals['queries'] += stats.queries
+            totals['db_time'] += stats.db_time
+            totals['template_time'] += stats.template_time
+            totals['duplicate_queries'] += sum(count - 1 for _, count in stats.duplicates())
+            totals['over_budget'] += over_budget
+
+    def snapshot(self):
+        with self._lock:
+            return {view: dict(totals) for view, totals in self._views.items()}
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+metrics = Metrics()
+
+# (chave em Metrics, nome da métrica, tipo, descrição)
+PROMETHEUS_SERIES = [
+    ('requests', 'django_view_requests_total', 'counter', 'Requisições atendidas'),
+    ('duration', 'django_view_duration_seconds_total', 'counter', 'Tempo total das requisições'),
+    ('queries', 'django_view_db_queries_total', 'counter', 'Consultas ao banco'),
+    ('db_time', 'django_view_db_seconds_total', 'counter', 'Tempo gasto no banco'),
+    ('template_time', 'django_view_template_seconds_total', 'counter', 'Tempo de renderização de templates'),
+    ('duplicate_queries', 'django_view_duplicate_queries_total', 'counter', 'Consultas repetidas (possível N+1)'),
+    ('over_budget', 'django_view_query_budget_exceeded_total', 'counter', 'Requisições acima de QUERY_BUDGETS'),
+]
+
+
+def render_prometheus(snapshot):
+    lines = []
+    for key, name, kind, description in PROMETHEUS_SERIES:
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        for view in sorted(snapshot):
+            label = view.replace('\\', '\\\\').replace('"', '\\"')
+            lines.append(f'{name}{{view="{label}"}} {snapshot[view].get(key, 0):g}')
+    return '\n'.join(lines) + '\n'
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match and match.view_name else UNRESOLVED_VIEW
+
+
+class InstrumentationMiddleware:
+    """Deve ser o primeiro da lista, para medir a requisição inteira."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'INSTRUMENTATION_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.budgets = getattr(settings, 'QUERY_BUDGETS', {})
+        DjangoTemplate.render = _timed_template_render
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        duration = time.perf_counter() - start
+
+        view = _view_name(request)
+        budget = self.budgets.get(view)
+        over_budget = budget is not None and stats.queries > budget
+        if over_budget:
+            logger.warning(
+                '%s: %s consultas (orçamento %s) em %s. Repetidas: %s',
+                view, stats.queries, budget, request.path,
+                '; '.join(f'{count}x {sql[:200]}' for sql, count in stats.duplicates()[:3]) or 'nenhuma',
+            )
+        metrics.record(view, duration, stats, over_budget)
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} consultas"',
+            f'tpl;dur={stats.template_time * 1000:.1f}',
+            f'dup;desc="{len(stats.duplicates())} repetidas"',
+            f'total;dur={duration * 1000:.1f}',
+        ])
+        return response
+
+
+def metrics_view(request):
+    """Métricas em formato Prometheus. Exige INSTRUMENTATION_METRICS_TOKEN (Bearer) ou usuário staff."""
+    if not getattr(settings, 'INSTRUMENTATION_ENABLED', False):
+        raise Http404
+    token = getattr(settings, 'INSTRUMENTATION_METRICS_TOKEN', '')
+    authorization = request.headers.get('Authorization', '')
+    allowed = bool(token) and constant_time_compare(authorization, f'Bearer {token}')
+    if not (allowed or request.user.is_staff):
+        return HttpResponse(status=403)
+    return HttpResponse(render_prometheus(metrics.snapshot()), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -53,17 +54,27 @@ INSTALLED_APPS = [
 SITE_ID = 1
 
 MIDDLEWARE = [
+    'myproject.instrumentation.InstrumentationMiddleware', # Só age com INSTRUMENTATION_ENABLED
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'shop.middleware.MerchantTenantMiddleware',
+    'shop.middleware.TenantResolverMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'myproject.urls'
 
+# O primeiro carrega o usuário já com a loja (shop/auth.py). O ModelBackend fica só para
+# as sessões abertas antes dele (a sessão guarda o backend do login); pode sair depois.
+AUTHENTICATION_BACKENDS = [
+    'shop.auth.TenantModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -86,12 +97,76 @@ WSGI_APPLICATION = 'myproject.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Configurado por variáveis de ambiente. Sem DB_ENGINE, usa o SQLite local.
+#   DB_ENGINE=postgresql DB_NAME DB_USER DB_PASSWORD DB_HOST DB_PORT
+#   DB_CONN_MAX_AGE: segundos que cada processo mantém a conexão aberta (padrão 60)
+#   DB_REPLICA_HOST: host da réplica de leitura (PostgreSQL), usada pelas views
+#       públicas marcadas com `use_replica` (ver myproject/db_routers.py)
+#   DB_REPLICA=1 (SQLite): cria o alias 'replica' apontando para o mesmo arquivo,
+#       para testar o roteamento localmente
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite3')
+
+if DB_ENGINE == 'sqlite3':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+        }
     }
-}
+    if os.environ.get('DB_REPLICA') == '1':
+        DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': f'django.db.backends.{DB_ENGINE}',
+            'NAME': os.environ.get('DB_NAME', 'django_ecommerce'),
+            'USER': os.environ.get('DB_USER', ''),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', ''),
+            # Conexões persistentes: evita abrir uma conexão (e o handshake) por requisição
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            # Testa a conexão reaproveitada antes de usar (o banco pode ter derrubado)
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+    if os.environ.get('DB_REPLICA_HOST'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': os.environ['DB_REPLICA_HOST'],
+            'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+            'TEST': {'MIRROR': 'default'},
+        }
+
+DATABASE_ROUTERS = ['myproject.db_routers.ReplicaRouter']
+
+
+# Cache
+# Com REDIS_URL (ex.: redis://localhost:6379/0, exige o pacote `redis`) o cache é
+# compartilhado entre todos os processos e os dados invalidados por signals
+# (cardápio, tenant, comandas) podem ficar nele por bastante tempo. Sem ele, cada
+# processo tem o seu cache em memória: a invalidação só alcança o processo que
+# salvou, então esses dados usam timeouts curtos ou nem vão para o cache
+# (CACHE_SHARED = False).
+REDIS_URL = os.environ.get('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+CACHE_SHARED = bool(REDIS_URL)
+
+# Snapshot do cardápio do delivery (delivery/menu_cache.py). Inclui o "loja aberta" que o
+# carrinho confere, então sem cache compartilhado o atraso máximo é este timeout.
+MENU_CACHE_TIMEOUT = 60 * 60 * 24 if CACHE_SHARED else 60
 
 
 # Password validation
@@ -140,3 +215,55 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Media files (uploads)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Pub/sub dos eventos de pedidos do delivery (painel em tempo real).
+# O broker em memória atende um único processo; em produção com vários workers,
+# use uma implementação compartilhada (ex.: Redis) com a mesma interface e
+# `cross_process = True`. O painel só abre o SSE com um broker assim e rodando
+# pelo ASGI (myproject/asgi.py); nos outros casos consulta os pedidos a cada 5 segundos.
+DELIVERY_EVENTS_BROKER = 'delivery.events.InProcessBroker'
+
+# Variantes das imagens enviadas (shop/image_variants.py): geradas depois do commit
+# em um pool de threads, sem segurar o upload. Com False, são geradas na própria requisição.
+IMAGE_VARIANTS_ASYNC = True
+IMAGE_VARIANTS_WORKERS = 2
+
+# Timeout (segundos) das chamadas ao Mercado Pago (shop/payments.py). A consulta dos
+# pagamentos notificados pelo webhook roda no worker da fila: python manage.py run_jobs
+MERCADOPAGO_TIMEOUT = 10.0
+
+# Onde o carrinho do delivery é guardado (ver delivery/cart_store.py). O cookie assinado
+# não usa banco nem cache; para carrinhos no cache, use 'delivery.cart_store.CacheCartStore'
+# com um cache compartilhado entre os processos.
+DELIVERY_CART_STORE = 'delivery.cart_store.SignedCookieCartStore'
+
+# Sessões: 'cached_db' (padrão) lê do cache e só vai ao banco quando a sessão muda ou
+# não está no cache; 'cache' não usa o banco (exige cache compartilhado e persistente,
+# ex.: Redis); 'db' é o padrão do Django; 'signed_cookies' guarda tudo no cookie.
+# Compare com: python manage.py bench_sessions
+SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'cached_db')
+SESSION_ENGINE = f'django.contrib.sessions.backends.{SESSION_BACKEND}'
+
+# Tenant das páginas públicas resolvido pelo slug com cache (shop/tenants.py): no próprio
+# processo por TENANT_LOCAL_CACHE_TTL segundos e no cache do Django até o tenant mudar.
+# Sem cache compartilhado, só o cache do processo (a invalidação não alcançaria os outros).
+TENANT_CACHE_TIMEOUT = 60 * 60
+TENANT_LOCAL_CACHE_TTL = 5
+
+# Instrumentação (myproject/instrumentation.py): consultas, tempo de banco e de template por
+# view, no cabeçalho Server-Timing e em /metrics/ (Prometheus). Desligada por padrão.
+INSTRUMENTATION_ENABLED = os.environ.get('INSTRUMENTATION', '') == '1'
+# Sem token, /metrics/ só responde a usuários staff
+INSTRUMENTATION_METRICS_TOKEN = os.environ.get('INSTRUMENTATION_METRICS_TOKEN', '')
+# Máximo de consultas por view (nome da URL); acima disso a requisição vai para o log.
+# Valores medidos com o cache frio (o cardápio e o tenant em cache baixam para 0-4 consultas).
+QUERY_BUDGETS = {
+    'vitrine': 10,
+    'product_detail': 4,
+    'delivery:customer_menu': 8,
+    'delivery:checkout': 4,
+    'delivery:orders_list': 6,
+    'bar:cardapio': 3,
+    'bar:mesas': 3,
+    'bar:comanda': 8,
+}
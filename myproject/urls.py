@@ -22,6 +22,8 @@ from django.conf import settings
 from django.conf.urls.static import static
 
 from django.contrib.sitemaps.views import sitemap
+from myproject.db_routers import use_replica
+from myproject.instrumentation import metrics_view
 from shop.sitemaps import StaticViewSitemap, ProductSitemap, TenantSitemap, DeliveryMenuSitemap
 
 sitemaps = {
@@ -33,8 +35,9 @@ sitemaps = {
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('sitemap.xml', sitemap, {'sitemaps': sitemaps}, name='django.contrib.sitemaps.views.sitemap'),
+    path('sitemap.xml', use_replica(sitemap), {'sitemaps': sitemaps}, name='django.contrib.sitemaps.views.sitemap'),
     path('robots.txt', myproject_views.robots_txt),
+    path('metrics/', metrics_view, name='metrics'),
     path('', myproject_views.index, name='index'),
     path('login/', myproject_views.login_view, name='login'),
     path('inicio/', shop_views.inicio_view, name='inicio'),
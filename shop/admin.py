@@ -1,8 +1,14 @@
 from django.contrib import admin
-from .models import Tenant, Category
+from .models import Tenant, Category, Job
 
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name',)
 
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'run_at', 'updated_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('last_error',)
+
 admin.site.register(Tenant)
 admin.site.register(Category, CategoryAdmin)
+admin.site.register(Job, JobAdmin)
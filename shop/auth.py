@@ -0,0 +1,72 @@
+"""
+Lojista logado e a sua loja (tenant).
+
+Os painéis usam `request.user.tenant` em toda requisição (na view, no menu
+lateral do base.html e na tag `comandas_abertas`). Com o backend padrão isso
+custa duas consultas: o usuário e depois o tenant. `TenantModelBackend` carrega
+os dois juntos (`select_related('tenant')`), o `MerchantTenantMiddleware`
+(shop/middleware.py) deixa o resultado em `request.tenant` e as views do painel
+usam `@tenant_required`, que também trata o usuário sem loja.
+"""
+from functools import wraps
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.shortcuts import render
+
+NO_TENANT_MESSAGE = 'Você não tem uma loja associada.'
+WRONG_BUSINESS_TYPE_MESSAGE = 'Esta área não está disponível para o tipo da sua loja.'
+
+
+class TenantModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.select_related('tenant').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+
+def get_merchant_tenant(user):
+    """Tenant do usuário logado, ou None (anônimo ou usuário sem loja)."""
+    if not user.is_authenticated:
+        return None
+    # RelatedObjectDoesNotExist (usuário sem loja) também é um AttributeError
+    return getattr(user, 'tenant', None)
+
+
+def tenant_required(view_func=None, *, business_types=None, message=NO_TENANT_MESSAGE, json=False):
+    """
+    Exige lojista logado com loja (`request.tenant`). Com `business_types`, só
+    deixa passar lojas dessas áreas de atuação:
+
+        @tenant_required(business_types=('bar', 'bar_delivery'), message='Você não tem um bar associado.')
+        def bar_dashboard(request):
+            tenant = request.tenant
+
+    Com `json=True` (endpoints AJAX), o erro é um JSON com status 403 em vez da página error.html.
+    """
+    def error(request, text, status):
+        if json:
+            return JsonResponse({'error': text}, status=403)
+        return render(request, 'error.html', {'message': text}, status=status)
+
+    def decorator(view):
+        @login_required(login_url='login')
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            # Resolve o proxy do MerchantTenantMiddleware (ou o define, sem o middleware)
+            request.tenant = get_merchant_tenant(request.user)
+            if request.tenant is None:
+                return error(request, message, 200)
+            if business_types and request.tenant.business_type not in business_types:
+                return error(request, WRONG_BUSINESS_TYPE_MESSAGE, 403)
+            return view(request, *args, **kwargs)
+        return wrapper
+
+    if view_func is not None:
+        return decorator(view_func)
+    return decorator
@@ -1,13 +1,44 @@
 from django import forms
 from django.forms import inlineformset_factory
 from .models import Product, ProductImage, Tenant
+from .stock import adjust_stock
 
 class ProductForm(forms.ModelForm):
+    # Estoque exibido quando o lojista abriu a edição. Os carrinhos reservam unidades
+    # com UPDATEs F() enquanto isso (shop/stock.py), então a edição aplica só a diferença
+    # que o lojista fez, em vez de gravar de volta o valor antigo.
+    stock_seen = forms.IntegerField(widget=forms.HiddenInput, required=False)
+
     class Meta:
         model = Product
         # Removemos 'image' pois ele não existe mais no modelo Product
         fields = ['category', 'name', 'description', 'price', 'stock']
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.fields['stock_seen'].initial = self.instance.stock
+
+    def stock_delta(self):
+        """Quanto o lojista somou (ou tirou) do estoque nesta edição."""
+        seen = self.cleaned_data.get('stock_seen')
+        if seen is None:
+            # Formulário sem o campo: vale o estoque atual do banco
+            seen = self.initial.get('stock', 0)
+        return self.cleaned_data['stock'] - seen
+
+    def save_edit(self, **extra):
+        """
+        Grava a edição de um produto existente sem sobrescrever o estoque: os demais
+        campos com `update_fields` e o estoque como diferença (`adjust_stock`).
+        """
+        product = self.save(commit=False)
+        for name, value in extra.items():
+            setattr(product, name, value)
+        product.save(update_fields=[name for name in self._meta.fields if name != 'stock'] + list(extra))
+        product.stock = adjust_stock(product.pk, self.stock_delta())
+        return product
+
 class ProductImageForm(forms.ModelForm):
     class Meta:
         model = ProductImage
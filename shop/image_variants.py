@@ -0,0 +1,179 @@
+"""
+Variantes (tamanhos/formatos) das imagens enviadas pelos lojistas.
+
+Cada campo de imagem que é exibido ao público é registrado aqui com `register`
+(ver `shop/signals.py` e `delivery/signals.py`), junto com o campo JSON onde as
+variantes ficam gravadas. Quando o arquivo muda, as variantes são geradas depois
+do commit, em um worker em segundo plano (pool de threads), para o upload não
+esperar o Pillow. As variantes saem sem metadados EXIF (localização, câmera).
+
+O dict de variantes tem o formato
+    {"source": "<arquivo original>", "webp": {"320": "thumbnails/..."}, "jpeg": {...}}
+onde `source` indica de qual arquivo elas foram geradas. Os templates usam os
+filtros `thumbnail` e `srcset` (`{% load images %}`) ou as funções de mesmo
+nome abaixo; enquanto não há variantes, a URL original é usada.
+
+Para gerar as variantes de imagens já existentes, use o comando
+`generate_image_variants`.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+
+from .thumbnails import THUMBNAIL_WIDTHS, delete_variants, generate_variants, srcset as _srcset, variant_url
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ImageSpec:
+    model: type
+    field: str
+    variants_field: str
+    widths: tuple = THUMBNAIL_WIDTHS
+    # Chamado com a instância depois que as variantes são gravadas (ex.: invalidar caches)
+    on_ready: Optional[Callable] = None
+
+
+_registry = {}
+_executor = None
+
+
+def register(model, field, variants_field, widths=THUMBNAIL_WIDTHS, on_ready=None):
+    """Passa a gerar variantes para `model.field`, gravando-as em `model.variants_field`."""
+    spec = ImageSpec(model, field, variants_field, tuple(widths), on_ready)
+    _registry[(model._meta.label, field)] = spec
+    uid = f'image_variants:{model._meta.label}.{field}'
+    post_save.connect(_image_saved, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(_image_deleted, sender=model, weak=False, dispatch_uid=uid)
+    return spec
+
+
+def specs_for(model):
+    return [spec for spec in _registry.values() if spec.model is model]
+
+
+def all_specs():
+    return list(_registry.values())
+
+
+def get_spec(field_file):
+    """Spec do campo ao qual um arquivo (ImageFieldFile) pertence, ou None se não registrado."""
+    instance = getattr(field_file, 'instance', None)
+    if instance is None:
+        return None
+    return _registry.get((instance._meta.label, field_file.field.name))
+
+
+def _variants_of(field_file):
+    spec = get_spec(field_file)
+    if spec is None:
+        return {}
+    variants = getattr(field_file.instance, spec.variants_field) or {}
+    # Variantes de um arquivo anterior (a nova geração ainda está na fila) não servem
+    return variants if variants.get('source') == field_file.name else {}
+
+
+def thumbnail(field_file, width=640):
+    """URL da variante JPEG mais adequada à largura; a original se ainda não houver variantes."""
+    if not field_file:
+        return None
+    return variant_url(_variants_of(field_file), field_file.storage, 'jpeg', width) or field_file.url
+
+
+def srcset(field_file, fmt='webp'):
+    """Valor do atributo `srcset` para o formato informado ('' se ainda não houver variantes)."""
+    if not field_file:
+        return ''
+    return _srcset(_variants_of(field_file), field_file.storage, fmt)
+
+
+def refresh_variants(instance, spec):
+    """(Re)gera as variantes de uma instância e as grava sem disparar signals."""
+    field_file = getattr(instance, spec.field)
+    old_variants = getattr(instance, spec.variants_field) or {}
+
+    if field_file:
+        try:
+            variants = generate_variants(field_file, spec.widths)
+        except OSError:
+            # Arquivo ausente ou ilegível: marca como processado e usa a imagem original
+            logger.warning('Não foi possível gerar variantes de %s', field_file.name)
+            variants = {}
+        variants['source'] = field_file.name
+    else:
+        variants = {}
+
+    delete_variants(old_variants, field_file.storage, keep=variants)
+    rows = spec.model.objects.filter(pk=instance.pk)
+    if field_file:
+        # Só grava se o arquivo não foi trocado enquanto as variantes eram geradas
+        rows = rows.filter(**{spec.field: field_file.name})
+    rows.update(**{spec.variants_field: variants})
+    setattr(instance, spec.variants_field, variants)
+    if spec.on_ready:
+        spec.on_ready(instance)
+
+
+def _process(label, field, pk):
+    spec = _registry[(label, field)]
+    try:
+        instance = spec.model.objects.filter(pk=pk).first()
+        if instance is not None:
+            refresh_variants(instance, spec)
+    except Exception:
+        logger.exception('Falha ao gerar variantes de %s #%s (%s)', label, pk, field)
+
+
+def _process_in_worker(label, field, pk):
+    try:
+        _process(label, field, pk)
+    finally:
+        # Cada thread do pool abre sua própria conexão com o banco; fecha ao terminar a tarefa
+        connection.close()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'IMAGE_VARIANTS_WORKERS', 2),
+            thread_name_prefix='image-variants',
+        )
+    return _executor
+
+
+def schedule(instance, spec):
+    """Agenda a geração das variantes para depois do commit (em segundo plano, salvo IMAGE_VARIANTS_ASYNC=False)."""
+    label, field, pk = instance._meta.label, spec.field, instance.pk
+
+    def run():
+        if getattr(settings, 'IMAGE_VARIANTS_ASYNC', True):
+            _get_executor().submit(_process_in_worker, label, field, pk)
+        else:
+            _process(label, field, pk)
+
+    transaction.on_commit(run)
+
+
+def _image_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    for spec in specs_for(sender):
+        field_file = getattr(instance, spec.field)
+        variants = getattr(instance, spec.variants_field) or {}
+        if (field_file.name or None) != variants.get('source'):
+            schedule(instance, spec)
+
+
+def _image_deleted(sender, instance, **kwargs):
+    for spec in specs_for(sender):
+        variants = getattr(instance, spec.variants_field) or {}
+        if variants:
+            storage = getattr(instance, spec.field).storage
+            transaction.on_commit(lambda variants=variants, storage=storage: delete_variants(variants, storage))
@@ -0,0 +1,126 @@
+"""
+Fila local de tarefas em segundo plano, gravada no banco (modelo `Job`).
+
+Serve para tirar do ciclo da requisição o que depende de serviços externos
+lentos (ex.: consultar um pagamento no Mercado Pago ao receber o webhook).
+A view chama `enqueue` e responde na hora; o comando `run_jobs` executa as
+tarefas pendentes.
+
+Os handlers são registrados com o decorador `task` nos módulos `tasks.py` dos
+apps (carregados pelo worker com `autodiscover`):
+
+    @task('mercadopago.payment')
+    def process_payment(tenant_id, payment_id):
+        ...
+
+O payload é passado como argumentos nomeados. Se o handler levantar uma exceção,
+a tarefa volta para a fila com espera exponencial (RETRY_BASE_DELAY, dobrando a
+cada tentativa, até RETRY_MAX_DELAY) e, depois de `max_attempts` tentativas, fica como 'failed'.
+Para desistir sem novas tentativas (erro definitivo), levante `PermanentJobError`.
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+RETRY_BASE_DELAY = 10 # Segundos até a primeira nova tentativa
+RETRY_MAX_DELAY = 60 * 60
+LOCK_TIMEOUT = timedelta(minutes=10) # Tarefa 'running' há mais tempo que isso: o worker caiu, volta para a fila
+
+_handlers = {}
+
+
+class PermanentJobError(Exception):
+    """Falha definitiva: a tarefa é marcada como 'failed' sem novas tentativas."""
+
+
+def task(name):
+    """Registra a função decorada como handler das tarefas `name`."""
+    def decorator(func):
+        _handlers[name] = func
+        return func
+    return decorator
+
+
+def autodiscover():
+    autodiscover_modules('tasks')
+
+
+def enqueue(name, payload=None, delay=0, max_attempts=None):
+    """
+    Coloca uma tarefa na fila. Dentro de uma transação, ela só fica visível para
+    o worker depois do commit (é gravada junto com os dados que a originaram).
+    """
+    job = Job(name=name, payload=payload or {}, run_at=timezone.now() + timedelta(seconds=delay))
+    if max_attempts is not None:
+        job.max_attempts = max_attempts
+    job.save()
+    return job
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY))
+
+
+def _claim(job_id):
+    """Marca a tarefa como 'running' se ninguém a pegou antes (UPDATE condicional, seguro entre workers)."""
+    now = timezone.now()
+    claimed = Job.objects.filter(pk=job_id, status='pending', run_at__lte=now).update(
+        status='running', locked_at=now, updated_at=now,
+    )
+    return claimed == 1
+
+
+def release_stale():
+    """Devolve para a fila as tarefas presas em 'running' por um worker que parou no meio."""
+    now = timezone.now()
+    return Job.objects.filter(status='running', locked_at__lt=now - LOCK_TIMEOUT).update(
+        status='pending', locked_at=None, run_at=now, updated_at=now,
+    )
+
+
+def run_job(job):
+    """Executa uma tarefa já reservada e grava o resultado (concluída, nova tentativa ou falha)."""
+    job.attempts += 1
+    handler = _handlers.get(job.name)
+    try:
+        if handler is None:
+            raise PermanentJobError(f'Nenhum handler registrado para "{job.name}".')
+        # O handler roda em sua própria transação: se falhar, nada do que ele gravou fica pela metade
+        with transaction.atomic():
+            handler(**job.payload)
+    except Exception as e:
+        job.last_error = traceback.format_exc()
+        if isinstance(e, PermanentJobError) or job.attempts >= job.max_attempts:
+            job.status = 'failed'
+            logger.error('Tarefa %s #%s falhou definitivamente: %s', job.name, job.id, e)
+        else:
+            job.status = 'pending'
+            job.run_at = timezone.now() + retry_delay(job.attempts)
+            logger.warning('Tarefa %s #%s falhou (tentativa %s), nova tentativa às %s: %s', job.name, job.id, job.attempts, job.run_at, e)
+    else:
+        job.status = 'done'
+        job.last_error = ''
+    job.locked_at = None
+    job.save(update_fields=['status', 'attempts', 'run_at', 'locked_at', 'last_error', 'updated_at'])
+    return job.status
+
+
+def run_pending(limit=20):
+    """Executa até `limit` tarefas pendentes já liberadas, na ordem em que vencem. Retorna quantas executou."""
+    release_stale()
+    candidates = Job.objects.filter(status='pending', run_at__lte=timezone.now()).order_by('run_at', 'id')
+    executed = 0
+    for job_id in candidates.values_list('id', flat=True)[:limit]:
+        if not _claim(job_id):
+            continue # Outro worker pegou primeiro
+        run_job(Job.objects.get(pk=job_id))
+        executed += 1
+    return executed
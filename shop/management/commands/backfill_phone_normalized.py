@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from shop.models import Cart, Order
+from shop.phones import normalize_phone
+from delivery.models import DeliveryOrder
+
+# (modelo, campo com o telefone digitado)
+PHONE_FIELDS = [
+    (Cart, 'phone_number'),
+    (Order, 'customer_phone'),
+    (DeliveryOrder, 'customer_whatsapp'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Preenche phone_normalized (telefone em E.164) dos carrinhos e pedidos gravados antes do campo existir.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=2000, help='Registros por lote')
+        parser.add_argument('--all', action='store_true', help='Renormaliza todos os registros, não só os vazios')
+
+    def handle(self, *args, **options):
+        for model, field in PHONE_FIELDS:
+            updated = self._backfill(model, field, options['batch'], options['all'])
+            self.stdout.write(f'{model.__name__}: {updated} atualizado(s).')
+        self.stdout.write(self.style.SUCCESS('Telefones normalizados.'))
+
+    def _backfill(self, model, field, batch_size, everything):
+        rows = model.objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+        if not everything:
+            rows = rows.filter(phone_normalized='')
+
+        # Percorre por id em lotes: cada lote é uma transação curta
+        updated = 0
+        last_id = 0
+        while True:
+            batch = list(rows.filter(pk__gt=last_id).order_by('pk').only('pk', field, 'phone_normalized')[:batch_size])
+            if not batch:
+                return updated
+            last_id = batch[-1].pk
+            changed = []
+            for obj in batch:
+                normalized = normalize_phone(getattr(obj, field))
+                if normalized != obj.phone_normalized:
+                    obj.phone_normalized = normalized
+                    changed.append(obj)
+            with transaction.atomic():
+                model.objects.bulk_update(changed, ['phone_normalized'])
+            updated += len(changed)
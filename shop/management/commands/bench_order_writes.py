@@ -0,0 +1,47 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from shop.models import Tenant, Order, OrderItem
+from shop.orders import save_order
+
+
+class Command(BaseCommand):
+    help = 'Compara a gravação de pedidos linha a linha com a gravação em lote (save_order).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, nargs='+', default=[1, 10, 50, 200], help='Quantidades de linhas por pedido a medir')
+        parser.add_argument('--repeat', type=int, default=5, help='Quantos pedidos gravar para cada medida')
+
+    def handle(self, *args, **options):
+        # Usa um tenant temporário para não misturar os pedidos de teste com dados reais
+        user = User.objects.create(username=f'bench-orders-{int(time.time() * 1000)}')
+        tenant = Tenant.objects.create(name=user.username, user=user)
+        try:
+            self.stdout.write(f"{'linhas':>8} {'linha a linha (ms)':>20} {'save_order (ms)':>18}")
+            for lines in options['lines']:
+                per_row = self._measure(tenant, lines, options['repeat'], self._write_per_row)
+                bulk = self._measure(tenant, lines, options['repeat'], self._write_bulk)
+                self.stdout.write(f'{lines:>8} {per_row:>20.2f} {bulk:>18.2f}')
+        finally:
+            with transaction.atomic():
+                Order.objects.filter(tenant=tenant).delete()
+                user.delete()
+
+    def _measure(self, tenant, lines, repeat, writer):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            writer(tenant, lines)
+        return (time.perf_counter() - start) * 1000 / repeat
+
+    def _write_per_row(self, tenant, lines):
+        # Comportamento antigo: cabeçalho e cada linha em autocommit
+        order = Order.objects.create(tenant=tenant, customer_phone='0', total_amount=lines)
+        for i in range(lines):
+            OrderItem.objects.create(order=order, product_name=f'Item {i}', quantity=1, price=1)
+
+    def _write_bulk(self, tenant, lines):
+        order = Order(tenant=tenant, customer_phone='0', total_amount=lines)
+        save_order(order, [OrderItem(product_name=f'Item {i}', quantity=1, price=1) for i in range(lines)])
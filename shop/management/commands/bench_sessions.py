@@ -0,0 +1,70 @@
+import time
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from shop.models import Tenant, Product
+
+BACKENDS = ['db', 'cached_db', 'cache', 'signed_cookies']
+
+
+class Command(BaseCommand):
+    help = 'Mede requisições/s da vitrine e gravações de sessão no banco com cada backend de sessão.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', type=str, help='Slug da loja (padrão: a primeira loja de e-commerce com produtos)')
+        parser.add_argument('--requests', type=int, default=300, help='Requisições por cenário')
+        parser.add_argument('--backends', nargs='+', default=BACKENDS, choices=BACKENDS)
+
+    def handle(self, *args, **options):
+        if options['tenant']:
+            tenant = Tenant.objects.filter(slug=options['tenant']).first()
+        else:
+            tenant = Tenant.objects.filter(business_type='ecommerce', product__isnull=False).distinct().first()
+        if tenant is None:
+            raise CommandError('Nenhuma loja encontrada para o teste.')
+
+        urls = [reverse('vitrine', kwargs={'tenant_slug': tenant.slug})]
+        product = Product.objects.filter(tenant=tenant).first()
+        if product:
+            urls.append(reverse('product_detail', kwargs={'tenant_slug': tenant.slug, 'product_id': product.id}))
+
+        self.stdout.write(f'Loja: {tenant.slug} - {options["requests"]} requisições por cenário (vitrine e detalhe alternados)\n')
+        self.stdout.write(f"{'backend':>15} {'cenário':>18} {'req/s':>8} {'gravações de sessão':>20}")
+        for backend in options['backends']:
+            with override_settings(SESSION_ENGINE=f'django.contrib.sessions.backends.{backend}'):
+                for scenario, returning in (('visitante fiel', True), ('visitantes novos', False)):
+                    rate, writes = self._run(urls, options['requests'], returning)
+                    self.stdout.write(f'{backend:>15} {scenario:>18} {rate:>8.1f} {writes:>20}')
+
+    def _run(self, urls, total, returning):
+        # Cada Client monta a pilha de middlewares de novo, já com o SESSION_ENGINE em vigor
+        client = Client(HTTP_HOST='localhost')
+        client.get(urls[0]) # Aquecimento (e cria a sessão do visitante fiel)
+        session_keys = {client.cookies[settings.SESSION_COOKIE_NAME].value}
+
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for i in range(total):
+                if not returning:
+                    client.cookies.clear()
+                response = client.get(urls[i % len(urls)])
+                if response.status_code != 200:
+                    raise CommandError(f'{urls[i % len(urls)]} respondeu {response.status_code}.')
+                if settings.SESSION_COOKIE_NAME in response.cookies:
+                    session_keys.add(response.cookies[settings.SESSION_COOKIE_NAME].value)
+            elapsed = time.perf_counter() - start
+
+        # Não deixa as sessões de teste para trás (nos backends que gravam no banco)
+        Session.objects.filter(session_key__in=session_keys).delete()
+
+        writes = sum(
+            1 for query in queries.captured_queries
+            if 'django_session' in query['sql'] and query['sql'].lstrip().upper().startswith(('INSERT', 'UPDATE'))
+        )
+        return total / elapsed, writes
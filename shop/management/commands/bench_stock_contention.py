@@ -0,0 +1,70 @@
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.db.models import Sum
+
+from shop.models import Tenant, Category, Product, Cart
+from shop.stock import OutOfStock, reserve
+
+
+class Command(BaseCommand):
+    help = 'Teste de carga: vários compradores disputando o mesmo produto. Confere que não há venda acima do estoque.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Compradores simultâneos')
+        parser.add_argument('--stock', type=int, default=500, help='Estoque inicial do produto disputado')
+        parser.add_argument('--quantity', type=int, default=1, help='Unidades por reserva')
+
+    def handle(self, *args, **options):
+        # Usa um tenant temporário para não mexer no estoque de produtos reais
+        user = User.objects.create(username=f'bench-stock-{int(time.time() * 1000)}')
+        tenant = Tenant.objects.create(name=user.username, user=user)
+        category = Category.objects.create(name=user.username)
+        try:
+            product = Product.objects.create(tenant=tenant, category=category, name='Bench', description='-', price=1, stock=options['stock'])
+            carts = [Cart.objects.create(phone_number=f'{user.username}-{i}') for i in range(options['threads'])]
+
+            results = [{'ok': 0, 'sold_out': 0, 'retries': 0} for _ in carts]
+            start_barrier = threading.Barrier(len(carts))
+
+            def buyer(cart, result):
+                try:
+                    start_barrier.wait()
+                    while True:
+                        try:
+                            reserve(cart, product, options['quantity'])
+                            result['ok'] += 1
+                        except OutOfStock:
+                            result['sold_out'] += 1
+                            break
+                        except OperationalError:
+                            # SQLite: "database is locked" quando a espera pela escrita passa do timeout
+                            result['retries'] += 1
+                finally:
+                    connection.close()
+
+            threads = [threading.Thread(target=buyer, args=(cart, result)) for cart, result in zip(carts, results)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+            product.refresh_from_db()
+            reserved = product.reservations.aggregate(total=Sum('quantity'))['total'] or 0
+            self.stdout.write(f"Compradores: {options['threads']}, estoque inicial: {options['stock']}")
+            self.stdout.write(f"Reservas: {sum(result['ok'] for result in results)} em {elapsed:.2f}s ({sum(result['ok'] for result in results) / elapsed:.0f}/s)")
+            self.stdout.write(f"Por comprador: {[result['ok'] for result in results]}; novas tentativas por bloqueio: {sum(result['retries'] for result in results)}")
+            self.stdout.write(f'Unidades reservadas: {reserved}, estoque final: {product.stock}')
+            if reserved == sum(result['ok'] for result in results) * options['quantity'] and reserved + product.stock == options['stock']:
+                self.stdout.write(self.style.SUCCESS('OK: nenhuma unidade vendida acima do estoque.'))
+            else:
+                self.stdout.write(self.style.ERROR('ERRO: reservas e estoque não batem com o estoque inicial.'))
+        finally:
+            Cart.objects.filter(phone_number__startswith=f'{user.username}-').delete()
+            user.delete()
+            category.delete()
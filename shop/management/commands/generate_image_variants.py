@@ -0,0 +1,38 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.image_variants import all_specs, refresh_variants
+
+
+class Command(BaseCommand):
+    help = 'Gera as variantes (tamanhos/formatos) das imagens que ainda não as têm ou estão desatualizadas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', type=str, help='Apenas um model, no formato app.Model (ex.: delivery.MenuItem)')
+        parser.add_argument('--force', action='store_true', help='Regera também as variantes que já estão em dia')
+
+    def handle(self, *args, **options):
+        specs = all_specs()
+        if options['model']:
+            try:
+                model = apps.get_model(options['model'])
+            except (LookupError, ValueError):
+                raise CommandError(f'Model "{options["model"]}" não encontrado.')
+            specs = [spec for spec in specs if spec.model is model]
+            if not specs:
+                raise CommandError(f'{options["model"]} não tem imagens com variantes.')
+
+        total = 0
+        for spec in specs:
+            instances = spec.model.objects.exclude(**{spec.field: ''}).exclude(**{f'{spec.field}__isnull': True})
+            generated = 0
+            for instance in instances.iterator(chunk_size=200):
+                variants = getattr(instance, spec.variants_field) or {}
+                if not options['force'] and variants.get('source') == getattr(instance, spec.field).name:
+                    continue
+                refresh_variants(instance, spec)
+                generated += 1
+            self.stdout.write(f'{spec.model._meta.label}.{spec.field}: {generated} imagem(ns) processada(s)')
+            total += generated
+
+        self.stdout.write(self.style.SUCCESS(f'{total} imagem(ns) processada(s) no total.'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.models import Tenant
+from shop.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recalcula as tabelas de vendas consolidadas (relatórios) a partir dos pedidos e comandas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', type=str, help='Slug de um tenant específico (padrão: todos)')
+
+    def handle(self, *args, **options):
+        tenants = Tenant.objects.all()
+        if options['tenant']:
+            tenants = tenants.filter(slug=options['tenant'])
+            if not tenants.exists():
+                raise CommandError(f'Tenant "{options["tenant"]}" não encontrado.')
+
+        for tenant in tenants:
+            daily = rebuild_rollups(tenant.id)
+            self.stdout.write(f'{tenant.name}: {daily} dias consolidados.')
+
+        self.stdout.write(self.style.SUCCESS('Consolidação concluída.'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from shop.stock import release_expired
+
+
+class Command(BaseCommand):
+    help = 'Devolve ao estoque as reservas de carrinhos que venceram (rodar periodicamente, ex.: a cada minuto via cron).'
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            released = release_expired()
+            total += released
+            if not released:
+                break
+        self.stdout.write(self.style.SUCCESS(f'{total} reserva(s) vencida(s) liberada(s).'))
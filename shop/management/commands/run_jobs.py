@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from shop import jobs
+
+
+class Command(BaseCommand):
+    help = 'Worker da fila de tarefas em segundo plano (webhooks do Mercado Pago etc.).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Executa as tarefas pendentes uma vez e sai (ex.: via cron)')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Segundos de espera quando a fila está vazia')
+        parser.add_argument('--batch', type=int, default=20, help='Tarefas reservadas por rodada')
+
+    def handle(self, *args, **options):
+        jobs.autodiscover()
+        if options['once']:
+            executed = jobs.run_pending(options['batch'])
+            self.stdout.write(f'{executed} tarefa(s) executada(s).')
+            return
+
+        self.stdout.write('Worker iniciado. Ctrl+C para parar.')
+        try:
+            while True:
+                # Descarta conexões quebradas ou velhas entre rodadas, como o Django faz entre requisições
+                close_old_connections()
+                if not jobs.run_pending(options['batch']):
+                    time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            self.stdout.write('Worker finalizado.')
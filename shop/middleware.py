@@ -0,0 +1,33 @@
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import SimpleLazyObject
+
+from .auth import get_merchant_tenant
+from .tenants import get_cached_tenant
+
+
+class MerchantTenantMiddleware(MiddlewareMixin):
+    """
+    Deixa em `request.tenant` a loja do lojista logado (ou None). Com o
+    `TenantModelBackend` ela vem na mesma consulta do usuário (ver shop/auth.py).
+    Deve vir depois do AuthenticationMiddleware.
+
+    É preguiçoso, como o `request.user`: páginas públicas que não usam a loja
+    não carregam a sessão nem o usuário. Por ser um proxy, teste com
+    `if request.tenant:` e não com `is None` (o `@tenant_required` já troca o
+    proxy pela instância).
+    """
+
+    def process_request(self, request):
+        request.tenant = SimpleLazyObject(lambda: get_merchant_tenant(request.user))
+
+
+class TenantResolverMiddleware(MiddlewareMixin):
+    """
+    Para as URLs com `tenant_slug` (vitrine, cardápios, checkout...), resolve o
+    tenant pelo cache (shop/tenants.py) e o deixa em `request.tenant_record`
+    (None se o slug não existir). As views usam `get_tenant_or_404`.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        tenant_slug = view_kwargs.get('tenant_slug')
+        request.tenant_record = get_cached_tenant(tenant_slug) if tenant_slug else None
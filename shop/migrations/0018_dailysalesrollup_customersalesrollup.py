@@ -0,0 +1,47 @@
+# Generated by Django 5.0.6 on 2026-10-18 04:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0017_alter_tenant_business_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerSalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('customer_whatsapp', models.CharField(max_length=20)),
+                ('customer_name', models.CharField(blank=True, max_length=100)),
+                ('order_count', models.IntegerField(default=0)),
+                ('total_spent', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='customer_sales', to='shop.tenant')),
+            ],
+            options={
+                'verbose_name': 'Venda por Cliente (Consolidado)',
+                'verbose_name_plural': 'Vendas por Cliente (Consolidado)',
+                'unique_together': {('tenant', 'date', 'customer_whatsapp')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(choices=[('delivery', 'Delivery'), ('bar', 'Bar')], max_length=20)),
+                ('date', models.DateField()),
+                ('order_count', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='shop.tenant')),
+            ],
+            options={
+                'verbose_name': 'Venda Diária (Consolidado)',
+                'verbose_name_plural': 'Vendas Diárias (Consolidado)',
+                'unique_together': {('tenant', 'channel', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.6 on 2026-10-18 04:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0018_dailysalesrollup_customersalesrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['tenant', 'category', 'id'], name='shop_product_tenant_cat_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.6 on 2026-10-18 04:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0019_product_tenant_category_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['tenant', 'category', 'price', 'id'], name='shop_product_tenant_price_idx'),
+        ),
+    ]
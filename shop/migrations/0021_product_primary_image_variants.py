@@ -0,0 +1,35 @@
+# Generated by Django 5.0.6 on 2026-10-18 04:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def fill_primary_image(apps, schema_editor):
+    """A primeira imagem enviada de cada produto passa a ser a capa."""
+    Product = apps.get_model('shop', 'Product')
+    ProductImage = apps.get_model('shop', 'ProductImage')
+    first_images = ProductImage.objects.values('product').annotate(first_id=Min('id'))
+    for row in first_images.iterator():
+        Product.objects.filter(pk=row['product']).update(primary_image_id=row['first_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0020_product_tenant_price_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='primary_image',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='shop.productimage'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.RunPython(fill_primary_image, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.6 on 2026-10-18 04:54
+
+from django.db import migrations, models
+
+
+def mark_variants_source(apps, schema_editor):
+    """As variantes já geradas das imagens de produto passam a registrar de qual arquivo vieram."""
+    ProductImage = apps.get_model('shop', 'ProductImage')
+    for image in ProductImage.objects.exclude(variants={}).only('id', 'image', 'variants').iterator():
+        image.variants['source'] = image.image.name
+        ProductImage.objects.filter(pk=image.pk).update(variants=image.variants)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0021_product_primary_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tenant',
+            name='logo_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.RunPython(mark_variants_source, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.6 on 2026-10-18 04:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0023_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessedPayment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('external_reference', models.CharField(max_length=64, unique=True)),
+                ('payment_id', models.CharField(blank=True, db_index=True, max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='shop.order')),
+            ],
+            options={
+                'verbose_name': 'Pagamento Processado',
+                'verbose_name_plural': 'Pagamentos Processados',
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.6 on 2026-10-18 05:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0025_stockreservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='phone_normalized',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='phone_normalized',
+            field=models.CharField(blank=True, default='', editable=False, max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['tenant', 'phone_normalized', '-created_at'], name='shop_order_tenant_phone_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['phone_normalized', '-created_at'], name='shop_order_phone_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.6 on 2026-10-18 06:10
+
+from django.db import migrations
+
+from shop.rollups import rebuild_rollups
+
+
+def fill_sales_rollups(apps, schema_editor):
+    """Consolida os pedidos e comandas já existentes: os relatórios só leem as tabelas consolidadas."""
+    Tenant = apps.get_model('shop', 'Tenant')
+    for tenant_id in Tenant.objects.values_list('id', flat=True):
+        rebuild_rollups(tenant_id, apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0026_phone_normalized'),
+        # As datas locais (business_date) dos pedidos e comandas já precisam estar preenchidas
+        ('delivery', '0011_deliveryorder_business_date'),
+        ('bar', '0006_barcomanda_business_date'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_sales_rollups, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,8 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.utils.text import slugify
 
+from .phones import normalize_phone
+
 class Tenant(models.Model):
     PAYMENT_GATEWAY_CHOICES = [
         ('mercadopago', 'Mercado Pago'),
@@ -31,6 +33,7 @@ class Tenant(models.Model):
     pagseguro_api_key = models.CharField(max_length=255, blank=True, null=True, verbose_name="Chave da API do PagSeguro")
     display_order = models.CharField(max_length=20, choices=DISPLAY_ORDER_CHOICES, default='newest', verbose_name="Ordenação Padrão da Vitrine")
     logo = models.ImageField(upload_to='tenant_logos/', blank=True, null=True, verbose_name="Logo da Loja")
+    logo_variants = models.JSONField(default=dict, blank=True, editable=False) # Tamanhos gerados da logo (ver shop/image_variants.py)
     whatsapp_number = models.CharField(max_length=20, blank=True, null=True, verbose_name="WhatsApp para Contato")
     promotion_category = models.ForeignKey('Category', on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Categoria de Promoção em Destaque")
     business_type = models.CharField(max_length=20, choices=BUSINESS_TYPE_CHOICES, default='ecommerce', verbose_name="Área de Atuação")
@@ -50,6 +53,19 @@ class Tenant(models.Model):
     def __str__(self):
         return self.name
 
+    @property
+    def logo_url(self):
+        """URL da logo já redimensionada ou None (mesma chave usada nos dados compilados/cacheados do tenant)."""
+        from .image_variants import thumbnail
+        return thumbnail(self.logo, 320)
+
+    @property
+    def payment_gateways(self):
+        """Gateways de pagamento configurados (o tenant do cache em shop/tenants.py já traz a lista, sem as chaves)."""
+        if '_payment_gateways' in self.__dict__:
+            return self._payment_gateways
+        return [gateway for gateway, key in (('mercadopago', self.mercadopago_api_key), ('pagseguro', self.pagseguro_api_key)) if key]
+
     def get_absolute_url(self):
         from django.urls import reverse
         return reverse('vitrine', kwargs={'tenant_slug': self.slug})
@@ -71,9 +87,19 @@ class Product(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
-    stock = models.PositiveIntegerField()
+    stock = models.PositiveIntegerField() # Estoque disponível: as reservas dos carrinhos já foram descontadas (ver shop/stock.py)
     # Campo para armazenar os valores dos atributos extras. Ex: {"Tamanho": "M", "Cor": "Azul"}
     extra_data = models.JSONField(default=dict, blank=True)
+    # Imagem de capa (a primeira enviada), usada nas listagens sem precisar carregar todas as imagens
+    primary_image = models.ForeignKey('ProductImage', on_delete=models.SET_NULL, null=True, blank=True, related_name='+', editable=False)
+
+    class Meta:
+        indexes = [
+            # Paginação por cursor da vitrine: produtos mais recentes de cada categoria da loja
+            models.Index(fields=['tenant', 'category', 'id'], name='shop_product_tenant_cat_idx'),
+            # Paginação por cursor da vitrine ordenada por preço
+            models.Index(fields=['tenant', 'category', 'price', 'id'], name='shop_product_tenant_price_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -85,10 +111,26 @@ class Product(models.Model):
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='product_images/')
+    # Miniaturas geradas no upload (ver shop/image_variants.py)
+    variants = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return f"Image for {self.product.name} ({self.id})"
 
+    def save(self, *args, **kwargs):
+        """Se o produto ainda não tem imagem de capa, passa a usar esta."""
+        super().save(*args, **kwargs)
+        Product.objects.filter(pk=self.product_id, primary_image__isnull=True).update(primary_image=self)
+
+    def delete(self, *args, **kwargs):
+        product_id = self.product_id
+        result = super().delete(*args, **kwargs)
+        # Se era a capa (o FK virou NULL), a próxima imagem do produto assume
+        next_image = ProductImage.objects.filter(product_id=product_id).order_by('id').first()
+        if next_image:
+            Product.objects.filter(pk=product_id, primary_image__isnull=True).update(primary_image=next_image)
+        return result
+
 class Cart(models.Model):
     """
     Representa o carrinho de compras de um cliente.
@@ -96,9 +138,15 @@ class Cart(models.Model):
     """
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     phone_number = models.CharField(max_length=20, null=True, blank=True, db_index=True, unique=True)
+    # Telefone em E.164 (ver shop/phones.py), gravado no save
+    phone_normalized = models.CharField(max_length=20, blank=True, default='', editable=False, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    def save(self, *args, **kwargs):
+        self.phone_normalized = normalize_phone(self.phone_number)
+        super().save(*args, **kwargs)
+
     @property
     def total(self):
         """Calcula o valor total de todos os itens no carrinho."""
@@ -124,6 +172,24 @@ class CartItem(models.Model):
     def __str__(self):
         return f"{self.quantity} x {self.product.name} no carrinho {self.cart.id}"
 
+class StockReservation(models.Model):
+    """
+    Unidades de um produto separadas para um carrinho (já descontadas de `Product.stock`).
+    Expiram em `expires_at`; o comando `release_expired_reservations` devolve ao estoque.
+    """
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = "Reserva de Estoque"
+        verbose_name_plural = "Reservas de Estoque"
+        unique_together = ('cart', 'product')
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} para o carrinho {self.cart_id}"
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pendente'),
@@ -134,14 +200,45 @@ class Order(models.Model):
     tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='orders')
     # Informações do cliente - por enquanto, apenas o telefone do carrinho de convidado
     customer_phone = models.CharField(max_length=20)
+    # Telefone em E.164 (ver shop/phones.py), gravado no save para a área do cliente buscar por índice
+    phone_normalized = models.CharField(max_length=20, blank=True, default='', editable=False)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['tenant', 'phone_normalized', '-created_at'], name='shop_order_tenant_phone_idx'),
+            # Área do cliente acessada sem loja: busca em todas as lojas
+            models.Index(fields=['phone_normalized', '-created_at'], name='shop_order_phone_idx'),
+        ]
+
     def __str__(self):
         return f"Pedido #{self.id} - {self.tenant.name}"
 
+    def save(self, *args, **kwargs):
+        self.phone_normalized = normalize_phone(self.customer_phone)
+        super().save(*args, **kwargs)
+
+class ProcessedPayment(models.Model):
+    """
+    Registro de idempotência da conversão carrinho -> pedido (ver `shop/orders.py`).
+    Retorno do pagamento e webhook podem chegar ao mesmo tempo, e o webhook se repete:
+    a chave única garante um só pedido por pagamento.
+    """
+    external_reference = models.CharField(max_length=64, unique=True) # ID do carrinho enviado ao gateway
+    payment_id = models.CharField(max_length=64, blank=True, db_index=True)
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Pagamento Processado"
+        verbose_name_plural = "Pagamentos Processados"
+
+    def __str__(self):
+        return f"{self.external_reference} -> pedido {self.order_id}"
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
     product_name = models.CharField(max_length=200) # Salva o nome para o caso de o produto ser excluído
@@ -150,3 +247,76 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f"{self.quantity} x {self.product_name}"
+
+class DailySalesRollup(models.Model):
+    """
+    Vendas agregadas por dia, mantidas incrementalmente a cada pedido salvo
+    (ver `shop/rollups.py`). Os relatórios leem daqui em vez de varrer os pedidos.
+    """
+    CHANNEL_CHOICES = [
+        ('delivery', 'Delivery'),
+        ('bar', 'Bar'),
+    ]
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='daily_sales')
+    channel = models.CharField(max_length=20, choices=CHANNEL_CHOICES)
+    date = models.DateField()
+    order_count = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Venda Diária (Consolidado)"
+        verbose_name_plural = "Vendas Diárias (Consolidado)"
+        unique_together = ('tenant', 'channel', 'date')
+
+    def __str__(self):
+        return f"{self.tenant_id} - {self.channel} - {self.date}: {self.order_count} pedidos"
+
+class CustomerSalesRollup(models.Model):
+    """Vendas do delivery agregadas por cliente (WhatsApp) e dia, para o ranking de clientes."""
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='customer_sales')
+    date = models.DateField()
+    customer_whatsapp = models.CharField(max_length=20)
+    customer_name = models.CharField(max_length=100, blank=True)
+    order_count = models.IntegerField(default=0)
+    total_spent = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Venda por Cliente (Consolidado)"
+        verbose_name_plural = "Vendas por Cliente (Consolidado)"
+        unique_together = ('tenant', 'date', 'customer_whatsapp')
+
+    def __str__(self):
+        return f"{self.customer_whatsapp} - {self.date}: {self.order_count} pedidos"
+
+class Job(models.Model):
+    """
+    Tarefa da fila local (ver `shop/jobs.py`), executada pelo comando `run_jobs`.
+    Fica no próprio banco para não depender de serviços externos.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pendente'),
+        ('running', 'Executando'),
+        ('done', 'Concluída'),
+        ('failed', 'Falhou'),
+    ]
+    name = models.CharField(max_length=100) # Nome registrado do handler (ex.: 'mercadopago.payment')
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=8)
+    run_at = models.DateTimeField() # Não executa antes deste horário (usado no backoff das novas tentativas)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Tarefa em Segundo Plano"
+        verbose_name_plural = "Tarefas em Segundo Plano"
+        indexes = [
+            # Busca do worker: próximas tarefas pendentes já liberadas
+            models.Index(fields=['status', 'run_at'], name='shop_job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status})"
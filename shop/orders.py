@@ -0,0 +1,89 @@
+"""
+Gravação de pedidos.
+
+Todos os pontos que criam pedidos (checkout da loja, checkout do delivery e PDV)
+usam `save_order`: o cabeçalho e todas as linhas são gravados dentro de uma
+única transação, com um só `bulk_create` para os itens. No SQLite isso troca um
+fsync por linha por um único commit.
+"""
+from django.db import IntegrityError, transaction
+
+from .stock import consume
+
+
+def save_order(order, items):
+    """
+    Grava o pedido e suas linhas de forma atômica.
+
+    `order` é uma instância ainda não salva (Order ou DeliveryOrder) e `items`
+    uma lista de instâncias não salvas do modelo de itens correspondente
+    (OrderItem ou DeliveryOrderItem). O campo `order` de cada item é preenchido aqui.
+    """
+    with transaction.atomic():
+        order.save()
+        for item in items:
+            item.order = order
+        if items:
+            type(items[0]).objects.bulk_create(items)
+    return order
+
+
+def create_order_from_cart(external_reference, payment_id=''):
+    """
+    Transforma um carrinho pago em pedido (status 'paid') e apaga o carrinho.
+    Usada tanto pelo retorno do pagamento quanto pelo processamento do webhook.
+
+    Idempotente: `external_reference` é o ID do carrinho enviado ao gateway; se ele
+    já foi convertido, retorna o pedido existente (uma consulta no índice único de
+    ProcessedPayment). Retorna None se o carrinho não existe ou está vazio.
+    """
+    from .models import Cart, Order, OrderItem, ProcessedPayment
+
+    external_reference = str(external_reference)
+    processed = ProcessedPayment.objects.filter(external_reference=external_reference).select_related('order').first()
+    if processed:
+        return processed.order
+
+    try:
+        with transaction.atomic():
+            # Trava o carrinho: uma conversão concorrente espera esta terminar
+            cart = Cart.objects.select_for_update().filter(id=external_reference).first()
+            if cart is None:
+                # Pode ter sido convertido por quem segurava a trava
+                processed = ProcessedPayment.objects.filter(external_reference=external_reference).select_related('order').first()
+                return processed.order if processed else None
+
+            cart_items = list(cart.items.select_related('product__tenant'))
+            if not cart_items:
+                return None
+            tenant = cart_items[0].product.tenant
+
+            # Monta o Pedido (Order) e copia os itens
+            order = Order(
+                tenant=tenant,
+                customer_phone=cart.phone_number,
+                total_amount=sum(item.subtotal for item in cart_items),
+                status='paid'
+            )
+            order_items = [
+                OrderItem(
+                    product_name=item.product.name,
+                    quantity=item.quantity,
+                    price=item.product.price
+                )
+                for item in cart_items
+            ]
+
+            # Pedido, registro de idempotência e limpeza do carrinho na mesma transação
+            save_order(order, order_items)
+            # As unidades reservadas para o carrinho viram baixa definitiva
+            consume(cart)
+            ProcessedPayment.objects.create(external_reference=external_reference, payment_id=str(payment_id or ''), order=order)
+            cart.delete()
+            return order
+    except IntegrityError:
+        # Bancos sem SELECT ... FOR UPDATE (SQLite): a chave única barra a segunda conversão
+        processed = ProcessedPayment.objects.filter(external_reference=external_reference).select_related('order').first()
+        if processed is None:
+            raise
+        return processed.order
@@ -0,0 +1,51 @@
+"""
+Acesso ao Mercado Pago.
+
+O cliente HTTP padrão do SDK abre uma sessão (e uma conexão TLS) nova a cada
+chamada e não tem timeout curto. Aqui todas as chamadas passam por uma única
+`requests.Session` por processo, com pool de conexões e timeout, para que um
+gateway lento não segure a requisição (ou o worker) por tempo indefinido.
+"""
+import mercadopago
+import requests
+from django.conf import settings
+from mercadopago.config import RequestOptions
+from mercadopago.http import HttpClient
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+
+class PooledHttpClient(HttpClient):
+    """HttpClient do SDK reaproveitando as conexões de uma sessão compartilhada."""
+
+    def __init__(self, pool_size=10):
+        self.session = requests.Session()
+        # Repete apenas erros de conexão e respostas 429/5xx em métodos idempotentes (GET)
+        retries = Retry(total=2, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+        self.session.mount('https://', HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries))
+
+    def request(self, method, url, maxretries=None, **kwargs):
+        api_result = self.session.request(method, url, **kwargs)
+        response = {'status': api_result.status_code, 'response': None}
+        if api_result.status_code != 204 and api_result.content:
+            try:
+                response['response'] = api_result.json()
+            except ValueError:
+                pass
+        return response
+
+
+_http_client = None
+
+
+def _get_http_client():
+    global _http_client
+    if _http_client is None:
+        _http_client = PooledHttpClient()
+    return _http_client
+
+
+def mercadopago_sdk(api_key):
+    """SDK do Mercado Pago para a chave do lojista, usando o cliente HTTP compartilhado."""
+    options = RequestOptions(connection_timeout=float(getattr(settings, 'MERCADOPAGO_TIMEOUT', 10.0)))
+    return mercadopago.SDK(api_key.strip(), http_client=_get_http_client(), request_options=options)
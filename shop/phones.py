@@ -0,0 +1,49 @@
+"""
+Telefones dos clientes em formato canônico (E.164, ex.: +5511999999999).
+
+O telefone é digitado livremente ("(11) 99999-9999", "011 99999 9999",
+"+55 11 99999-9999"...), então buscas pelo texto digitado precisavam de
+`icontains` (varredura da tabela). Os modelos gravam no save a versão
+normalizada em `phone_normalized`, que é indexada junto com a loja, e as buscas
+normalizam o telefone informado da mesma forma e comparam por igualdade.
+Por isso um número incompleto (sem DDD, só o final) não encontra nada: as telas
+de busca pedem o número completo (`is_complete_phone`).
+"""
+import re
+
+DEFAULT_COUNTRY_CODE = '55'
+
+_NON_DIGITS = re.compile(r'\D')
+
+
+def normalize_phone(raw):
+    """
+    Retorna o telefone no formato +<DDI><número>, ou '' se não houver dígitos.
+    Números sem DDI (DDD + número, com ou sem o 0 de longa distância) recebem o +55.
+    """
+    raw = (raw or '').strip()
+    digits = _NON_DIGITS.sub('', raw)
+    if not digits:
+        return ''
+    if raw.startswith('+'):
+        return f'+{digits}'
+    if digits.startswith('00'):
+        # Prefixo internacional discado (00 + DDI)
+        return f'+{digits[2:]}'
+    digits = digits.lstrip('0') # 0 de longa distância (011...)
+    if len(digits) in (12, 13) and digits.startswith(DEFAULT_COUNTRY_CODE):
+        return f'+{digits}'
+    return f'+{DEFAULT_COUNTRY_CODE}{digits}'
+
+
+INCOMPLETE_PHONE_MESSAGE = 'Digite o número completo, com DDD (ex.: 11999999999).'
+
+
+def is_complete_phone(normalized):
+    """
+    Se o telefone normalizado identifica um cliente: no Brasil, DDD + 8 ou 9
+    dígitos; com outro DDI, ao menos 8 dígitos depois do +.
+    """
+    if normalized.startswith(f'+{DEFAULT_COUNTRY_CODE}'):
+        return len(normalized) - len(DEFAULT_COUNTRY_CODE) - 1 in (10, 11)
+    return len(normalized) > 8
@@ -0,0 +1,145 @@
+"""
+Manutenção incremental das tabelas de vendas consolidadas
+(`DailySalesRollup` e `CustomerSalesRollup`).
+
+Cada app informa a "contribuição" de um pedido para os relatórios — a data,
+o valor e, no delivery, o cliente — ou None quando o pedido não entra nas
+vendas (ex.: cancelado, comanda ainda aberta). Os signals guardam a
+contribuição anterior no pre_save e aplicam apenas a diferença no post_save
+e no post_delete, com updates `F()`. A contribuição anterior é calculada quando
+o registro é carregado do banco (post_init), sem uma consulta extra por save.
+
+Para reconstruir tudo a partir dos pedidos, use o comando `rebuild_sales_rollups`
+(a migração shop/0027 faz o mesmo uma vez, para os pedidos anteriores às tabelas).
+"""
+from collections import namedtuple
+
+from django.apps import apps as global_apps
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Sum, Value
+from django.db.models.functions import Greatest
+
+from .models import DailySalesRollup, CustomerSalesRollup
+
+Contribution = namedtuple('Contribution', ['date', 'total', 'customer_whatsapp', 'customer_name'], defaults=[None, None])
+
+
+def contribution_on_load(instance, contribution):
+    """
+    Guarda na instância a contribuição com que o registro veio do banco. Deve ser
+    chamado no post_init; assim o pre_save não precisa buscar o registro de novo.
+    Instâncias carregadas com campos adiados (`only`/`defer`) não guardam nada.
+    """
+    if instance.pk is not None and not instance.get_deferred_fields():
+        instance._rollup_loaded = contribution(instance)
+
+
+def remember_contribution(sender, instance, contribution):
+    """
+    Guarda na instância a contribuição que o registro tinha no banco antes de ser salvo.
+    Deve ser chamado no pre_save. Usa a guardada na carga (ou no último save) e só
+    consulta o banco para instâncias montadas à mão com pk ou com campos adiados.
+    """
+    previous = getattr(instance, '_rollup_loaded', None)
+    if instance._state.adding or not hasattr(instance, '_rollup_loaded'):
+        previous = None
+        if instance.pk:
+            old = sender.objects.filter(pk=instance.pk).first()
+            if old is not None:
+                previous = contribution(old)
+    instance._rollup_previous = previous
+
+
+def saved_contribution(instance, current):
+    """Depois do post_save, a contribuição atual passa a ser a do registro no banco."""
+    instance._rollup_loaded = current
+
+
+def sync_contribution(tenant_id, channel, previous, current):
+    """Aplica nas tabelas consolidadas a troca da contribuição `previous` por `current`."""
+    if previous == current:
+        return
+    with transaction.atomic():
+        if previous is not None:
+            _apply(tenant_id, channel, previous, -1)
+        if current is not None:
+            _apply(tenant_id, channel, current, 1)
+
+
+def _apply(tenant_id, channel, contribution, sign):
+    total = contribution.total * sign
+    _bump(
+        DailySalesRollup,
+        {'tenant_id': tenant_id, 'channel': channel, 'date': contribution.date},
+        {'order_count': F('order_count') + sign, 'total': F('total') + total},
+        {'order_count': sign, 'total': total},
+        create=sign > 0,
+    )
+    if contribution.customer_whatsapp:
+        updates = {'order_count': F('order_count') + sign, 'total_spent': F('total_spent') + total}
+        if sign > 0:
+            # Mesmo critério do relatório antigo: Max('customer_name')
+            updates['customer_name'] = Greatest(F('customer_name'), Value(contribution.customer_name or ''))
+        _bump(
+            CustomerSalesRollup,
+            {'tenant_id': tenant_id, 'date': contribution.date, 'customer_whatsapp': contribution.customer_whatsapp},
+            updates,
+            {'order_count': sign, 'total_spent': total, 'customer_name': contribution.customer_name or ''},
+            create=sign > 0,
+        )
+
+
+def _bump(model, keys, updates, initial, create):
+    """
+    Incrementa a linha consolidada com um único UPDATE; cria a linha se ainda não existir.
+    Decrementos nunca criam linhas (o tenant pode estar sendo excluído em cascata).
+    """
+    if model.objects.filter(**keys).update(**updates) or not create:
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**keys, **initial)
+    except IntegrityError:
+        # Outra requisição criou a linha entre o UPDATE e o INSERT
+        model.objects.filter(**keys).update(**updates)
+
+
+def rebuild_rollups(tenant_id, apps=global_apps):
+    """
+    Recalcula do zero as linhas consolidadas de um tenant a partir dos pedidos e
+    comandas. `apps` permite rodar numa migração, com os modelos históricos.
+    Retorna o número de dias consolidados.
+    """
+    DailySales = apps.get_model('shop', 'DailySalesRollup')
+    CustomerSales = apps.get_model('shop', 'CustomerSalesRollup')
+    DeliveryOrder = apps.get_model('delivery', 'DeliveryOrder')
+    BarComanda = apps.get_model('bar', 'BarComanda')
+
+    with transaction.atomic():
+        DailySales.objects.filter(tenant_id=tenant_id).delete()
+        CustomerSales.objects.filter(tenant_id=tenant_id).delete()
+
+        orders = DeliveryOrder.objects.filter(tenant_id=tenant_id, business_date__isnull=False).exclude(status='cancelled')
+        comandas = BarComanda.objects.filter(tenant_id=tenant_id, status='fechada', business_date__isnull=False)
+        daily = [
+            DailySales(tenant_id=tenant_id, channel='delivery', date=row['business_date'], order_count=row['order_count'], total=row['total'])
+            for row in orders.values('business_date').annotate(order_count=Count('id'), total=Sum('final_total'))
+        ] + [
+            DailySales(tenant_id=tenant_id, channel='bar', date=row['business_date'], order_count=row['order_count'], total=row['total'])
+            for row in comandas.values('business_date').annotate(order_count=Count('id'), total=Sum('total'))
+        ]
+        DailySales.objects.bulk_create(daily)
+
+        customers = orders.values('business_date', 'customer_whatsapp').annotate(
+            order_count=Count('id'),
+            total_spent=Sum('final_total'),
+            customer_name=Max('customer_name'),
+        )
+        CustomerSales.objects.bulk_create([
+            CustomerSales(
+                tenant_id=tenant_id, date=row['business_date'], customer_whatsapp=row['customer_whatsapp'],
+                customer_name=row['customer_name'], order_count=row['order_count'], total_spent=row['total_spent'],
+            )
+            for row in customers
+        ], batch_size=500)
+    return len(daily)
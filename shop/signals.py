@@ -0,0 +1,60 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from shop import image_variants
+from .models import Tenant, Category, Product, ProductImage, Cart, CartItem
+from .stock import release, release_cart
+from .storefront import invalidate_category_order
+from .tenants import invalidate_tenant
+
+
+def _tenant_logo_ready(tenant):
+    # A URL da logo faz parte do cardápio compilado do delivery e do tenant em cache
+    from delivery.menu_cache import invalidate_menu
+    invalidate_menu(tenant.slug)
+    invalidate_tenant(tenant.slug)
+
+
+image_variants.register(ProductImage, 'image', 'variants')
+image_variants.register(Tenant, 'logo', 'logo_variants', widths=(160, 320, 640), on_ready=_tenant_logo_ready)
+
+
+@receiver(pre_delete, sender=Cart)
+def cart_deleted(sender, instance, **kwargs):
+    # Antes do CASCADE apagar as reservas: o que ainda estava reservado volta ao estoque
+    release_cart(instance)
+
+
+@receiver(post_delete, sender=CartItem)
+def cart_item_deleted(sender, instance, **kwargs):
+    release(instance.cart_id, instance.product_id)
+
+
+@receiver(pre_save, sender=Tenant)
+def tenant_slug_changing(sender, instance, **kwargs):
+    # O slug antigo deixaria de ser invalidado pelo post_save
+    if instance.pk:
+        old_slug = Tenant.objects.filter(pk=instance.pk).values_list('slug', flat=True).first()
+        if old_slug and old_slug != instance.slug:
+            transaction.on_commit(lambda: invalidate_tenant(old_slug))
+
+
+@receiver([post_save, post_delete], sender=Tenant)
+def tenant_saved(sender, instance, **kwargs):
+    slug = instance.slug
+    transaction.on_commit(lambda: invalidate_tenant(slug))
+
+
+@receiver([post_save, post_delete], sender=Product)
+def storefront_product_changed(sender, instance, **kwargs):
+    # Produto novo, trocado de categoria ou excluído muda a ordem das categorias da vitrine
+    invalidate_category_order(instance.tenant_id)
+
+
+@receiver(post_save, sender=Category)
+def storefront_category_renamed(sender, instance, created, **kwargs):
+    # As categorias são globais: o nome entra na ordem de todas as lojas com produtos nela
+    if not created:
+        for tenant_id in Product.objects.filter(category=instance).values_list('tenant_id', flat=True).distinct():
+            invalidate_category_order(tenant_id)
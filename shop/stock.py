@@ -0,0 +1,151 @@
+"""
+Reserva e baixa de estoque da loja.
+
+`Product.stock` é o estoque disponível. Ao colocar um produto no carrinho, as
+unidades são separadas na hora: um UPDATE condicional
+(`stock = stock - n WHERE stock >= n`) desconta o estoque e falha sem efeito se
+não houver unidades suficientes. Só a linha do produto é travada, pelo tempo do
+UPDATE, então compradores de produtos diferentes não disputam nada.
+
+As unidades separadas ficam em `StockReservation` (carrinho, produto) com prazo
+de validade. Se o cliente abandona o carrinho, o comando
+`release_expired_reservations` devolve as reservas vencidas ao estoque. Quando o
+carrinho vira pedido, as reservas são consumidas (o estoque já foi descontado).
+Todas as operações sobre as reservas são condicionais (só valem se a linha ainda
+está como foi lida), para que o varredor e o checkout possam correr juntos.
+
+Pelo mesmo motivo o `ProductForm` nunca grava `stock` com um save comum: a
+edição do lojista entra como diferença (`adjust_stock`).
+"""
+import logging
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Product, StockReservation
+
+logger = logging.getLogger(__name__)
+
+RESERVATION_TTL = timedelta(minutes=15) # Validade da reserva a partir da última alteração no carrinho
+CHECKOUT_TTL = timedelta(minutes=30) # Ao ir para o pagamento, a reserva é estendida
+
+
+class OutOfStock(Exception):
+    def __init__(self, product, requested):
+        self.product = product
+        self.requested = requested
+        super().__init__(f'Estoque insuficiente para "{product.name}".')
+
+
+def _take(product, quantity):
+    """Desconta `quantity` do estoque se houver; retorna se conseguiu."""
+    return Product.objects.filter(pk=product.pk, stock__gte=quantity).update(stock=F('stock') - quantity) == 1
+
+
+def _give_back(product_id, quantity):
+    Product.objects.filter(pk=product_id).update(stock=F('stock') + quantity)
+
+
+def adjust_stock(product_id, delta):
+    """
+    Soma `delta` ao estoque disponível (edição do lojista), sem passar de zero.
+    Retorna o estoque resultante.
+    """
+    if delta:
+        Product.objects.filter(pk=product_id).update(stock=Greatest(F('stock') + delta, 0))
+    return Product.objects.filter(pk=product_id).values_list('stock', flat=True).first()
+
+
+def reserve(cart, product, quantity, ttl=RESERVATION_TTL):
+    """Separa mais `quantity` unidades do produto para o carrinho. Levanta OutOfStock se não houver."""
+    if quantity <= 0:
+        return
+    expires_at = timezone.now() + ttl
+    with transaction.atomic():
+        if not _take(product, quantity):
+            raise OutOfStock(product, quantity)
+        rows = StockReservation.objects.filter(cart=cart, product=product)
+        if rows.update(quantity=F('quantity') + quantity, expires_at=expires_at):
+            return
+        try:
+            with transaction.atomic():
+                StockReservation.objects.create(cart=cart, product=product, quantity=quantity, expires_at=expires_at)
+        except IntegrityError:
+            # Outra requisição do mesmo carrinho criou a reserva no meio tempo
+            rows.update(quantity=F('quantity') + quantity, expires_at=expires_at)
+
+
+def release(cart, product_id, quantity=None):
+    """Devolve ao estoque `quantity` unidades reservadas (todas, se None)."""
+    reservation = StockReservation.objects.filter(cart=cart, product_id=product_id).first()
+    if reservation is None:
+        return
+    with transaction.atomic():
+        if quantity is None or quantity >= reservation.quantity:
+            # Só devolve se a reserva ainda é a que foi lida (o varredor pode ter chegado antes)
+            released, _ = StockReservation.objects.filter(pk=reservation.pk, quantity=reservation.quantity).delete()
+            if released:
+                _give_back(product_id, reservation.quantity)
+        elif StockReservation.objects.filter(pk=reservation.pk, quantity__gte=quantity).update(quantity=F('quantity') - quantity):
+            _give_back(product_id, quantity)
+
+
+def set_quantity(cart, product, old_quantity, new_quantity):
+    """Ajusta a reserva quando a quantidade de um item do carrinho muda."""
+    if new_quantity > old_quantity:
+        reserve(cart, product, new_quantity - old_quantity)
+    elif new_quantity < old_quantity:
+        release(cart, product.pk, old_quantity - new_quantity)
+
+
+def ensure_reserved(cart, ttl=CHECKOUT_TTL):
+    """
+    Garante que todas as unidades do carrinho estão reservadas (ex.: reservas que
+    venceram e foram devolvidas, ou carrinhos anteriores às reservas) e estende a
+    validade. Levanta OutOfStock no primeiro produto que não tiver estoque.
+    """
+    held = dict(StockReservation.objects.filter(cart=cart).values_list('product_id', 'quantity'))
+    for item in cart.items.select_related('product'):
+        reserve(cart, item.product, item.quantity - held.get(item.product_id, 0), ttl=ttl)
+    StockReservation.objects.filter(cart=cart).update(expires_at=timezone.now() + ttl)
+
+
+def consume(cart):
+    """
+    Transforma as reservas do carrinho em baixa definitiva (ao criar o pedido).
+    Deve ser chamada dentro da transação que cria o pedido.
+    """
+    for item in cart.items.select_related('product'):
+        consumed = 0
+        reservation = StockReservation.objects.filter(cart=cart, product=item.product).first()
+        if reservation and StockReservation.objects.filter(pk=reservation.pk, quantity=reservation.quantity).delete()[0]:
+            consumed = reservation.quantity
+        missing = item.quantity - consumed
+        if missing > 0 and not _take(item.product, missing):
+            # O pagamento já foi aprovado: o pedido é criado mesmo assim, mas fica registrado
+            logger.warning('Pedido do carrinho %s sem estoque para %s x "%s".', cart.id, missing, item.product.name)
+        elif missing < 0:
+            _give_back(item.product_id, -missing)
+
+
+def release_cart(cart):
+    """Devolve ao estoque todas as reservas do carrinho (carrinho excluído)."""
+    for product_id in StockReservation.objects.filter(cart=cart).values_list('product_id', flat=True):
+        release(cart, product_id)
+
+
+def release_expired(now=None, batch_size=500):
+    """Devolve ao estoque as reservas vencidas. Retorna quantas foram liberadas."""
+    now = now or timezone.now()
+    released = 0
+    expired = StockReservation.objects.filter(expires_at__lt=now).values_list('pk', 'product_id', 'quantity')[:batch_size]
+    for pk, product_id, quantity in expired:
+        with transaction.atomic():
+            # Só libera se ninguém renovou (ou consumiu) a reserva desde a leitura
+            if StockReservation.objects.filter(pk=pk, quantity=quantity, expires_at__lt=now).delete()[0]:
+                _give_back(product_id, quantity)
+                released += 1
+    return released
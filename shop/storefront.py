@@ -0,0 +1,138 @@
+"""
+Paginação da vitrine por cursor (keyset).
+
+A vitrine é ordenada em dois níveis: primeiro as categorias (a de promoção no
+topo, depois pela regra do `display_order` do lojista) e, dentro de cada
+categoria, os produtos (mais novos primeiro ou por preço). Em vez de OFFSET,
+cada página continua do último produto entregue: o cursor guarda a categoria,
+o preço e o ID desse produto, e a próxima página é uma busca no índice
+(tenant, category, ...) a partir dele. Assim a página 100 custa o mesmo que a 1.
+
+A ordem das categorias sai de uma consulta agrupada sobre todos os produtos da
+loja. Ela é calculada uma vez na primeira página (e fica no cache por tenant,
+invalidado pelos signals de produto e categoria em `shop/signals.py`); o cursor
+leva as categorias que faltam, então a rolagem não a recalcula.
+"""
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+
+from .models import Product
+
+PAGE_SIZE = 24 # Produtos por página (primeira carga e cada rolagem)
+
+_CURSOR_SALT = 'shop.storefront.cursor'
+
+CATEGORIES_CACHE_KEY = 'shop:storefront:categories:{tenant_id}'
+# Sem cache compartilhado a invalidação só alcança o próprio processo (ver settings)
+CATEGORIES_CACHE_TIMEOUT = 60 * 60 if getattr(settings, 'CACHE_SHARED', False) else 30
+
+
+def category_order(tenant):
+    """
+    Categorias da loja na ordem de exibição, como lista de dicts (id, name).
+    Vem do cache; sem ele, uma única consulta agrupada sobre os produtos do tenant.
+    """
+    key = CATEGORIES_CACHE_KEY.format(tenant_id=tenant.id)
+    rows = cache.get(key)
+    if rows is None:
+        rows = list(Product.objects.filter(tenant=tenant).order_by().values(
+            'category', 'category__name'
+        ).annotate(latest=Max('id')))
+        cache.set(key, rows, CATEGORIES_CACHE_TIMEOUT)
+
+    # A ordenação fica fora do cache: depende do display_order e da promoção atuais do tenant
+    promo_id = tenant.promotion_category_id
+    if tenant.display_order in ('price_asc', 'price_desc'):
+        # Promoção > Categoria (nome)
+        key = lambda row: (row['category'] != promo_id, row['category__name'], row['category'])
+    else:
+        # Promoção > Categorias com itens mais recentes primeiro (Recently Added)
+        key = lambda row: (row['category'] != promo_id, -row['latest'])
+    return [{'id': row['category'], 'name': row['category__name']} for row in sorted(rows, key=key)]
+
+
+def invalidate_category_order(tenant_id):
+    # Depois do commit, para uma requisição concorrente não recolocar a ordem antiga no cache
+    transaction.on_commit(lambda: cache.delete(CATEGORIES_CACHE_KEY.format(tenant_id=tenant_id)))
+
+
+def _products_in_category(tenant, category_id, after, limit):
+    """Próximos `limit` produtos da categoria, continuando depois do produto `after` (price, id) se informado."""
+    produtos = Product.objects.filter(tenant=tenant, category_id=category_id).select_related('category', 'primary_image')
+
+    if tenant.display_order == 'price_asc':
+        ordering = ('price', 'id')
+        if after:
+            produtos = produtos.filter(price__gte=after['price']).exclude(price=after['price'], id__lte=after['id'])
+    elif tenant.display_order == 'price_desc':
+        ordering = ('-price', '-id')
+        if after:
+            produtos = produtos.filter(price__lte=after['price']).exclude(price=after['price'], id__gte=after['id'])
+    else:
+        # Itens mais recentes dentro da categoria
+        ordering = ('-id',)
+        if after:
+            produtos = produtos.filter(id__lt=after['id'])
+
+    return list(produtos.order_by(*ordering)[:limit])
+
+
+def storefront_page(tenant, categories, cursor=None, page_size=PAGE_SIZE):
+    """
+    Retorna (produtos, próximo cursor) da vitrine. `categories` é a lista
+    ordenada de `category_order` (já filtrada, se houver filtro de categoria);
+    pode ser None quando há cursor, que já traz as categorias restantes.
+    O próximo cursor é None quando não há mais produtos.
+
+    Cada produto recebe `show_category_title`, indicando se ele abre uma nova
+    categoria (também entre páginas, para o título não se repetir).
+    """
+    position = signing.loads(cursor, salt=_CURSOR_SALT) if cursor else None
+
+    if position and 'categories' in position:
+        category_ids = position['categories']
+    else:
+        if categories is None:
+            # Cursor anterior ao campo `categories`
+            categories = category_order(tenant)
+        category_ids = [category['id'] for category in categories]
+    start = 0
+    after = None
+    if position:
+        if position['category'] not in category_ids:
+            # A categoria do cursor deixou de existir na loja: fim da listagem
+            return [], None
+        start = category_ids.index(position['category'])
+        after = position
+
+    produtos = []
+    for category_id in category_ids[start:]:
+        # Busca um a mais que o necessário para saber se há próxima página
+        produtos += _products_in_category(tenant, category_id, after, page_size + 1 - len(produtos))
+        after = None
+        if len(produtos) > page_size:
+            break
+
+    has_next = len(produtos) > page_size
+    produtos = produtos[:page_size]
+
+    previous_category = position['category'] if position else None
+    for produto in produtos:
+        produto.show_category_title = produto.category_id != previous_category
+        previous_category = produto.category_id
+
+    next_cursor = None
+    if has_next:
+        last = produtos[-1]
+        next_cursor = signing.dumps(
+            {
+                'category': last.category_id, 'price': str(last.price), 'id': last.id,
+                # Categorias ainda por listar, a partir da atual: a próxima página não recalcula a ordem
+                'categories': category_ids[category_ids.index(last.category_id):],
+            },
+            salt=_CURSOR_SALT, compress=True,
+        )
+    return produtos, next_cursor
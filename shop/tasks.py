@@ -0,0 +1,38 @@
+"""Tarefas em segundo plano da loja (executadas pelo comando `run_jobs`, ver `shop/jobs.py`)."""
+import logging
+
+from .jobs import PermanentJobError, task
+from .models import Tenant, ProcessedPayment
+from .orders import create_order_from_cart
+from .payments import mercadopago_sdk
+
+logger = logging.getLogger(__name__)
+
+
+@task('mercadopago.payment')
+def process_mercadopago_payment(tenant_id, payment_id):
+    """Consulta um pagamento notificado pelo webhook e, se aprovado, transforma o carrinho em pedido."""
+    tenant = Tenant.objects.filter(id=tenant_id).first()
+    if tenant is None or not tenant.mercadopago_api_key:
+        raise PermanentJobError(f'Tenant {tenant_id} inexistente ou sem chave do Mercado Pago.')
+    if ProcessedPayment.objects.filter(payment_id=str(payment_id)).exists():
+        return # Notificação repetida de um pagamento já convertido em pedido
+
+    payment_info = mercadopago_sdk(tenant.mercadopago_api_key).payment().get(payment_id)
+    status_code = payment_info['status']
+    if status_code != 200:
+        # 404 pode ser só atraso do Mercado Pago em disponibilizar o pagamento; 429 e 5xx são temporários
+        if 400 <= status_code < 500 and status_code not in (404, 429):
+            raise PermanentJobError(f'Mercado Pago respondeu {status_code} para o pagamento {payment_id}.')
+        raise RuntimeError(f'Mercado Pago respondeu {status_code} para o pagamento {payment_id}.')
+
+    payment = payment_info['response']
+    external_reference = payment.get('external_reference')
+    if payment.get('status') != 'approved' or not external_reference:
+        return
+
+    order = create_order_from_cart(external_reference, payment_id=payment_id)
+    if order is None:
+        logger.info('Carrinho %s não encontrado ou vazio.', external_reference)
+        return
+    logger.info('Pagamento %s -> pedido %s.', payment_id, order.id)
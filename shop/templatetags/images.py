@@ -0,0 +1,15 @@
+from django import template
+
+from shop import image_variants
+
+register = template.Library()
+
+@register.filter
+def thumbnail(field_file, width=640):
+    """URL da miniatura JPEG mais próxima da largura pedida. Uso: {{ item.image|thumbnail:320 }}"""
+    return image_variants.thumbnail(field_file, int(width))
+
+@register.filter
+def srcset(field_file, fmt='webp'):
+    """Valor do srcset das variantes no formato pedido. Uso: {{ item.image|srcset:'webp' }}"""
+    return image_variants.srcset(field_file, fmt)
@@ -0,0 +1,110 @@
+"""
+Resolução do tenant pelo slug da URL, com cache.
+
+Toda página pública (vitrine, detalhe do produto, checkout do delivery, cardápio
+em imagem, cardápio do bar...) começa buscando o tenant pelo slug. Os campos que
+essas páginas usam mudam raramente, então ficam em dois níveis de cache:
+
+- no próprio processo, por poucos segundos (TENANT_LOCAL_CACHE_TTL), sem nem
+  consultar o cache do Django;
+- no cache do Django, por até TENANT_CACHE_TIMEOUT segundos.
+
+O cache é invalidado pelos signals em `shop/signals.py` quando o tenant é salvo
+ou excluído. Outros processos podem ver o valor antigo por até
+TENANT_LOCAL_CACHE_TTL segundos (ex.: "loja aberta" logo após o lojista mudar).
+O segundo nível só é usado com cache compartilhado (REDIS_URL, ver settings):
+no cache em memória de cada processo a invalidação não alcançaria os outros, que
+ficariam com o valor antigo até o timeout. Sem ele, fica só o primeiro nível.
+Decisões que não podem usar um valor de segundos atrás (ex.: aceitar itens no
+carrinho com a loja fechada) consultam o banco.
+
+O tenant devolvido é uma instância de `Tenant` montada só com os campos abaixo;
+serve para filtros (`Product.objects.filter(tenant=tenant)`) e templates. As
+chaves de pagamento nunca vão para o cache: o acesso a elas (ou a qualquer
+outro campo fora da lista) consulta o banco na hora, como um campo adiado.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404
+
+from myproject.db_routers import use_primary
+from .models import Tenant
+
+CACHE_KEY = 'shop:tenant:{slug}'
+CACHE_TIMEOUT = getattr(settings, 'TENANT_CACHE_TIMEOUT', 60 * 60) # Invalidado no save; o timeout é uma rede de segurança
+USE_SHARED_CACHE = getattr(settings, 'CACHE_SHARED', False)
+LOCAL_CACHE_TTL = getattr(settings, 'TENANT_LOCAL_CACHE_TTL', 5)
+
+# Campos guardados no cache (o suficiente para as páginas públicas)
+CACHED_FIELDS = (
+    'id', 'name', 'slug', 'business_type', 'is_open', 'display_order', 'logo', 'logo_variants',
+    'whatsapp_number', 'promotion_category_id', 'numero_mesas', 'permitir_gorjeta_10',
+)
+
+_local = {} # slug -> (expira_em, registro)
+
+
+def _load(slug):
+    # O registro fica no cache até o tenant mudar: nunca é lido da réplica
+    with use_primary():
+        record = Tenant.objects.filter(slug=slug).values(*CACHED_FIELDS, 'mercadopago_api_key', 'pagseguro_api_key').first()
+    if record is None:
+        return None
+    # Das chaves de pagamento só interessa saber quais gateways estão configurados
+    record['payment_gateways'] = [
+        gateway for gateway in ('mercadopago', 'pagseguro') if record.pop(f'{gateway}_api_key')
+    ]
+    return record
+
+
+def _get_record(slug):
+    now = time.monotonic()
+    entry = _local.get(slug)
+    if entry and entry[0] > now:
+        return entry[1]
+
+    key = CACHE_KEY.format(slug=slug)
+    record = cache.get(key) if USE_SHARED_CACHE else None
+    if record is None:
+        record = _load(slug)
+        if record is None:
+            return None # Slugs inexistentes não são guardados
+        if USE_SHARED_CACHE:
+            cache.set(key, record, CACHE_TIMEOUT)
+    _local[slug] = (now + LOCAL_CACHE_TTL, record)
+    return record
+
+
+def _build(record):
+    """Instância nova a cada chamada: a view pode alterá-la sem afetar o cache."""
+    # from_db recebe os valores na ordem dos campos do modelo; os ausentes ficam adiados
+    fields = [f.attname for f in Tenant._meta.concrete_fields if f.attname in record]
+    tenant = Tenant.from_db('default', fields, [record[name] for name in fields])
+    tenant._payment_gateways = record['payment_gateways']
+    return tenant
+
+
+def get_cached_tenant(slug):
+    """Tenant pelo slug (ver acima quais campos vêm do cache) ou None."""
+    if not slug:
+        return None
+    record = _get_record(slug)
+    return _build(record) if record else None
+
+
+def get_tenant_or_404(request, tenant_slug):
+    """Tenant do slug da URL: o resolvido pelo TenantResolverMiddleware, ou busca no cache."""
+    tenant = getattr(request, 'tenant_record', None)
+    if tenant is None or tenant.slug != tenant_slug:
+        tenant = get_cached_tenant(tenant_slug)
+    if tenant is None:
+        raise Http404('Loja não encontrada.')
+    return tenant
+
+
+def invalidate_tenant(slug):
+    if slug:
+        _local.pop(slug, None)
+        cache.delete(CACHE_KEY.format(slug=slug))
@@ -0,0 +1,415 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.query import QuerySet
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from . import jobs, orders
+from .auth import NO_TENANT_MESSAGE
+from .middleware import MerchantTenantMiddleware
+from .models import Job, Tenant, Category, Product, Cart, CartItem, Order, ProcessedPayment
+from .forms import ProductForm, ProductImageFormSet
+from .models import StockReservation
+from .stock import OutOfStock, consume, ensure_reserved, release, release_expired, reserve
+from .tasks import process_mercadopago_payment
+
+
+def make_store(stock=10):
+    """Loja com um produto (R$ 25,00) para os testes."""
+    user = User.objects.create(username='lojista')
+    tenant = Tenant.objects.create(name='Loja', user=user, slug='loja', mercadopago_api_key='chave')
+    category = Category.objects.create(name='Camisetas')
+    product = Product.objects.create(tenant=tenant, category=category, name='Camiseta', description='-', price=Decimal('25.00'), stock=stock)
+    return tenant, product
+
+
+def make_cart(product, quantity=2, phone='11999990000'):
+    """Carrinho com o produto, com as unidades reservadas como no fluxo da loja."""
+    cart = Cart.objects.create(phone_number=phone)
+    CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+    reserve(cart, product, quantity)
+    return cart
+
+
+@jobs.task('tests.ok')
+def _ok_task(**payload):
+    pass
+
+
+@jobs.task('tests.fails')
+def _failing_task(**payload):
+    raise RuntimeError('falha temporária')
+
+
+@jobs.task('tests.gives_up')
+def _permanent_failure_task(**payload):
+    raise jobs.PermanentJobError('falha definitiva')
+
+
+class JobQueueTests(TestCase):
+    def test_claim_only_once(self):
+        job = jobs.enqueue('tests.ok')
+        self.assertTrue(jobs._claim(job.id))
+        # Segundo worker chegando depois: o UPDATE condicional não acha mais a tarefa pendente
+        self.assertFalse(jobs._claim(job.id))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'running')
+        self.assertIsNotNone(job.locked_at)
+
+    def test_claim_ignores_jobs_not_due(self):
+        job = jobs.enqueue('tests.ok', delay=60)
+        self.assertFalse(jobs._claim(job.id))
+        self.assertEqual(jobs.run_pending(), 0)
+
+    def test_run_pending_skips_job_claimed_by_another_worker(self):
+        job = jobs.enqueue('tests.ok')
+        Job.objects.filter(pk=job.pk).update(status='running', locked_at=timezone.now())
+        self.assertEqual(jobs.run_pending(), 0)
+
+    def test_success(self):
+        job = jobs.enqueue('tests.ok', {'value': 1})
+        self.assertEqual(jobs.run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_at), ('done', 1, None))
+
+    def test_failure_is_retried_with_exponential_backoff(self):
+        job = jobs.enqueue('tests.fails')
+        delays = []
+        for _ in range(3):
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+            before = timezone.now()
+            with self.assertLogs('shop.jobs', 'WARNING'):
+                self.assertEqual(jobs.run_pending(), 1)
+            job.refresh_from_db()
+            self.assertEqual(job.status, 'pending')
+            self.assertIn('falha temporária', job.last_error)
+            delays.append(round((job.run_at - before).total_seconds()))
+        self.assertEqual(delays, [10, 20, 40])
+        self.assertEqual(job.attempts, 3)
+        # Ainda não venceu: o worker não a executa de novo
+        self.assertEqual(jobs.run_pending(), 0)
+
+    def test_retry_delay_is_capped(self):
+        self.assertEqual(jobs.retry_delay(1), timedelta(seconds=jobs.RETRY_BASE_DELAY))
+        self.assertEqual(jobs.retry_delay(30), timedelta(seconds=jobs.RETRY_MAX_DELAY))
+
+    def test_fails_after_max_attempts(self):
+        job = jobs.enqueue('tests.fails', max_attempts=2)
+        with self.assertLogs('shop.jobs', 'WARNING'):
+            jobs.run_pending()
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('shop.jobs', 'ERROR'):
+            jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+
+    def test_permanent_error_and_unknown_handler_fail_at_once(self):
+        permanent = jobs.enqueue('tests.gives_up')
+        unknown = jobs.enqueue('tests.not_registered')
+        with self.assertLogs('shop.jobs', 'ERROR'):
+            self.assertEqual(jobs.run_pending(), 2)
+        for job in (permanent, unknown):
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), ('failed', 1))
+
+    def test_release_stale_returns_abandoned_jobs_to_the_queue(self):
+        stale = jobs.enqueue('tests.ok')
+        recent = jobs.enqueue('tests.ok')
+        now = timezone.now()
+        Job.objects.filter(pk=stale.pk).update(status='running', locked_at=now - jobs.LOCK_TIMEOUT - timedelta(seconds=1))
+        Job.objects.filter(pk=recent.pk).update(status='running', locked_at=now)
+
+        self.assertEqual(jobs.release_stale(), 1)
+        stale.refresh_from_db()
+        recent.refresh_from_db()
+        self.assertEqual((stale.status, stale.locked_at), ('pending', None))
+        self.assertEqual(recent.status, 'running')
+
+    def test_run_pending_picks_up_stale_jobs(self):
+        job = jobs.enqueue('tests.ok')
+        Job.objects.filter(pk=job.pk).update(status='running', locked_at=timezone.now() - jobs.LOCK_TIMEOUT * 2)
+        self.assertEqual(jobs.run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+
+
+class CreateOrderFromCartTests(TestCase):
+    def setUp(self):
+        self.tenant, self.product = make_store()
+        self.cart = make_cart(self.product)
+
+    def success_url(self, cart_id):
+        query = f'external_reference={cart_id}&collection_status=approved&payment_id=123'
+        return reverse('shop:payment_success') + '?' + query
+
+    def test_converts_cart_once(self):
+        order = orders.create_order_from_cart(self.cart.id, payment_id='123')
+
+        self.assertEqual((order.status, order.total_amount), ('paid', Decimal('50.00')))
+        self.assertEqual(order.items.get().quantity, 2)
+        self.assertFalse(Cart.objects.filter(pk=self.cart.pk).exists())
+        processed = ProcessedPayment.objects.get()
+        self.assertEqual((processed.external_reference, processed.payment_id, processed.order), (str(self.cart.id), '123', order))
+        # As unidades reservadas viram baixa: o estoque não é devolvido com a exclusão do carrinho
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 8)
+
+    def test_repeated_success_page_returns_same_order(self):
+        url = self.success_url(self.cart.id)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(ProcessedPayment.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 8)
+
+    def test_repeated_call_returns_existing_order(self):
+        first = orders.create_order_from_cart(self.cart.id)
+        with self.assertNumQueries(1):
+            second = orders.create_order_from_cart(self.cart.id)
+        self.assertEqual(first, second)
+
+    def test_missing_or_empty_cart(self):
+        self.assertIsNone(orders.create_order_from_cart(999999))
+        empty = Cart.objects.create(phone_number='11888880000')
+        self.assertIsNone(orders.create_order_from_cart(empty.id))
+        self.assertFalse(Order.objects.exists())
+
+    def _approved_payment(self, cart_id):
+        sdk = mock.Mock()
+        sdk.payment.return_value.get.return_value = {
+            'status': 200,
+            'response': {'status': 'approved', 'external_reference': str(cart_id)},
+        }
+        return mock.patch('shop.tasks.mercadopago_sdk', return_value=sdk)
+
+    def test_webhook_then_success_page(self):
+        with self._approved_payment(self.cart.id):
+            process_mercadopago_payment(tenant_id=self.tenant.id, payment_id='123')
+        self.client.get(self.success_url(self.cart.id))
+
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_success_page_then_repeated_webhook(self):
+        self.client.get(self.success_url(self.cart.id))
+        with self._approved_payment(self.cart.id) as sdk:
+            process_mercadopago_payment(tenant_id=self.tenant.id, payment_id='123')
+            process_mercadopago_payment(tenant_id=self.tenant.id, payment_id='123')
+        # Pagamento já registrado: o webhook nem consulta o Mercado Pago
+        sdk.assert_not_called()
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_concurrent_conversion_returns_winner_order(self):
+        """
+        O webhook termina a conversão entre a verificação inicial e a gravação do
+        retorno do pagamento (sem SELECT ... FOR UPDATE, como no SQLite): a chave
+        única de ProcessedPayment barra o segundo pedido e ele devolve o primeiro.
+        """
+        winner = Order.objects.create(tenant=self.tenant, total_amount=Decimal('50.00'), status='paid')
+        real_atomic = transaction.atomic
+        raced = []
+
+        def racing_atomic(*args, **kwargs):
+            if not raced:
+                raced.append(True)
+                ProcessedPayment.objects.create(external_reference=str(self.cart.id), order=winner)
+            return real_atomic(*args, **kwargs)
+
+        with mock.patch.object(orders.transaction, 'atomic', side_effect=racing_atomic):
+            order = orders.create_order_from_cart(self.cart.id)
+
+        self.assertEqual(order, winner)
+        self.assertEqual(Order.objects.count(), 1)
+        # A conversão perdedora foi desfeita por inteiro: carrinho e reserva continuam lá
+        self.assertTrue(Cart.objects.filter(pk=self.cart.pk).exists())
+        self.assertTrue(self.cart.reservations.exists())
+
+    def test_cart_already_converted_while_waiting_for_lock(self):
+        """Quem esperava a trava do carrinho não o encontra mais e devolve o pedido de quem converteu."""
+        original_first = QuerySet.first
+        lookups = []
+
+        def first(queryset):
+            # A verificação inicial não acha nada; a outra conversão termina logo depois
+            if queryset.model is ProcessedPayment and not lookups:
+                lookups.append(True)
+                return None
+            return original_first(queryset)
+
+        winner = orders.create_order_from_cart(self.cart.id)
+        with mock.patch.object(QuerySet, 'first', first):
+            self.assertEqual(orders.create_order_from_cart(self.cart.id), winner)
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        self.tenant, self.product = make_store(stock=5)
+        self.cart = Cart.objects.create(phone_number='11999990000')
+
+    def stock(self):
+        return Product.objects.values_list('stock', flat=True).get(pk=self.product.pk)
+
+    def reserved(self):
+        return StockReservation.objects.filter(cart=self.cart, product=self.product).values_list('quantity', flat=True).first()
+
+    def test_reserve_takes_stock_and_accumulates(self):
+        reserve(self.cart, self.product, 2)
+        reserve(self.cart, self.product, 1)
+        self.assertEqual((self.stock(), self.reserved()), (2, 3))
+
+    def test_reserve_without_enough_stock_changes_nothing(self):
+        reserve(self.cart, self.product, 4)
+        with self.assertRaises(OutOfStock):
+            reserve(self.cart, self.product, 2)
+        self.assertEqual((self.stock(), self.reserved()), (1, 4))
+
+    def test_release_partial_and_full(self):
+        reserve(self.cart, self.product, 3)
+        release(self.cart, self.product.pk, 1)
+        self.assertEqual((self.stock(), self.reserved()), (3, 2))
+        release(self.cart, self.product.pk)
+        self.assertEqual((self.stock(), self.reserved()), (5, None))
+
+    def test_deleting_cart_item_or_cart_gives_units_back(self):
+        item = CartItem.objects.create(cart=self.cart, product=self.product, quantity=2)
+        reserve(self.cart, self.product, 2)
+        item.delete()
+        self.assertEqual((self.stock(), self.reserved()), (5, None))
+
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=3)
+        reserve(self.cart, self.product, 3)
+        self.cart.delete()
+        self.assertEqual(self.stock(), 5)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_consume_keeps_reserved_units_taken(self):
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=2)
+        reserve(self.cart, self.product, 2)
+        consume(self.cart)
+        self.assertEqual((self.stock(), self.reserved()), (3, None))
+        # Sem reserva para devolver, excluir o carrinho não mexe no estoque
+        self.cart.delete()
+        self.assertEqual(self.stock(), 3)
+
+    def test_consume_takes_missing_units_and_returns_extra_ones(self):
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=3)
+        reserve(self.cart, self.product, 1)
+        consume(self.cart)
+        self.assertEqual(self.stock(), 2)
+
+        other = Cart.objects.create(phone_number='11888880000')
+        CartItem.objects.create(cart=other, product=self.product, quantity=1)
+        reserve(other, self.product, 2)
+        consume(other)
+        self.assertEqual(self.stock(), 1)
+
+    def test_consume_without_stock_still_creates_the_order(self):
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=2)
+        Product.objects.filter(pk=self.product.pk).update(stock=0)
+        with self.assertLogs('shop.stock', 'WARNING'):
+            consume(self.cart)
+        self.assertEqual(self.stock(), 0)
+
+    def test_release_expired(self):
+        reserve(self.cart, self.product, 2)
+        fresh_cart = Cart.objects.create(phone_number='11888880000')
+        reserve(fresh_cart, self.product, 1)
+        StockReservation.objects.filter(cart=self.cart).update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(release_expired(), 1)
+        self.assertEqual((self.stock(), self.reserved()), (4, None))
+        self.assertTrue(StockReservation.objects.filter(cart=fresh_cart).exists())
+        self.assertEqual(release_expired(), 0)
+
+    def test_expired_cart_is_reserved_again_at_checkout(self):
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=2)
+        reserve(self.cart, self.product, 2)
+        release_expired(now=timezone.now() + timedelta(days=1))
+        self.assertEqual(self.stock(), 5)
+
+        ensure_reserved(self.cart)
+        self.assertEqual((self.stock(), self.reserved()), (3, 2))
+
+
+class ProductFormStockTests(TestCase):
+    def setUp(self):
+        self.tenant, self.product = make_store(stock=10)
+        self.client.force_login(self.tenant.user)
+
+    def post_edit(self, **changes):
+        """Envia o formulário de edição como aberto agora, com as alterações do lojista."""
+        form = ProductForm(instance=self.product)
+        data = {name: form[name].value() for name in form.fields}
+        data.update(changes)
+        formset = ProductImageFormSet(instance=self.product)
+        data.update({
+            f'{formset.prefix}-TOTAL_FORMS': '0',
+            f'{formset.prefix}-INITIAL_FORMS': '0',
+            f'{formset.prefix}-MAX_NUM_FORMS': '4',
+        })
+        return data
+
+    def submit(self, data):
+        response = self.client.post(reverse('shop:edit_product', args=[self.product.pk]), data)
+        self.assertEqual(response.status_code, 302)
+        self.product.refresh_from_db()
+
+    def test_edit_keeps_reservations_made_while_the_form_was_open(self):
+        data = self.post_edit(name='Camiseta Nova')
+        # Um cliente reserva 3 unidades enquanto o lojista edita
+        make_cart(self.product, quantity=3)
+        self.submit(data)
+        self.assertEqual((self.product.name, self.product.stock), ('Camiseta Nova', 7))
+
+    def test_edit_applies_stock_change_as_a_delta(self):
+        data = self.post_edit(stock=15)
+        make_cart(self.product, quantity=3)
+        self.submit(data)
+        self.assertEqual(self.product.stock, 12)
+
+    def test_stock_never_goes_negative(self):
+        data = self.post_edit(stock=0)
+        make_cart(self.product, quantity=3)
+        self.submit(data)
+        self.assertEqual(self.product.stock, 0)
+
+
+class MerchantTenantMiddlewareTests(TestCase):
+    def test_tenant_is_only_loaded_when_used(self):
+        request = RequestFactory().get('/')
+        request.user = mock.Mock()
+        with mock.patch('shop.middleware.get_merchant_tenant') as get_tenant:
+            MerchantTenantMiddleware(lambda request: None).process_request(request)
+            get_tenant.assert_not_called()
+            get_tenant.return_value = None
+            self.assertFalse(request.tenant)
+            get_tenant.assert_called_once_with(request.user)
+
+    def test_public_page_does_not_load_session_or_user(self):
+        tenant, product = make_store()
+        self.client.force_login(tenant.user)
+        url = reverse('vitrine', args=[tenant.slug])
+        self.client.get(url)  # aquece o cache do tenant
+        with mock.patch('shop.middleware.get_merchant_tenant') as get_tenant:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        get_tenant.assert_not_called()
+
+    def test_panel_gets_the_tenant(self):
+        tenant, product = make_store()
+        self.client.force_login(tenant.user)
+        response = self.client.get(reverse('shop:produtos'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIs(type(response.wsgi_request.tenant), Tenant)
+        self.assertEqual(response.wsgi_request.tenant, tenant)
+
+    def test_panel_without_tenant(self):
+        self.client.force_login(User.objects.create(username='sem_loja'))
+        response = self.client.get(reverse('shop:inicio'))
+        self.assertContains(response, NO_TENANT_MESSAGE)
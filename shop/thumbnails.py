@@ -0,0 +1,100 @@
+"""
+Geração das miniaturas com o Pillow.
+
+Uma imagem vira versões redimensionadas em algumas larguras fixas, em WebP e
+JPEG, gravadas no mesmo storage das originais (em `thumbnails/...`). Quais campos
+têm variantes, onde elas ficam gravadas e quando são geradas é responsabilidade
+de `shop/image_variants.py`.
+"""
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+THUMBNAIL_WIDTHS = (320, 640, 1024)
+
+# Formato do Pillow e opções de gravação de cada variante
+THUMBNAIL_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def variant_name(name, width, fmt):
+    base, _ = os.path.splitext(name)
+    return f'thumbnails/{base}_{width}.{fmt}'
+
+
+def _to_rgb(image):
+    """JPEG não tem transparência: aplica a imagem sobre fundo branco."""
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def generate_variants(field_file, widths=THUMBNAIL_WIDTHS):
+    """
+    Gera as variantes de uma imagem (ImageFieldFile já salvo) e retorna o dict de caminhos,
+    indexado pela largura real de cada variante.
+    Levanta OSError se o arquivo não puder ser lido como imagem.
+    """
+    storage = field_file.storage
+    with field_file.open('rb') as f:
+        image = Image.open(f)
+        # Aplica a rotação da câmera (EXIF) antes de redimensionar; as variantes saem sem metadados
+        image = ImageOps.exif_transpose(image)
+        image.load()
+
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'P') else 'RGB')
+
+    variants = {fmt: {} for fmt in THUMBNAIL_FORMATS}
+    for width in sorted(widths):
+        # Nunca amplia: a partir da largura original, grava uma última variante no tamanho original e para
+        width = min(width, image.width)
+        resized = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+
+        for fmt, (pil_format, options) in THUMBNAIL_FORMATS.items():
+            output = resized if fmt == 'webp' else _to_rgb(resized)
+            buffer = BytesIO()
+            output.save(buffer, pil_format, **options)
+
+            name = variant_name(field_file.name, width, fmt)
+            if storage.exists(name):
+                storage.delete(name)
+            variants[fmt][str(width)] = storage.save(name, ContentFile(buffer.getvalue()))
+
+        if width == image.width:
+            break
+    return variants
+
+
+def variant_names(variants):
+    """Todos os caminhos de arquivo de um dict de variantes."""
+    return {name for paths in (variants or {}).values() if isinstance(paths, dict) for name in paths.values()}
+
+
+def delete_variants(variants, storage, keep=None):
+    """Apaga do storage os arquivos das variantes, exceto os que também estão em `keep`."""
+    for name in variant_names(variants) - variant_names(keep):
+        storage.delete(name)
+
+
+def variant_url(variants, storage, fmt, width):
+    """URL da menor variante com pelo menos `width` pixels (ou da maior disponível); None se não houver."""
+    paths = (variants or {}).get(fmt)
+    if not paths:
+        return None
+    widths = sorted(int(w) for w in paths)
+    chosen = next((w for w in widths if w >= width), widths[-1])
+    return storage.url(paths[str(chosen)])
+
+
+def srcset(variants, storage, fmt):
+    """Valor do atributo `srcset` ("url 320w, url 640w, ...") para o formato informado."""
+    paths = (variants or {}).get(fmt) or {}
+    return ', '.join(f'{storage.url(name)} {width}w' for width, name in sorted(paths.items(), key=lambda item: int(item[0])))
@@ -6,21 +6,32 @@ from django.urls import reverse # Importar a função reverse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 import json
-from .models import Product, Tenant, ProductImage, Category, Cart, CartItem, Order, OrderItem
+import logging
+import requests
+from myproject.db_routers import use_replica
+from .models import Product, Tenant, ProductImage, Category, Cart, CartItem, Order, ProcessedPayment
+from .orders import create_order_from_cart
+from .jobs import enqueue
+from .payments import mercadopago_sdk
+from .phones import INCOMPLETE_PHONE_MESSAGE, is_complete_phone, normalize_phone
+from .stock import OutOfStock, ensure_reserved, reserve, set_quantity
+from .auth import tenant_required
+from .tenants import get_tenant_or_404
+from .storefront import category_order, storefront_page
 from .forms import ProductForm, ProductImageFormSet, SettingsForm, StorefrontSettingsForm # Importe o novo formulário
-import mercadopago
-from django.db.models import Case, When, Value, IntegerField
+from django.core import signing
+from django.db import transaction
+from django.db.models import F
+from django.template.loader import render_to_string
 
-@login_required(login_url='login')
+logger = logging.getLogger(__name__)
+
+@tenant_required
 def inicio_view(request):
     """
     Exibe o painel do lojista com pedidos concluídos e carrinhos ativos.
     """
-    try:
-        tenant = request.user.tenant
-    except Tenant.DoesNotExist:
-        # Se o usuário não for um lojista, redireciona ou mostra um erro.
-        return render(request, 'error.html', {'message': 'Você não tem uma loja associada.'})
+    tenant = request.tenant
 
     if tenant.business_type == 'delivery' or tenant.business_type == 'bar_delivery':
         # Redireciona para a view dashboard dentro do app 'delivery'
@@ -33,8 +44,9 @@ def inicio_view(request):
     # Busca os pedidos pagos para o tenant do lojista
     completed_orders = Order.objects.filter(tenant=tenant, status='paid').prefetch_related('items').order_by('-created_at')
     
-    # DEBUG: Mostra no terminal quantos pedidos foram encontrados para este lojista
-    print(f"DEBUG PAINEL: Tenant '{tenant.name}' (ID {tenant.id}) - Pedidos encontrados: {completed_orders.count()}")
+    # Quantos pedidos foram encontrados para este lojista (a contagem só roda com o log em DEBUG)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Painel: tenant '%s' (ID %s) - pedidos encontrados: %s", tenant.name, tenant.id, completed_orders.count())
 
     # Busca os carrinhos ativos que contêm produtos do tenant do lojista
     active_carts = Cart.objects.filter(
@@ -49,8 +61,9 @@ def inicio_view(request):
     }
     return render(request, 'inicio.html', context)
 
-@login_required(login_url='login')
+@tenant_required(message='Usuário não possui um tenant associado.')
 def product_view(request):
+    tenant = request.tenant
     # Lógica para lidar com o envio do formulário (POST)
     if request.method == 'POST':
         # Adicionamos request.FILES para lidar com o upload da imagem
@@ -69,13 +82,7 @@ def product_view(request):
                     extra_data[field_name] = value
 
             product = form.save(commit=False)
-            # 2. Busca o objeto Tenant associado ao usuário logado.
-            try:
-                tenant = request.user.tenant
-            except Tenant.DoesNotExist:
-                # Opcional: Lidar com o caso de um usuário não ter um tenant.
-                # Poderia redirecionar com uma mensagem de erro. Por agora, vamos falhar.
-                return render(request, 'error.html', {'message': 'Usuário não possui um tenant associado.'})
+            # 2. Associa o produto ao tenant do usuário logado.
             product.tenant = tenant
             product.extra_data = extra_data # Salva os dados extras
             # 3. Agora salva a instância completa no banco
@@ -90,25 +97,14 @@ def product_view(request):
         formset = ProductImageFormSet(instance=Product()) # Instancia o formset para um novo produto
 
     # Busca apenas os produtos que pertencem ao tenant do usuário logado.
-    try:
-        # Pega o tenant associado ao usuário
-        user_tenant = request.user.tenant
-        # Filtra os produtos que têm esse tenant
-        lista_produtos = Product.objects.filter(tenant=user_tenant)
-    except Tenant.DoesNotExist:
-        # Se o usuário não tiver um tenant, a lista de produtos estará vazia.
-        lista_produtos = []
+    lista_produtos = Product.objects.filter(tenant=tenant)
 
     context = {'form': form, 'formset': formset, 'produtos': lista_produtos} # Passa o formset para o template
     return render(request, 'produtos.html', context)
 
-@login_required(login_url='login')
+@tenant_required(message='Usuário não possui um tenant associado.')
 def edit_product_view(request, product_id):
-    try:
-        tenant = request.user.tenant
-        product = get_object_or_404(Product, id=product_id, tenant=tenant)
-    except Tenant.DoesNotExist:
-        return render(request, 'error.html', {'message': 'Usuário não possui um tenant associado.'})
+    product = get_object_or_404(Product, id=product_id, tenant=request.tenant)
 
     if request.method == 'POST':
         form = ProductForm(request.POST, request.FILES, instance=product)
@@ -122,9 +118,8 @@ def edit_product_view(request, product_id):
                     field_name = key.replace('extra_field_', '')
                     extra_data[field_name] = value
             
-            product = form.save(commit=False)
-            product.extra_data = extra_data
-            product.save()
+            # O estoque entra como diferença, sem desfazer reservas feitas enquanto o formulário estava aberto
+            product = form.save_edit(extra_data=extra_data)
             formset.save()
             messages.success(request, 'Produto atualizado com sucesso!')
             return redirect('shop:produtos')
@@ -141,17 +136,14 @@ def edit_product_view(request, product_id):
         'extra_data': product.extra_data
     })
 
-@login_required(login_url='login')
+@tenant_required
 def delete_product_view(request, product_id):
     try:
-        tenant = request.user.tenant
-        product = get_object_or_404(Product, id=product_id, tenant=tenant)
+        product = get_object_or_404(Product, id=product_id, tenant=request.tenant)
         
         product.delete()
         messages.success(request, 'Produto excluído com sucesso!')
             
-    except Tenant.DoesNotExist:
-        pass
     except Exception as e:
         messages.error(request, f'Erro ao excluir produto: {e}')
 
@@ -166,12 +158,9 @@ def get_category_fields(request, category_id):
     except Category.DoesNotExist:
         return JsonResponse({'fields': []})
 
-@login_required(login_url='login')
+@tenant_required(message='Usuário não possui uma loja associada.')
 def storefront_settings_view(request):
-    try:
-        tenant = request.user.tenant
-    except Tenant.DoesNotExist:
-        return render(request, 'error.html', {'message': 'Usuário não possui uma loja associada.'})
+    tenant = request.tenant
 
     if request.method == 'POST':
         form = StorefrontSettingsForm(request.POST, request.FILES, instance=tenant)
@@ -185,89 +174,90 @@ def storefront_settings_view(request):
     form = StorefrontSettingsForm(instance=tenant)
     return render(request, 'configurar_vitrine.html', {'form': form, 'tenant': tenant})
 
+def _remember_tenant(request, tenant_slug):
+    """
+    Salva o slug do tenant na sessão para saber para onde voltar.
+    Só escreve quando muda: atribuir o mesmo valor marcaria a sessão como alterada
+    e geraria uma gravação no banco a cada página vista.
+    """
+    if request.session.get('last_visited_tenant_slug') != tenant_slug:
+        request.session['last_visited_tenant_slug'] = tenant_slug
+
+@use_replica
 def sales_view(request, tenant_slug):
     """
     Exibe os produtos de um tenant específico.
     """
-    # Salva o slug do tenant na sessão para saber para onde voltar
-    request.session['last_visited_tenant_slug'] = tenant_slug
-    # Busca o tenant pelo slug ou retorna um erro 404 se não encontrar
-    tenant = get_object_or_404(Tenant, slug=tenant_slug)
+    _remember_tenant(request, tenant_slug)
+    # Tenant pelo slug (em cache, ver shop/tenants.py) ou erro 404 se não encontrar
+    tenant = get_tenant_or_404(request, tenant_slug)
     
-    # Busca categorias disponíveis nesta loja para o filtro
-    categories = Category.objects.filter(product__tenant=tenant).distinct()
+    # Categorias da loja na ordem de exibição (também usadas no filtro)
+    categories = category_order(tenant)
 
     # Busca produtos da categoria de promoção para o banner rotativo (limite de 5)
     promo_products = []
-    if tenant.promotion_category:
-        promo_products = Product.objects.filter(tenant=tenant, category=tenant.promotion_category).prefetch_related('images')[:5]
+    if tenant.promotion_category_id:
+        promo_products = Product.objects.filter(tenant=tenant, category_id=tenant.promotion_category_id).select_related('primary_image')[:5]
 
-    # Define a ordenação com base na configuração do lojista
-    # Se o campo não existir no banco ainda, usa 'category' como padrão
-    sort_pref = getattr(tenant, 'display_order', 'category')
-    
-    # Filtra os produtos
-    produtos = Product.objects.filter(tenant=tenant).select_related('category').prefetch_related('images')
-    
     # Filtro por Categoria
-    selected_category_id = request.GET.get('category')
-    if selected_category_id:
-        try:
-            selected_category_id = int(selected_category_id)
-            produtos = produtos.filter(category_id=selected_category_id)
-        except ValueError:
-            selected_category_id = None
-
-    # Lógica para colocar itens da Categoria de Promoção no topo
-    if tenant.promotion_category:
-        produtos = produtos.annotate(
-            is_promo=Case(
-                When(category=tenant.promotion_category, then=Value(1)),
-                default=Value(0),
-                output_field=IntegerField(),
-            )
-        )
-    else:
-        produtos = produtos.annotate(is_promo=Value(0, output_field=IntegerField()))
-
-    # Define a lista de ordenação: Promoção > Categoria > (Critério Escolhido)
-    if sort_pref == 'price_asc':
-        produtos = produtos.order_by('-is_promo', 'category__name', 'price')
-    elif sort_pref == 'price_desc':
-        produtos = produtos.order_by('-is_promo', 'category__name', '-price')
-    else: # Padrão (category)
-        # Ordenação personalizada em Python para:
-        # 1. Promoção (is_promo)
-        # 2. Categorias com itens mais recentes primeiro (Recently Added)
-        # 3. Itens mais recentes dentro da categoria
-        produtos_list = list(produtos)
-        
-        # Mapa para guardar o ID do produto mais recente de cada categoria
-        cat_max_ids = {}
-        for p in produtos_list:
-            cid = p.category_id
-            if cid not in cat_max_ids or p.id > cat_max_ids[cid]:
-                cat_max_ids[cid] = p.id
-        
-        # Ordena a lista: Promoção > Categoria mais nova > Item mais novo
-        produtos_list.sort(key=lambda p: (-p.is_promo, -cat_max_ids.get(p.category_id, 0), -p.id))
-        produtos = produtos_list
+    selected_category_id, page_categories = _storefront_categories(request, categories)
+
+    # Primeira "tela" de produtos (com a imagem de capa); o restante chega pela rolagem (storefront_products_view)
+    # A ordenação (Promoção > Categoria > Critério do lojista) segue o display_order do tenant
+    try:
+        produtos, next_cursor = storefront_page(tenant, page_categories, request.GET.get('cursor'))
+    except signing.BadSignature:
+        produtos, next_cursor = storefront_page(tenant, page_categories)
     
     return render(request, 'vendas.html', {
         'produtos': produtos, 
+        'next_cursor': next_cursor,
         'tenant': tenant, 
         'categories': categories, 
         'selected_category_id': selected_category_id,
         'promo_products': promo_products
     })
 
+def _storefront_categories(request, categories):
+    """Aplica o filtro de categoria (?category=) à lista ordenada de categorias da vitrine."""
+    selected_category_id = request.GET.get('category')
+    if selected_category_id:
+        try:
+            selected_category_id = int(selected_category_id)
+            return selected_category_id, [c for c in categories if c['id'] == selected_category_id]
+        except ValueError:
+            pass
+    return None, categories
+
+@use_replica
+def storefront_products_view(request, tenant_slug):
+    """
+    Próxima página de produtos da vitrine (rolagem infinita).
+    Retorna o HTML dos cards e o cursor da página seguinte (null quando acabou).
+    """
+    tenant = get_tenant_or_404(request, tenant_slug)
+
+    # A ordem das categorias (já filtrada) vem no cursor; sem cursor, é a primeira página
+    cursor = request.GET.get('cursor')
+    page_categories = None if cursor else _storefront_categories(request, category_order(tenant))[1]
+
+    try:
+        produtos, next_cursor = storefront_page(tenant, page_categories, cursor)
+    except signing.BadSignature:
+        return JsonResponse({'error': 'Cursor inválido.'}, status=400)
+
+    html = render_to_string('vendas_produtos.html', {'produtos': produtos, 'tenant': tenant}, request=request)
+    return JsonResponse({'html': html, 'next_cursor': next_cursor})
+
+@use_replica
 def product_detail_view(request, tenant_slug, product_id):
     """
     Exibe os detalhes de um único produto.
     """
     # Salva o slug do tenant na sessão também aqui, para garantir
-    request.session['last_visited_tenant_slug'] = tenant_slug
-    tenant = get_object_or_404(Tenant, slug=tenant_slug)
+    _remember_tenant(request, tenant_slug)
+    tenant = get_tenant_or_404(request, tenant_slug)
     produto = get_object_or_404(Product, id=product_id, tenant=tenant)
     return render(request, 'product_detail.html', {'produto': produto, 'tenant': tenant})
 
@@ -283,7 +273,7 @@ def create_payment_view(request, tenant_slug, product_id, gateway):
         if not tenant.mercadopago_api_key:
             return render(request, 'error.html', {'message': 'O lojista não configurou o Mercado Pago.'})
 
-        sdk = mercadopago.SDK(tenant.mercadopago_api_key)
+        sdk = mercadopago_sdk(tenant.mercadopago_api_key)
 
         # 1. Cria os dados da preferência de pagamento para Mercado Pago
         preference_data = {
@@ -311,7 +301,10 @@ def create_payment_view(request, tenant_slug, product_id, gateway):
         }
 
         # 2. Cria a preferência e obtém a resposta
-        preference_response = sdk.preference().create(preference_data)
+        try:
+            preference_response = sdk.preference().create(preference_data)
+        except requests.RequestException:
+            return render(request, 'error.html', {'message': 'O Mercado Pago não respondeu. Tente novamente em instantes.'})
 
         # 3. Verifica se a chamada foi bem-sucedida e redireciona
         if preference_response["status"] == 201:
@@ -350,11 +343,16 @@ def create_cart_payment_view(request, gateway):
     # Pega o tenant do primeiro item do carrinho.
     tenant = cart.items.first().product.tenant
 
+    try:
+        ensure_reserved(cart)
+    except OutOfStock as e:
+        return render(request, 'error.html', {'message': str(e)})
+
     if gateway == 'mercadopago':
         if not tenant.mercadopago_api_key:
             return render(request, 'error.html', {'message': 'O lojista não configurou o Mercado Pago.'})
 
-        sdk = mercadopago.SDK(tenant.mercadopago_api_key.strip())
+        sdk = mercadopago_sdk(tenant.mercadopago_api_key)
 
         # Cria a lista de itens a partir do carrinho
         items = [
@@ -393,8 +391,11 @@ def create_cart_payment_view(request, gateway):
             },
         }
 
-        print("DEBUG MP Payload:", preference_data) # Para ajudar a debugar no terminal se der erro
-        preference_response = sdk.preference().create(preference_data)
+        logger.debug('Preferência Mercado Pago: %s', preference_data)
+        try:
+            preference_response = sdk.preference().create(preference_data)
+        except requests.RequestException:
+            return render(request, 'error.html', {'message': 'O Mercado Pago não respondeu. Tente novamente em instantes.'})
 
         if preference_response["status"] == 201:
             return redirect(preference_response["response"]["init_point"])
@@ -413,8 +414,8 @@ def payment_success_view(request):
     Lida com o retorno de um pagamento bem-sucedido.
     Converte o carrinho em um pedido.
     """
-    # Debug para ver o que o Mercado Pago está enviando no terminal
-    print("DEBUG Retorno MP:", request.GET)
+    # Para ver o que o Mercado Pago está enviando
+    logger.debug('Retorno Mercado Pago: %s', request.GET)
 
     cart_id = request.GET.get('external_reference')
     payment_status = request.GET.get('collection_status') or request.GET.get('status')
@@ -423,55 +424,24 @@ def payment_success_view(request):
         return render(request, 'error.html', {'message': 'Pagamento não confirmado ou referência inválida.'})
 
     try:
-        cart = Cart.objects.get(id=cart_id)
-        tenant = cart.items.first().product.tenant
-        
-        # Usa a função auxiliar para criar o pedido
-        order = _create_order_from_cart(cart)
-        print(f"DEBUG SUCESSO: Pedido {order.id} criado com sucesso.")
-
-    except Cart.DoesNotExist:
-        # Se o carrinho não existe, mas o status é approved, o Webhook já processou o pedido.
-        print(f"DEBUG INFO: Carrinho {cart_id} não encontrado. O pedido já foi criado e processado via Webhook.")
+        # Idempotente: se o webhook já converteu o carrinho, devolve o mesmo pedido
+        order = create_order_from_cart(cart_id, payment_id=request.GET.get('payment_id') or request.GET.get('collection_id'))
+        if order:
+            logger.info('Pedido %s confirmado.', order.id)
+        else:
+            logger.info('Carrinho %s não encontrado ou vazio.', cart_id)
 
-    except Exception as e:
-        print(f"DEBUG ERRO: Falha inesperada no retorno do pagamento: {e}")
+    except Exception:
+        logger.exception('Falha inesperada no retorno do pagamento (carrinho %s).', cart_id)
 
     return render(request, 'payment_status.html', {'status': 'sucesso'})
 
-def _create_order_from_cart(cart):
-    """
-    Função auxiliar para transformar um Carrinho em Pedido.
-    Usada tanto pela view de sucesso quanto pelo Webhook.
-    """
-    tenant = cart.items.first().product.tenant
-    
-    # Cria o Pedido (Order)
-    order = Order.objects.create(
-        tenant=tenant,
-        customer_phone=cart.phone_number,
-        total_amount=cart.total,
-        status='paid'
-    )
-
-    # Copia os itens
-    for item in cart.items.all():
-        OrderItem.objects.create(
-            order=order,
-            product_name=item.product.name,
-            quantity=item.quantity,
-            price=item.product.price
-        )
-    
-    # Limpa o carrinho
-    cart.delete()
-    return order
-
 @csrf_exempt
 @require_POST
 def mercadopago_webhook_view(request, tenant_id):
     """
-    Recebe notificações do Mercado Pago e processa o pedido em segundo plano.
+    Recebe notificações do Mercado Pago. Responde na hora e deixa a consulta do
+    pagamento (e a criação do pedido) para a fila de tarefas (`run_jobs`).
     """
     try:
         tenant = Tenant.objects.get(id=tenant_id)
@@ -479,7 +449,7 @@ def mercadopago_webhook_view(request, tenant_id):
             return JsonResponse({'error': 'Tenant sem chave API'}, status=400)
 
         data = json.loads(request.body)
-        print(f"DEBUG WEBHOOK RECEBIDO: {data}")
+        logger.debug('Webhook Mercado Pago recebido: %s', data)
 
         payment_id = None
 
@@ -503,25 +473,13 @@ def mercadopago_webhook_view(request, tenant_id):
             if str(payment_id).startswith('http'):
                 payment_id = str(payment_id).split('/')[-1]
 
-            sdk = mercadopago.SDK(tenant.mercadopago_api_key.strip())
-            payment_info = sdk.payment().get(payment_id)
-            
-            if payment_info['status'] == 200:
-                payment = payment_info['response']
-                status = payment.get('status')
-                external_reference = payment.get('external_reference')
-
-                if status == 'approved' and external_reference:
-                    try:
-                        cart = Cart.objects.get(id=external_reference)
-                        order = _create_order_from_cart(cart)
-                        print(f"DEBUG WEBHOOK: Pedido {order.id} criado via Webhook!")
-                    except Cart.DoesNotExist:
-                        print(f"DEBUG WEBHOOK: Carrinho {external_reference} não encontrado (provavelmente já processado).")
+            # Notificações repetidas de um pagamento já convertido param aqui (consulta no índice)
+            if not ProcessedPayment.objects.filter(payment_id=str(payment_id)).exists():
+                enqueue('mercadopago.payment', {'tenant_id': tenant.id, 'payment_id': str(payment_id)})
 
         return JsonResponse({'status': 'OK'})
     except Exception as e:
-        print(f"DEBUG WEBHOOK ERRO: {e}")
+        logger.exception('Erro no webhook do Mercado Pago (tenant %s).', tenant_id)
         return JsonResponse({'error': str(e)}, status=500)
 
 def payment_failure_view(request):
@@ -548,26 +506,26 @@ def client_orders_view(request):
     current_tenant = None
 
     if tenant_slug:
-        current_tenant = get_object_or_404(Tenant, slug=tenant_slug)
-
-    if phone:
-        # Busca pedidos associados ao telefone, ordenados do mais recente para o mais antigo
-        orders = Order.objects.filter(customer_phone=phone).prefetch_related('items', 'tenant').order_by('-created_at')
+        current_tenant = get_tenant_or_404(request, tenant_slug)
+
+    phone_error = None
+    if phone and not is_complete_phone(normalize_phone(phone)):
+        phone_error = INCOMPLETE_PHONE_MESSAGE
+    elif phone:
+        # Busca pedidos associados ao telefone (normalizado, ver shop/phones.py), ordenados do mais recente para o mais antigo
+        orders = Order.objects.filter(phone_normalized=normalize_phone(phone)).select_related('tenant').prefetch_related('items').order_by('-created_at')
         # Se estiver acessando através de uma loja específica, filtra apenas os pedidos dela
         if current_tenant:
             orders = orders.filter(tenant=current_tenant)
 
-    return render(request, 'client_orders.html', {'orders': orders, 'phone': phone, 'current_tenant': current_tenant})
+    return render(request, 'client_orders.html', {'orders': orders, 'phone': phone, 'phone_error': phone_error, 'current_tenant': current_tenant})
 
-@login_required(login_url='login')
+@tenant_required(message='Usuário não possui uma loja associada.')
 def settings_view(request):
     """
     Página de configurações para o tenant (lojista).
     """
-    try:
-        tenant = request.user.tenant
-    except Tenant.DoesNotExist:
-        return render(request, 'error.html', {'message': 'Usuário não possui uma loja associada.'})
+    tenant = request.tenant
 
     if request.method == 'POST':
         form = SettingsForm(request.POST, instance=tenant)
@@ -594,20 +552,24 @@ def add_to_cart_view(request, tenant_slug, product_id):
 
     # Busca ou cria o carrinho para o número de telefone
     cart, created = Cart.objects.get_or_create(phone_number=phone_number)
-    produto = get_object_or_404(Product, id=product_id)
+    produto = get_object_or_404(Product, id=product_id, tenant=get_tenant_or_404(request, tenant_slug))
 
     # Pega a quantidade do formulário, com padrão 1 se não for fornecida.
     try:
-        quantity_to_add = int(request.POST.get('quantity', 1))
+        quantity_to_add = max(int(request.POST.get('quantity', 1)), 1)
     except (ValueError, TypeError):
         quantity_to_add = 1
 
-    # Busca ou cria o item no carrinho
-    cart_item, created = CartItem.objects.get_or_create(cart=cart, product=produto, defaults={'quantity': 0})
+    try:
+        with transaction.atomic():
+            # Separa as unidades no estoque antes de colocá-las no carrinho
+            reserve(cart, produto, quantity_to_add)
 
-    # Adiciona a quantidade desejada ao item do carrinho
-    cart_item.quantity += quantity_to_add
-    cart_item.save()
+            # Busca ou cria o item no carrinho e soma a quantidade no banco (cliques simultâneos não se perdem)
+            cart_item, created = CartItem.objects.get_or_create(cart=cart, product=produto, defaults={'quantity': 0})
+            CartItem.objects.filter(pk=cart_item.pk).update(quantity=F('quantity') + quantity_to_add)
+    except OutOfStock:
+        messages.error(request, f'Estoque insuficiente para "{produto.name}".')
 
     # Redireciona para a página do carrinho para ver os itens
     return redirect('shop:view_cart')
@@ -638,7 +600,7 @@ def view_cart(request):
     if phone_number:
         try:
             # Usamos prefetch_related para otimizar a busca dos produtos e suas imagens
-            cart = Cart.objects.prefetch_related('items__product__images').get(phone_number=phone_number)
+            cart = Cart.objects.prefetch_related('items__product__primary_image').get(phone_number=phone_number)
         except Cart.DoesNotExist:
             # O carrinho pode não existir se o cliente ainda não adicionou itens
             pass
@@ -664,6 +626,13 @@ def checkout_view(request):
         # Não permitir checkout de carrinho vazio
         return redirect('shop:view_cart')
 
+    try:
+        # Confere o estoque de tudo e estende as reservas enquanto o cliente paga
+        ensure_reserved(cart)
+    except OutOfStock as e:
+        messages.error(request, f'{e} Ajuste a quantidade para continuar.')
+        return redirect('shop:view_cart')
+
     # Assumindo que todos os produtos no carrinho são do mesmo lojista.
     # Pegamos o tenant do primeiro item do carrinho.
     tenant = cart.items.first().product.tenant
@@ -706,25 +675,25 @@ def update_cart_item_view(request, item_id):
             quantity = int(request.POST.get('quantity', 1))
 
             if quantity > 0:
-                item_to_update.quantity = quantity
-                item_to_update.save()
+                with transaction.atomic():
+                    set_quantity(cart, item_to_update.product, item_to_update.quantity, quantity)
+                    item_to_update.quantity = quantity
+                    item_to_update.save()
         except (Cart.DoesNotExist, CartItem.DoesNotExist, ValueError):
             pass
+        except OutOfStock as e:
+            messages.error(request, str(e))
 
     return redirect('shop:view_cart')
 
-@login_required(login_url='login')
+@tenant_required
 def delete_cart_view(request, cart_id):
     """
     Permite ao lojista excluir um carrinho ativo do painel.
     """
-    try:
-        tenant = request.user.tenant
-        # Verifica se o carrinho existe e se contém itens deste lojista para garantir segurança
-        cart = Cart.objects.filter(id=cart_id, items__product__tenant=tenant).first()
-        if cart:
-            cart.delete()
-    except Tenant.DoesNotExist:
-        pass
+    # Verifica se o carrinho existe e se contém itens deste lojista para garantir segurança
+    cart = Cart.objects.filter(id=cart_id, items__product__tenant=request.tenant).first()
+    if cart:
+        cart.delete()
 
     return redirect('shop:inicio')